@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+from typing import Optional
+from async_database import db
+from patient_directory import patient_directory
+
+# Periodic resync from the database so workers converge on each other's changes
+ACTIVE_SESSIONS_RESYNC = float(os.getenv("ACTIVE_SESSIONS_RESYNC", "60"))
+REBUILD_CHUNK_SIZE = 200
+# Columns kept per indexed session (what /doctor/sessions/active and the websocket read)
+SESSION_COLUMNS = (
+    "id, patient_id, exercise_id, status, duration_seconds, repetitions, "
+    "accuracy_percent, notes, started_at, created_at"
+)
+# Columns read when checking that a session belongs to a patient
+OWNERSHIP_COLUMNS = "id, patient_id, exercise_id, status, created_at"
+
+
+class ActiveSessionIndex:
+    """
+    In-memory registry of in_progress exercise sessions, indexed by doctor
+    and patient. Kept current by create_session, update_session and patient
+    websocket connect/disconnect; the database is only read to resync it
+    and to confirm ownership of sessions it doesn't hold.
+
+    Rebuilds are merged rather than swapped in: entries this worker added,
+    changed or removed after the snapshot query started keep their local
+    state, so a resync can't drop a session created (or revive one
+    completed) while it was reading.
+    """
+    def __init__(self, resync_interval: float = ACTIVE_SESSIONS_RESYNC):
+        self.resync_interval = resync_interval
+        # session_id -> session row (plus "doctor_id")
+        self._sessions: dict[str, dict] = {}
+        self._by_doctor: dict[str, set[str]] = {}
+        self._by_patient: dict[str, set[str]] = {}
+        self._online: set[str] = set()
+        # session_id -> monotonic time of the last local add/update/remove
+        self._touched: dict[str, float] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self.rebuild()
+            await asyncio.sleep(self.resync_interval)
+
+    async def rebuild(self):
+        started = time.monotonic()
+        try:
+            res = await db.from_("exercise_sessions")\
+                .select(SESSION_COLUMNS)\
+                .eq("status", "in_progress")\
+                .execute()
+            sessions = res.data or []
+
+            patient_ids = list({s["patient_id"] for s in sessions if s.get("patient_id")})
+            doctors = {}
+            for start in range(0, len(patient_ids), REBUILD_CHUNK_SIZE):
+                chunk = patient_ids[start:start + REBUILD_CHUNK_SIZE]
+                p_res = await db.from_("patients").select("id, doctor_id, full_name").in_("id", chunk).execute()
+                for patient in p_res.data or []:
+                    doctors[patient["id"]] = patient.get("doctor_id")
+                    patient_directory.remember_name(patient["id"], patient.get("full_name"))
+        except Exception as e:
+            print(f"Error rebuilding active session index: {e}")
+            return
+
+        def changed_since_snapshot(session_id: str) -> bool:
+            return self._touched.get(session_id, 0.0) >= started
+
+        snapshot = {session["id"] for session in sessions}
+        for session_id in list(self._sessions):
+            if session_id not in snapshot and not changed_since_snapshot(session_id):
+                self._discard(session_id)
+        for session in sessions:
+            if not changed_since_snapshot(session["id"]):
+                self._insert(session, doctors.get(session.get("patient_id")))
+        # Older local changes are reflected in the snapshot now
+        self._touched = {sid: at for sid, at in self._touched.items() if at >= started}
+        self._ready.set()
+
+    async def ready(self, timeout: float = 10):
+        """Wait for the first rebuild; raises asyncio.TimeoutError if the database is unreachable."""
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    def add(self, session: dict, doctor_id: Optional[str]):
+        self._touched[session["id"]] = time.monotonic()
+        self._insert(session, doctor_id)
+
+    def update(self, session_id: str, fields: dict):
+        # Stamped even when not indexed, so a resync can't revive a session completed here
+        self._touched[session_id] = time.monotonic()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return
+        if fields.get("status", entry.get("status")) != "in_progress":
+            self._discard(session_id)
+        else:
+            entry.update(fields)
+
+    def remove(self, session_id: str):
+        self._touched[session_id] = time.monotonic()
+        self._discard(session_id)
+
+    def _insert(self, session: dict, doctor_id: Optional[str]):
+        if session.get("status", "in_progress") != "in_progress":
+            self._discard(session["id"])
+            return
+        session_id = session["id"]
+        self._discard(session_id)
+        entry = {**session, "doctor_id": doctor_id}
+        self._sessions[session_id] = entry
+        if doctor_id:
+            self._by_doctor.setdefault(doctor_id, set()).add(session_id)
+        self._by_patient.setdefault(entry["patient_id"], set()).add(session_id)
+
+    def _discard(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        for index, key in ((self._by_doctor, entry.get("doctor_id")), (self._by_patient, entry["patient_id"])):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(session_id)
+                if not ids:
+                    del index[key]
+
+    def set_online(self, patient_id: str, online: bool):
+        if online:
+            self._online.add(patient_id)
+        else:
+            self._online.discard(patient_id)
+
+    def is_online(self, patient_id: str) -> bool:
+        return patient_id in self._online
+
+    def get(self, session_id: str) -> Optional[dict]:
+        return self._sessions.get(session_id)
+
+    async def owned(self, session_id: str, patient_id: str) -> Optional[dict]:
+        """
+        The session if it belongs to the patient, else None. Answered from the
+        index when it holds the session; otherwise (created on another worker,
+        not yet resynced, or no longer in progress) one lookup scoped to the
+        patient.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            return entry if entry.get("patient_id") == patient_id else None
+        try:
+            res = await db.from_("exercise_sessions")\
+                .select(OWNERSHIP_COLUMNS)\
+                .eq("id", session_id)\
+                .eq("patient_id", patient_id)\
+                .limit(1)\
+                .execute()
+        except Exception as e:
+            # Malformed ids fail the query; either way the session can't be confirmed
+            print(f"Error checking session {session_id}: {e}")
+            return None
+        return res.data[0] if res.data else None
+
+    def current_for_patient(self, patient_id: str) -> Optional[str]:
+        """Most recently created in-progress session of the patient, if any."""
+        ids = self._by_patient.get(patient_id)
+        if not ids:
+            return None
+        return max(ids, key=lambda sid: str(self._sessions[sid].get("created_at") or ""))
+
+    def for_doctor(self, doctor_id: str, limit: int = 20) -> list[dict]:
+        sessions = [self._sessions[sid] for sid in self._by_doctor.get(doctor_id, ())]
+        sessions.sort(key=lambda s: str(s.get("created_at") or ""), reverse=True)
+        return sessions[:limit]
+
+
+active_sessions = ActiveSessionIndex()
@@ -0,0 +1,195 @@
+import os
+import time
+import json
+import uuid
+import asyncio
+import hashlib
+from typing import Optional
+from postgrest.exceptions import APIError
+from async_database import db
+
+# Rows per upsert request and ids per ownership lookup (keeps URLs and bodies bounded)
+ASSIGNMENT_CHUNK_SIZE = int(os.getenv("ASSIGNMENT_CHUNK_SIZE", "200"))
+# How long a completed Idempotency-Key result is replayed
+ASSIGNMENT_IDEMPOTENCY_TTL = int(os.getenv("ASSIGNMENT_IDEMPOTENCY_TTL", "86400"))
+ASSIGNMENT_IDEMPOTENCY_MAX_KEYS = 10000
+# Postgres: no unique or exclusion constraint matching the ON CONFLICT specification
+NO_CONFLICT_TARGET = "42P10"
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with a different request body."""
+
+
+class AssignmentEngine:
+    """
+    Assigns one exercise to many patients of a doctor.
+
+    Patient ids are de-duplicated and checked against the doctor's patients
+    in one set-based query per chunk; owned patients are upserted in chunks
+    on (patient_id, exercise_id), so retries update rather than duplicate.
+    A chunk that fails is retried row by row to pin the failure on the
+    offending patients. Results are cached per (doctor, Idempotency-Key)
+    for ASSIGNMENT_IDEMPOTENCY_TTL seconds and concurrent retries with the
+    same key share one run.
+
+    Expects a unique constraint on assigned_exercises(patient_id, exercise_id)
+    (supabase/migrations/20261017000000_assigned_exercises_unique.sql).
+    Without it the first upsert fails with 42P10; the engine then switches
+    to select-then-insert/update per chunk for the rest of the process.
+    """
+    def __init__(self, chunk_size: int = ASSIGNMENT_CHUNK_SIZE,
+                 idempotency_ttl: int = ASSIGNMENT_IDEMPOTENCY_TTL):
+        self.chunk_size = chunk_size
+        self.idempotency_ttl = idempotency_ttl
+        # (doctor_id, key) -> (expires_at, fingerprint, result)
+        self._results: dict[tuple[str, str], tuple[float, str, dict]] = {}
+        self._inflight: dict[tuple[str, str], tuple[str, asyncio.Future]] = {}
+        # Cleared when the database lacks the (patient_id, exercise_id) unique constraint
+        self.upsert_supported = True
+
+    async def assign(self, doctor_id: str, exercise_id: str, patient_ids: list[str],
+                     fields: dict, idempotency_key: Optional[str] = None) -> dict:
+        if not idempotency_key:
+            return await self._assign(doctor_id, exercise_id, patient_ids, fields)
+
+        key = (doctor_id, idempotency_key)
+        fingerprint = hashlib.sha256(json.dumps(
+            [exercise_id, patient_ids, fields], sort_keys=True, default=str
+        ).encode()).hexdigest()
+
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.time():
+                if cached[1] != fingerprint:
+                    raise IdempotencyConflict()
+                return {**cached[2], "replayed": True}
+            del self._results[key]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            if pending[0] != fingerprint:
+                raise IdempotencyConflict()
+            return {**await asyncio.shield(pending[1]), "replayed": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            result = await self._assign(doctor_id, exercise_id, patient_ids, fields)
+            self._remember(key, fingerprint, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else awaited isn't reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _remember(self, key: tuple[str, str], fingerprint: str, result: dict):
+        now = time.time()
+        if len(self._results) >= ASSIGNMENT_IDEMPOTENCY_MAX_KEYS:
+            for stale in [k for k, entry in self._results.items() if entry[0] <= now]:
+                del self._results[stale]
+            while len(self._results) >= ASSIGNMENT_IDEMPOTENCY_MAX_KEYS:
+                del self._results[next(iter(self._results))]
+        self._results[key] = (now + self.idempotency_ttl, fingerprint, result)
+
+    async def _owned(self, doctor_id: str, patient_ids: list[str]) -> set[str]:
+        # A non-UUID id would make PostgREST reject the whole chunk; such ids can't be patients
+        patient_ids = [pid for pid in patient_ids if _is_uuid(pid)]
+        owned = set()
+        for start in range(0, len(patient_ids), self.chunk_size):
+            chunk = patient_ids[start:start + self.chunk_size]
+            res = await db.from_("patients")\
+                .select("id")\
+                .eq("doctor_id", doctor_id)\
+                .in_("id", chunk)\
+                .execute()
+            owned.update(str(row["id"]) for row in res.data or [])
+        return owned
+
+    async def _upsert(self, records: list[dict]):
+        if self.upsert_supported:
+            try:
+                await db.from_("assigned_exercises")\
+                    .upsert(records, on_conflict="patient_id,exercise_id")\
+                    .execute()
+                return
+            except APIError as e:
+                if e.code != NO_CONFLICT_TARGET:
+                    raise
+                print("assigned_exercises has no (patient_id, exercise_id) unique constraint; "
+                      "falling back to select-then-insert")
+                self.upsert_supported = False
+        await self._insert_or_update(records)
+
+    async def _insert_or_update(self, records: list[dict]):
+        """Upsert without a conflict target: one lookup, then one update and one insert per chunk."""
+        exercise_id = records[0]["exercise_id"]
+        fields = {k: v for k, v in records[0].items() if k not in ("patient_id", "exercise_id")}
+        patient_ids = [record["patient_id"] for record in records]
+        res = await db.from_("assigned_exercises")\
+            .select("patient_id")\
+            .eq("exercise_id", exercise_id)\
+            .in_("patient_id", patient_ids)\
+            .execute()
+        existing = {str(row["patient_id"]) for row in res.data or []}
+        if existing and fields:
+            await db.from_("assigned_exercises")\
+                .update(fields)\
+                .eq("exercise_id", exercise_id)\
+                .in_("patient_id", list(existing))\
+                .execute()
+        missing = [record for record in records if record["patient_id"] not in existing]
+        if missing:
+            await db.from_("assigned_exercises").insert(missing).execute()
+
+    async def _assign(self, doctor_id: str, exercise_id: str, patient_ids: list[str], fields: dict) -> dict:
+        unique_ids = list(dict.fromkeys(str(pid) for pid in patient_ids))
+        owned = await self._owned(doctor_id, unique_ids)
+
+        outcomes = {pid: "not_found" for pid in unique_ids if pid not in owned}
+        records = [
+            {"patient_id": pid, "exercise_id": exercise_id, **fields}
+            for pid in unique_ids if pid in owned
+        ]
+
+        for start in range(0, len(records), self.chunk_size):
+            chunk = records[start:start + self.chunk_size]
+            try:
+                await self._upsert(chunk)
+                outcomes.update((record["patient_id"], "assigned") for record in chunk)
+                continue
+            except Exception as e:
+                print(f"Assignment chunk of {len(chunk)} failed, retrying row by row: {e}")
+            for record in chunk:
+                try:
+                    await self._upsert([record])
+                    outcomes[record["patient_id"]] = "assigned"
+                except Exception as e:
+                    print(f"Error assigning exercise to patient {record['patient_id']}: {e}")
+                    outcomes[record["patient_id"]] = "failed"
+
+        assigned = [pid for pid in unique_ids if outcomes[pid] == "assigned"]
+        return {
+            "assigned": assigned,
+            "results": [{"patient_id": pid, "status": outcomes[pid]} for pid in unique_ids],
+            "counts": {
+                status: sum(1 for pid in unique_ids if outcomes[pid] == status)
+                for status in ("assigned", "not_found", "failed")
+            },
+            "duplicates": len(patient_ids) - len(unique_ids),
+        }
+
+
+assignment_engine = AssignmentEngine()
@@ -0,0 +1,46 @@
+import os
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+from database import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+DB_MAX_KEEPALIVE = int(os.getenv("DB_MAX_KEEPALIVE", "20"))
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", "30"))
+
+DB_URL = f"{SUPABASE_URL}/rest/v1"
+DB_HEADERS = {
+    **DEFAULT_POSTGREST_CLIENT_HEADERS,
+    "apikey": SUPABASE_SERVICE_ROLE_KEY,
+    "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+}
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    One pooled, keep-alive, HTTP/2 connection pool for all PostgREST calls.
+    Passed to the client as `http_client`, the only way postgrest applies
+    pool limits and a non-integer timeout.
+    """
+    return httpx.AsyncClient(
+        base_url=DB_URL,
+        headers=DB_HEADERS,
+        http2=True,
+        follow_redirects=True,
+        timeout=DB_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=DB_MAX_CONNECTIONS,
+            max_keepalive_connections=DB_MAX_KEEPALIVE,
+            keepalive_expiry=DB_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+# Shared async PostgREST client; use `await db.from_("table")...execute()`
+db = AsyncPostgrestClient(DB_URL, headers=DB_HEADERS, http_client=create_http_client())
+
+
+async def close_db():
+    await db.aclose()
@@ -2,6 +2,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from database import supabase
+from async_database import db
+from identity import identity
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(tags=["Auth"])
 
@@ -14,7 +17,7 @@ class AuthBody(BaseModel):
 @router.post("/login")
 async def login(body: AuthBody):
     try:
-        res = supabase.auth.sign_in_with_password({"email": body.email, "password": body.password})
+        res = await run_in_threadpool(supabase.auth.sign_in_with_password, {"email": body.email, "password": body.password})
         if not res.user or not res.session:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
@@ -23,16 +26,9 @@ async def login(body: AuthBody):
         doctor_id = None
         
         if user_metadata.get("role") == "doctor":
-            # Get doctor record if exists
+            # Get doctor record (auto-created if missing)
             try:
-                doctor_res = supabase.from_("doctors").select("id").eq("auth_user_id", res.user.id).maybe_single().execute()
-                if doctor_res.data:
-                    doctor_id = doctor_res.data["id"]
-                else:
-                    # Auto-create doctor profile if missing
-                    new_doc = supabase.from_("doctors").insert({"auth_user_id": res.user.id}).execute()
-                    if new_doc.data:
-                        doctor_id = new_doc.data[0]["id"]
+                doctor_id = await identity.doctor_id(res.user.id, create=True)
             except Exception as e:
                 print(f"Error fetching/creating doctor profile: {e}")
                 pass
@@ -68,22 +64,27 @@ async def register(body: AuthBody):
             }
         }
         
-        res = supabase.auth.sign_up(auth_props)
+        res = await run_in_threadpool(supabase.auth.sign_up, auth_props)
         
         if not res.user:
             raise HTTPException(status_code=400, detail="Registration failed")
             
         # Create profile based on role
+        identity.invalidate(res.user.id)
         try:
             if role == "doctor":
-                supabase.from_("doctors").insert({"auth_user_id": res.user.id}).execute()
+                doc_res = await db.from_("doctors").insert({"auth_user_id": res.user.id}).execute()
+                if doc_res.data:
+                    identity.remember_doctor(res.user.id, doc_res.data[0]["id"])
             elif role == "patient":
-                supabase.from_("patients").insert({
+                patient_res = await db.from_("patients").insert({
                     "auth_user_id": res.user.id,
                     "full_name": body.full_name or body.email.split('@')[0],
                     "email": body.email,
                     "status": "active" # Assuming default status
                 }).execute()
+                if patient_res.data:
+                    identity.remember_patient(res.user.id, patient_res.data[0])
         except Exception as e:
              print(f"Failed to create {role} profile: {e}")
              # We might want to rollback auth user here if possible, but hard with Supabase.
@@ -0,0 +1,172 @@
+import os
+import json
+import base64
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Optional, Callable, Awaitable
+
+# e.g. redis://localhost:6379/0 — unset means single-worker, in-memory delivery
+BACKPLANE_URL = os.getenv("BACKPLANE_URL")
+BACKPLANE_PREFIX = os.getenv("BACKPLANE_PREFIX", "physiocheck")
+# Backoff between resubscribe attempts after the Redis connection drops
+BACKPLANE_RETRY_MIN = float(os.getenv("BACKPLANE_RETRY_MIN", "0.5"))
+BACKPLANE_RETRY_MAX = float(os.getenv("BACKPLANE_RETRY_MAX", "30"))
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+def encode_envelope(message: dict) -> str:
+    """
+    JSON for the wire. Binary exercise frames travel base64-encoded in the
+    envelope's own "bytes" map rather than inside the message, so nothing a
+    client puts in a message can be mistaken for bytes on the way back.
+    """
+    fields = {}
+    binary = {}
+    for key, value in message.items():
+        if isinstance(value, bytes):
+            binary[key] = base64.b64encode(value).decode()
+        else:
+            fields[key] = value
+    return json.dumps({"message": fields, "bytes": binary})
+
+
+def decode_envelope(data) -> dict:
+    envelope = json.loads(data)
+    message = envelope["message"]
+    for key, value in envelope.get("bytes", {}).items():
+        message[key] = base64.b64decode(value)
+    return message
+
+
+class Backplane(ABC):
+    """
+    Pub/sub fabric between uvicorn workers. Every message published on a
+    channel is handed to the registered handler on *every* worker (including
+    the publisher), which then delivers it to its own local sockets.
+    """
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    def set_handler(self, handler: Handler):
+        self._handler = handler
+
+    async def _dispatch(self, channel: str, message: dict):
+        if self._handler is None:
+            return
+        try:
+            await self._handler(channel, message)
+        except Exception as e:
+            print(f"Backplane handler error on {channel}: {e}")
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        """Deliver `message` to the handler of every worker listening on `channel`."""
+
+    async def close(self):
+        pass
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publishing delivers straight to the local handler."""
+    async def publish(self, channel: str, message: dict):
+        await self._dispatch(channel, message)
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backplane. Each worker pattern-subscribes to `<prefix>:*`
+    and publishes JSON payloads; works with any Redis-protocol server.
+    """
+    def __init__(
+        self,
+        url: str,
+        prefix: str = BACKPLANE_PREFIX,
+        retry_min: float = BACKPLANE_RETRY_MIN,
+        retry_max: float = BACKPLANE_RETRY_MAX,
+    ):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self._redis = None
+        self._pubsub = None
+        # Patterns to restore on a fresh pubsub connection after a failure
+        self._patterns = {f"{prefix}:*"}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("BACKPLANE_URL is set but the 'redis' package is not installed")
+
+        self._redis = redis.from_url(self.url)
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _subscribe(self):
+        """Replace the pubsub connection with a new one subscribed to every tracked pattern."""
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(*self._patterns)
+        self._pubsub = pubsub
+
+    async def _resubscribe(self):
+        delay = self.retry_min
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._subscribe()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = min(delay * 2, self.retry_max)
+                print(f"Backplane resubscribe failed, retrying in {delay:.1f}s: {e}")
+
+    async def _listen(self):
+        offset = len(self.prefix) + 1
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "pmessage":
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    await self._dispatch(channel[offset:], decode_envelope(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Backplane listener error, resubscribing: {e}")
+                await self._resubscribe()
+
+    async def publish(self, channel: str, message: dict):
+        try:
+            await self._redis.publish(f"{self.prefix}:{channel}", encode_envelope(message))
+        except Exception as e:
+            print(f"Backplane publish error on {channel}: {e}")
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._redis:
+            await self._redis.aclose()
+
+
+def create_backplane(url: Optional[str] = BACKPLANE_URL) -> Backplane:
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBackplane(url)
+    return InMemoryBackplane()
@@ -0,0 +1,105 @@
+import os
+import asyncio
+from typing import Callable, Awaitable, Optional
+
+# Rate at which the latest exercise frame is forwarded to monitoring doctors
+EXERCISE_UPDATE_HZ = float(os.getenv("EXERCISE_UPDATE_HZ", "10"))
+# Patients get one cumulative ack per this many frames (1 = ack every frame)
+EXERCISE_ACK_EVERY = int(os.getenv("EXERCISE_ACK_EVERY", "10"))
+MIN_UPDATE_HZ = 1.0
+MAX_UPDATE_HZ = 30.0
+
+Publish = Callable[[str, dict], Awaitable[None]]
+
+
+def clamp_rate(hz: Optional[float]) -> float:
+    if hz is None:
+        return EXERCISE_UPDATE_HZ
+    return max(MIN_UPDATE_HZ, min(MAX_UPDATE_HZ, hz))
+
+
+class AckCounter:
+    """Cumulative acknowledgements: one message covers the last `every` frames."""
+    def __init__(self, every: int = EXERCISE_ACK_EVERY):
+        self.every = every
+        self.unacked = 0
+
+    def frame(self, timestamp) -> Optional[dict]:
+        """Count one received frame; returns the ack to send once `every` have arrived."""
+        self.unacked += 1
+        if self.unacked < self.every:
+            return None
+        ack = {"type": "acknowledged", "timestamp": timestamp, "count": self.unacked}
+        self.unacked = 0
+        return ack
+
+
+class FrameCoalescer:
+    """
+    Keeps only the latest frame per patient and forwards it at a fixed rate.
+    The first frame after an idle period goes out immediately; frames that
+    arrive faster than the rate replace each other and are never sent.
+    """
+    def __init__(self, publish: Publish, rate_hz: float = EXERCISE_UPDATE_HZ):
+        self.publish = publish
+        self.rate_hz = rate_hz
+        # patient_id -> (message, encoded size)
+        self._latest: dict[str, tuple[dict, int]] = {}
+        self._rates: dict[str, float] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_saved = 0
+
+    def set_rate(self, patient_id: str, hz: Optional[float]):
+        self._rates[patient_id] = clamp_rate(hz)
+
+    def offer(self, patient_id: str, message: dict, size: int):
+        self.frames_in += 1
+        self.bytes_in += size
+        previous = self._latest.get(patient_id)
+        if previous is not None:
+            self.bytes_saved += previous[1]
+        self._latest[patient_id] = (message, size)
+
+        if patient_id not in self._tasks:
+            self._tasks[patient_id] = asyncio.create_task(self._flush_loop(patient_id))
+
+    async def _send(self, patient_id: str) -> bool:
+        entry = self._latest.pop(patient_id, None)
+        if entry is None:
+            return False
+        try:
+            await self.publish(patient_id, entry[0])
+            self.frames_out += 1
+        except Exception as e:
+            print(f"Error flushing exercise update for {patient_id}: {e}")
+        return True
+
+    async def _flush_loop(self, patient_id: str):
+        try:
+            while await self._send(patient_id):
+                await asyncio.sleep(1.0 / self._rates.get(patient_id, self.rate_hz))
+        finally:
+            if self._tasks.get(patient_id) is asyncio.current_task():
+                del self._tasks[patient_id]
+
+    async def close(self, patient_id: str):
+        """Flush any pending frame and forget the patient's state."""
+        task = self._tasks.pop(patient_id, None)
+        if task:
+            task.cancel()
+        await self._send(patient_id)
+        self._rates.pop(patient_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "rate_hz": self.rate_hz,
+            "active_streams": len(self._tasks),
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "frames_coalesced": self.frames_in - self.frames_out - len(self._latest),
+            "bytes_in": self.bytes_in,
+            "bytes_saved": self.bytes_saved,
+        }
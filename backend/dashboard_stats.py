@@ -0,0 +1,74 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable
+from async_database import db
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+
+
+async def _count(table: str, **filters) -> int:
+    # HEAD request: PostgREST returns only the exact count (Content-Range), no rows
+    query = db.from_(table).select("id", count="exact", head=True)
+    for column, value in filters.items():
+        query = query.eq(column, value)
+    res = await query.execute()
+    return res.count or 0
+
+
+class DashboardStats:
+    """
+    Dashboard counters gathered with concurrent count-only requests and
+    micro-cached per key for DASHBOARD_CACHE_TTL seconds. Concurrent
+    refreshes of the same key share one in-flight computation.
+    """
+    def __init__(self, ttl: float = DASHBOARD_CACHE_TTL):
+        self.ttl = ttl
+        # key -> (expires_at, result)
+        self._cache: dict[str, tuple[float, dict]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def _cached(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        entry = self._cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+            self._cache[key] = (time.time() + self.ttl, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else awaited isn't reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def patient(self, patient_id: str) -> dict:
+        async def compute():
+            completed, assigned = await asyncio.gather(
+                _count("exercise_sessions", patient_id=patient_id, status="completed"),
+                _count("assigned_exercises", patient_id=patient_id),
+            )
+            return {"completed_sessions": completed, "total_exercises": assigned}
+        return await self._cached(f"patient:{patient_id}", compute)
+
+    async def doctor(self, doctor_id: str) -> dict:
+        async def compute():
+            count = await _count("patients", doctor_id=doctor_id)
+            return {"activePatients": count, "totalPatients": count}
+        return await self._cached(f"doctor:{doctor_id}", compute)
+
+    def invalidate(self, kind: str, entity_id: str):
+        self._cache.pop(f"{kind}:{entity_id}", None)
+
+
+dashboard_stats = DashboardStats()
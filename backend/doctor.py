@@ -1,12 +1,37 @@
-from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import Optional, List
 from database import supabase
-from email_service import send_email
+from async_database import db
+from identity import identity
+from exercise_catalog import exercise_catalog
+from patient_stats import patient_stats
+from patient_directory import patient_directory
+from dashboard_stats import dashboard_stats
+from active_sessions import active_sessions
+from assignment_engine import assignment_engine, IdempotencyConflict
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from starlette.concurrency import run_in_threadpool
+from email_service import email_dispatcher
+import os
 import secrets
+import asyncio
+import json
+import csv
+import io
 
 router = APIRouter(prefix="/doctor", tags=["Doctor"])
 
+PATIENT_LIST_PAGE_SIZE = 100
+PATIENT_LIST_MAX_PAGE_SIZE = 500
+
+# Bulk import: rows per patients insert, concurrent auth sign-ups, rows per request
+IMPORT_BATCH_SIZE = int(os.getenv("PATIENT_IMPORT_BATCH_SIZE", "50"))
+IMPORT_CONCURRENCY = int(os.getenv("PATIENT_IMPORT_CONCURRENCY", "8"))
+IMPORT_MAX_ROWS = int(os.getenv("PATIENT_IMPORT_MAX_ROWS", "5000"))
+IMPORT_LIST_FIELDS = ("conditions", "allergies", "medications")
+
 class CreatePatientPayload(BaseModel):
     email: EmailStr
     full_name: str
@@ -30,8 +55,73 @@ class AssignExercisePayload(BaseModel):
     frequency: str
     notes: Optional[str] = None
 
+def make_temp_password(payload: CreatePatientPayload) -> str:
+    # Format: Name (first word, capitalized) + Last 4 digits of phone
+    try:
+        first_name = payload.full_name.split()[0].capitalize()
+        # Extract only digits from phone
+        phone_digits = "".join(filter(str.isdigit, payload.phone))
+        last_4 = phone_digits[-4:] if len(phone_digits) >= 4 else phone_digits.ljust(4, "0")
+        return f"{first_name}{last_4}"
+    except:
+        # Fallback if name/phone parsing fails
+        return secrets.token_urlsafe(8)
+
+async def sign_up_patient(email: str, temp_password: str):
+    return await run_in_threadpool(supabase.auth.sign_up, {
+        "email": email,
+        "password": temp_password,
+        "options": {
+            "data": {
+                "role": "patient"
+            }
+        }
+    })
+
+async def delete_auth_user(auth_user_id: str):
+    await run_in_threadpool(supabase.auth.admin.delete_user, auth_user_id)
+
+def build_patient_record(payload: CreatePatientPayload, doctor_db_id: str, auth_user_id: str) -> dict:
+    return {
+        "doctor_id": doctor_db_id,  # Use database ID, not auth ID
+        "auth_user_id": auth_user_id,
+        "full_name": payload.full_name,
+        "email": payload.email,
+        "phone": payload.phone,
+        "date_of_birth": payload.date_of_birth,
+        "age": payload.age,
+        "conditions": payload.conditions or [],
+        "allergies": payload.allergies or [],
+        "medications": payload.medications or [],
+        "emergency_contact_name": payload.emergency_contact_name,
+        "emergency_contact_phone": payload.emergency_contact_phone,
+        "notes": payload.notes,
+    }
+
+def queue_credentials_email(full_name: str, email: str, temp_password: str, doctor_id: str) -> str:
+    return email_dispatcher.enqueue(
+        owner=doctor_id,
+        to=email,
+        subject="Your PhysioCheck Account",
+        content=f"""Hello {full_name},
+
+Your physiotherapist has created an account for you.
+
+Login Email: {email}
+Temporary Password: {temp_password}
+
+Login here:
+https://physiocheck.vercel.app/login
+
+Please change your password after login.
+
+Best regards,
+PhysioCheck Team
+"""
+    )
+
 @router.get("/dashboard/stats")
-def get_dashboard_stats(request: Request):
+async def get_dashboard_stats(request: Request):
     try:
         doctor = request.state.user
         
@@ -39,42 +129,24 @@ def get_dashboard_stats(request: Request):
         if doctor.user_metadata.get("role") != "doctor":
             raise HTTPException(status_code=403, detail="Only doctors can view stats")
 
-        # Get doctor's database ID
-        # Using execute() directly allows checking data length safely
-        doc_res = supabase.from_("doctors").select("id").eq("auth_user_id", doctor.id).execute()
-        
-        if not doc_res.data or len(doc_res.data) == 0:
-            # Try to auto-create if missing (failsafe)
-            try:
-                new_doc = supabase.from_("doctors").insert({"auth_user_id": doctor.id}).execute()
-                if new_doc.data:
-                    doc_id = new_doc.data[0]["id"]
-                else:
-                    return {"activePatients": 0, "totalPatients": 0}
-            except:
-                return {"activePatients": 0, "totalPatients": 0}
-        else:
-            doc_id = doc_res.data[0]["id"]
+        # Get doctor's database ID (auto-created if missing as a failsafe)
+        try:
+            doc_id = await identity.doctor_id(doctor.id, create=True)
+        except:
+            doc_id = None
+
+        if not doc_id:
+            return {"activePatients": 0, "totalPatients": 0}
             
         # Get patient counts
         # We'll just count all patients for "total" and "active" for now
-        patients = supabase.from_("patients")\
-            .select("*", count="exact")\
-            .eq("doctor_id", doc_id)\
-            .execute()
-            
-        count = patients.count if patients.count is not None else 0
-        
-        return {
-            "activePatients": count,
-            "totalPatients": count
-        }
+        return await dashboard_stats.doctor(doc_id)
     except Exception as e:
         print(f"Error fetching stats: {e}")
         return {"activePatients": 0, "totalPatients": 0}
 
 @router.post("/create_patient")
-def create_patient(payload: CreatePatientPayload, request: Request):
+async def create_patient(payload: CreatePatientPayload, request: Request):
     try:
         doctor = request.state.user
         
@@ -82,46 +154,21 @@ def create_patient(payload: CreatePatientPayload, request: Request):
         if doctor.user_metadata.get("role") != "doctor":
             raise HTTPException(status_code=403, detail="Only doctors can create patients")
 
-        # Get doctor's database ID
-        doctor_res = supabase.from_("doctors").select("id").eq("auth_user_id", doctor.id).execute()
-        
-        if not doctor_res.data or len(doctor_res.data) == 0:
-            # Auto-create failsafe
-            try:
-                print(f"Doctor profile missing for {doctor.id}, attempting auto-create...")
-                new_doc = supabase.from_("doctors").insert({"auth_user_id": doctor.id}).execute()
-                if new_doc.data:
-                    doctor_db_id = new_doc.data[0]["id"]
-                else:
-                     raise HTTPException(status_code=404, detail="Doctor profile not found and could not be created")
-            except Exception as e:
-                print(f"Auto-create failed: {e}")
-                raise HTTPException(status_code=404, detail="Doctor profile not found")
-        else:
-            doctor_db_id = doctor_res.data[0]["id"]
+        # Get doctor's database ID (auto-created if missing as a failsafe)
+        try:
+            doctor_db_id = await identity.doctor_id(doctor.id, create=True)
+        except Exception as e:
+            print(f"Auto-create failed: {e}")
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+        if not doctor_db_id:
+            raise HTTPException(status_code=404, detail="Doctor profile not found and could not be created")
 
         # 1. Create auth user for patient
-        # Format: Name (first word, capitalized) + Last 4 digits of phone
-        try:
-            first_name = payload.full_name.split()[0].capitalize()
-            # Extract only digits from phone
-            phone_digits = "".join(filter(str.isdigit, payload.phone))
-            last_4 = phone_digits[-4:] if len(phone_digits) >= 4 else phone_digits.ljust(4, "0")
-            temp_password = f"{first_name}{last_4}"
-        except:
-            # Fallback if name/phone parsing fails
-            temp_password = secrets.token_urlsafe(8)
+        temp_password = make_temp_password(payload)
 
         try:
-            auth_res = supabase.auth.sign_up({
-                "email": payload.email,
-                "password": temp_password,
-                "options": {
-                    "data": {
-                        "role": "patient"
-                    }
-                }
-            })
+            auth_res = await sign_up_patient(payload.email, temp_password)
         except Exception as e:
             print(f"Error creating auth user: {e}")
             raise HTTPException(status_code=400, detail="Failed to create user account. Email may already be in use.")
@@ -132,31 +179,20 @@ def create_patient(payload: CreatePatientPayload, request: Request):
         patient_auth_id = auth_res.user.id
 
         # 2. Insert patient record
-        patient_data = {
-            "doctor_id": doctor_db_id,  # Use database ID, not auth ID
-            "auth_user_id": patient_auth_id,
-            "full_name": payload.full_name,
-            "email": payload.email,
-            "phone": payload.phone,
-            "date_of_birth": payload.date_of_birth,
-            "age": payload.age,
-            "conditions": payload.conditions or [],
-            "allergies": payload.allergies or [],
-            "medications": payload.medications or [],
-            "emergency_contact_name": payload.emergency_contact_name,
-            "emergency_contact_phone": payload.emergency_contact_phone,
-            "notes": payload.notes,
-        }
+        patient_data = build_patient_record(payload, doctor_db_id, patient_auth_id)
 
         try:
             print(f"Inserting into patients table: {patient_data}")
-            patient_res = supabase.from_("patients").insert(patient_data).execute()
+            patient_res = await db.from_("patients").insert(patient_data).execute()
             
             if not patient_res.data:
                 print("Insert returned no data")
                 raise Exception("Failed to insert patient record - no data returned")
                 
             print(f"Patient inserted successfully: {patient_res.data}")    
+            identity.remember_patient(patient_auth_id, patient_res.data[0])
+            patient_directory.invalidate(doctor_db_id)
+            dashboard_stats.invalidate("doctor", doctor_db_id)
         except Exception as e:
             # Rollback: delete the auth user
             try:
@@ -167,35 +203,19 @@ def create_patient(payload: CreatePatientPayload, request: Request):
             print(f"Error inserting patient: {e}")
             raise HTTPException(status_code=500, detail="Failed to create patient record")
 
-        # 3. Send email (if enabled)
+        # 3. Queue credentials email (if enabled); delivery happens in the background
+        email_job_id = None
         if payload.sendCredentials:
             try:
-                send_email(
-                    to=payload.email,
-                    subject="Your PhysioCheck Account",
-                    content=f"""Hello {payload.full_name},
-
-Your physiotherapist has created an account for you.
-
-Login Email: {payload.email}
-Temporary Password: {temp_password}
-
-Login here:
-https://physiocheck.vercel.app/login
-
-Please change your password after login.
-
-Best regards,
-PhysioCheck Team
-"""
-                )
+                email_job_id = queue_credentials_email(payload.full_name, payload.email, temp_password, doctor_db_id)
             except Exception as e:
-                print(f"Warning: Failed to send email: {e}")
+                print(f"Warning: Failed to queue email: {e}")
                 # Don't fail the entire operation if email fails
 
         return {
             "status": "success",
             "patient_id": patient_res.data[0]["id"],
+            "email_job_id": email_job_id,
             "message": "Patient created successfully"
         }
 
@@ -207,8 +227,219 @@ PhysioCheck Team
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to create patient: {str(e)}")
 
+def parse_import_rows(body: bytes, content_type: str) -> list:
+    """Decode an import body (JSON array or CSV with a header row) into raw row dicts."""
+    if "csv" in content_type:
+        text = body.decode("utf-8-sig")
+        rows = []
+        for record in csv.DictReader(io.StringIO(text)):
+            row = {}
+            for key, value in record.items():
+                if key is None:
+                    continue
+                value = (value or "").strip()
+                if not value:
+                    continue
+                if key in IMPORT_LIST_FIELDS:
+                    row[key] = [item.strip() for item in value.split(";") if item.strip()]
+                else:
+                    row[key] = value
+            rows.append(row)
+        return rows
+
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get("patients")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of patients")
+    return data
+
+def validate_import_rows(rows: list) -> tuple[list, list]:
+    """Split raw rows into (index, payload) pairs and per-row error reports."""
+    valid, invalid = [], []
+    seen_emails = set()
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Row must be an object")
+            payload = CreatePatientPayload(**row)
+        except (ValidationError, ValueError, TypeError) as e:
+            errors = e.errors() if isinstance(e, ValidationError) else None
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in errors
+            ) if errors else str(e)
+            invalid.append({"row": index, "status": "invalid", "email": row.get("email") if isinstance(row, dict) else None, "error": detail})
+            continue
+        email = payload.email.lower()
+        if email in seen_emails:
+            invalid.append({"row": index, "status": "invalid", "email": payload.email, "error": "Duplicate email in import"})
+            continue
+        seen_emails.add(email)
+        valid.append((index, payload))
+    return valid, invalid
+
+async def import_patient_batch(batch: list, doctor_db_id: str, semaphore: asyncio.Semaphore) -> list:
+    """
+    Sign up a batch of patients concurrently, then insert their records in one
+    request. Auth users whose patient record was not inserted are deleted
+    again, so a failed row can simply be imported once more.
+    """
+    # auth user id -> email, for accounts without a patient record yet
+    orphans = {}
+
+    async def sign_up(index, payload):
+        temp_password = make_temp_password(payload)
+        async with semaphore:
+            try:
+                auth_res = await sign_up_patient(payload.email, temp_password)
+            except Exception as e:
+                print(f"Import: error creating auth user {payload.email}: {e}")
+                return None, "Failed to create user account. Email may already be in use."
+        if not auth_res or not auth_res.user:
+            return None, "Failed to create user account"
+        orphans[auth_res.user.id] = payload.email
+        return (index, payload, temp_password, auth_res.user.id), None
+
+    try:
+        signed_up = await asyncio.gather(*(sign_up(index, payload) for index, payload in batch))
+
+        results = {}
+        accounts = []
+        for (index, payload), (account, error) in zip(batch, signed_up):
+            if account is None:
+                results[index] = {"row": index, "status": "failed", "email": payload.email, "error": error}
+            else:
+                accounts.append(account)
+
+        inserted = {}
+        if accounts:
+            records = [build_patient_record(payload, doctor_db_id, auth_id) for _, payload, _, auth_id in accounts]
+            try:
+                res = await db.from_("patients").insert(records).execute()
+                inserted = {row["auth_user_id"]: row for row in (res.data or [])}
+            except Exception as e:
+                # Isolate the offending rows instead of failing the whole batch
+                print(f"Import: batch insert failed, retrying row by row: {e}")
+                for record in records:
+                    try:
+                        res = await db.from_("patients").insert(record).execute()
+                        if res.data:
+                            inserted[record["auth_user_id"]] = res.data[0]
+                    except Exception as row_error:
+                        print(f"Import: error inserting patient {record['email']}: {row_error}")
+        for auth_id in inserted:
+            orphans.pop(auth_id, None)
+    finally:
+        for auth_id, email in orphans.items():
+            try:
+                await delete_auth_user(auth_id)
+            except Exception as e:
+                print(f"Import: could not delete orphaned auth user {email}: {e}")
+
+    for index, payload, temp_password, auth_id in accounts:
+        patient = inserted.get(auth_id)
+        if patient is None:
+            results[index] = {"row": index, "status": "failed", "email": payload.email, "error": "Failed to create patient record"}
+            continue
+        identity.remember_patient(auth_id, patient)
+        email_job_id = None
+        if payload.sendCredentials:
+            try:
+                email_job_id = queue_credentials_email(payload.full_name, payload.email, temp_password, doctor_db_id)
+            except Exception as e:
+                print(f"Warning: Failed to queue email: {e}")
+        results[index] = {
+            "row": index,
+            "status": "created",
+            "email": payload.email,
+            "patient_id": patient["id"],
+            "email_job_id": email_job_id,
+        }
+
+    return [results[index] for index, _ in batch]
+
+@router.post("/patients/import")
+async def import_patients(request: Request):
+    """
+    Bulk onboarding from a JSON array of create_patient payloads or a CSV
+    file (header row with the same field names; list fields separated by
+    ";"). Every row is validated before any account is created. Progress
+    streams back as NDJSON: one "validated" line, a "row" line per patient,
+    a "progress" line per batch and a final "done" summary.
+    """
+    doctor = request.state.user
+
+    if doctor.user_metadata.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors can import patients")
+
+    try:
+        doctor_db_id = await identity.doctor_id(doctor.id, create=True)
+    except Exception as e:
+        print(f"Auto-create failed: {e}")
+        doctor_db_id = None
+
+    if not doctor_db_id:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+    body = await request.body()
+    try:
+        rows = parse_import_rows(body, request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse import: {e}")
+
+    if not rows:
+        raise HTTPException(status_code=400, detail="Import contains no patients")
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Imports are limited to {IMPORT_MAX_ROWS} patients")
+
+    valid, invalid = validate_import_rows(rows)
+
+    async def stream():
+        def line(message: dict) -> str:
+            return json.dumps(message, default=str) + "\n"
+
+        yield line({"event": "validated", "total": len(rows), "valid": len(valid), "invalid": len(invalid)})
+        for result in invalid:
+            yield line({"event": "row", **result})
+
+        semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        created = failed = 0
+        try:
+            for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+                batch = valid[start:start + IMPORT_BATCH_SIZE]
+                # Shielded: a client disconnect stops the stream between batches,
+                # never between a row's auth user and its patient record
+                results = await asyncio.shield(import_patient_batch(batch, doctor_db_id, semaphore))
+                for result in results:
+                    if result["status"] == "created":
+                        created += 1
+                    else:
+                        failed += 1
+                    yield line({"event": "row", **result})
+                yield line({"event": "progress", "processed": start + len(batch), "total": len(valid)})
+        finally:
+            if created:
+                patient_directory.invalidate(doctor_db_id)
+                dashboard_stats.invalidate("doctor", doctor_db_id)
+
+        yield line({"event": "done", "created": created, "failed": failed, "invalid": len(invalid)})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @router.get("/patients")
-def list_patients(request: Request):
+async def list_patients(
+    request: Request,
+    response: Response,
+    limit: int = Query(PATIENT_LIST_PAGE_SIZE, ge=1, le=PATIENT_LIST_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    view: str = Query("summary", pattern="^(summary|full)$")
+):
+    """
+    Newest-first patient list for the calling doctor. `q` filters by name or
+    email prefix, `view=full` returns complete records instead of summaries,
+    and the X-Next-Cursor response header pages through the results.
+    """
     try:
         doctor = request.state.user
         
@@ -217,51 +448,78 @@ def list_patients(request: Request):
             raise HTTPException(status_code=403, detail="Only doctors can view patient list")
         
         # Get doctor's database ID
-        doctor_res = supabase.from_("doctors").select("id").eq("auth_user_id", doctor.id).execute()
+        doctor_db_id = await identity.doctor_id(doctor.id)
         
-        if not doctor_res.data or len(doctor_res.data) == 0:
+        if not doctor_db_id:
             return []
         
-        doctor_db_id = doctor_res.data[0]["id"]
+        # Summaries and the search index are cached per doctor
+        directory = await patient_directory.get(doctor_db_id)
+        patients = directory.search(q) if q else directory.summaries
         
-        # Get patients for this doctor only
-        patients = supabase.from_("patients")\
-            .select("*")\
-            .eq("doctor_id", doctor_db_id)\
-            .order("created_at", desc=True)\
-            .execute()
+        if cursor:
+            created_at, patient_id = decode_cursor(cursor, 2)
+            after = (str(created_at), str(patient_id))
+            patients = [p for p in patients if (str(p["created_at"]), str(p["id"])) < after]
+        
+        page = patients[:limit]
+        if len(patients) > limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1]["created_at"], page[-1]["id"])
         
-        return patients.data or []
+        if view == "full" and page:
+            full_res = await db.from_("patients")\
+                .select("*")\
+                .eq("doctor_id", doctor_db_id)\
+                .in_("id", [p["id"] for p in page])\
+                .execute()
+            by_id = {p["id"]: p for p in (full_res.data or [])}
+            page = [by_id[p["id"]] for p in page if p["id"] in by_id]
+        
+        return page
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching patients: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch patients")
 
-        print(f"Error fetching patient: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch patient details")
-
 @router.get("/patients/{patient_id}/stats")
-def get_patient_stats(patient_id: str, request: Request):
-    # Stub for stats
-    return {
-        "totalSessions": 12,
-        "avgAccuracy": 85,
-        "totalDuration": 120,
-        "compliance": 90,
-        "lastSession": "2023-11-01T10:00:00Z",
-        "nextAppointment": "2023-11-15T09:00:00Z"
-    }
+async def get_patient_stats(patient_id: str, request: Request):
+    try:
+        doctor = request.state.user
+        if doctor.user_metadata.get("role") != "doctor":
+            raise HTTPException(status_code=403, detail="Only doctors can view patient stats")
+
+        doctor_db_id = await identity.doctor_id(doctor.id)
+        if not doctor_db_id:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+        # Only this doctor's own patients
+        patient_res = await db.from_("patients")\
+            .select("id")\
+            .eq("id", patient_id)\
+            .eq("doctor_id", doctor_db_id)\
+            .limit(1)\
+            .execute()
+        if not patient_res.data:
+            raise HTTPException(status_code=404, detail="Patient not found")
+
+        # Aggregates are cached in memory and refreshed from the database
+        return await patient_stats.get(patient_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching patient stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch patient stats")
 
 @router.get("/patients/{patient_id}/exercises")
-def get_patient_exercises(patient_id: str, request: Request):
+async def get_patient_exercises(patient_id: str, request: Request):
     try:
         doctor = request.state.user
         if doctor.user_metadata.get("role") != "doctor":
             raise HTTPException(status_code=403, detail="Only doctors can view patient exercises")
 
         # Get exercises assigned to this patient
-        exercises = supabase.from_("assigned_exercises")\
+        exercises = await db.from_("assigned_exercises")\
             .select("*, exercises(*)")\
             .eq("patient_id", patient_id)\
             .order("assigned_at", desc=True)\
@@ -273,7 +531,7 @@ def get_patient_exercises(patient_id: str, request: Request):
         return []
 
 @router.get("/patients/{patient_id}")
-def get_patient(patient_id: str, request: Request):
+async def get_patient(patient_id: str, request: Request):
     try:
         doctor = request.state.user
         
@@ -282,15 +540,13 @@ def get_patient(patient_id: str, request: Request):
             raise HTTPException(status_code=403, detail="Only doctors can view patient details")
         
         # Get doctor's database ID
-        doctor_res = supabase.from_("doctors").select("id").eq("auth_user_id", doctor.id).execute()
+        doctor_db_id = await identity.doctor_id(doctor.id)
         
-        if not doctor_res.data or len(doctor_res.data) == 0:
+        if not doctor_db_id:
             raise HTTPException(status_code=404, detail="Doctor profile not found")
         
-        doctor_db_id = doctor_res.data[0]["id"]
-        
         # Get patient and verify it belongs to this doctor
-        patient_res = supabase.from_("patients")\
+        patient_res = await db.from_("patients")\
             .select("*")\
             .eq("id", patient_id)\
             .eq("doctor_id", doctor_db_id)\
@@ -307,7 +563,7 @@ def get_patient(patient_id: str, request: Request):
         raise HTTPException(status_code=500, detail="Failed to fetch patient details")
 
 @router.get("/sessions/active")
-def get_active_sessions(request: Request):
+async def get_active_sessions(request: Request):
     try:
         doctor = request.state.user
         
@@ -316,54 +572,34 @@ def get_active_sessions(request: Request):
             raise HTTPException(status_code=403, detail="Only doctors can view sessions")
         
         # Get doctor's database ID
-        doctor_res = supabase.from_("doctors").select("id").eq("auth_user_id", doctor.id).execute()
-        
-        if not doctor_res.data or len(doctor_res.data) == 0:
+        doctor_db_id = await identity.doctor_id(doctor.id)
+        if not doctor_db_id:
             return []
             
-        # 2. Get sessions (FOR DEMO: showing ALL sessions regardless of doctor assignment)
-        # Manual fetch strategy to avoid join crashes
-        sessions_res = supabase.from_("exercise_sessions")\
-            .select("*")\
-            .eq("status", "in_progress")\
-            .order("created_at", desc=True)\
-            .limit(20)\
-            .execute()
-            
-        sessions = sessions_res.data or []
+        # Sessions come from the in-memory active-session index, scoped to this doctor
+        await active_sessions.ready()
+        sessions = active_sessions.for_doctor(doctor_db_id, limit=20)
         
         if not sessions:
             return []
-            
-        # Collect IDs
-        patient_ids = list(set([s["patient_id"] for s in sessions if s.get("patient_id")]))
-        exercise_ids = list(set([s["exercise_id"] for s in sessions if s.get("exercise_id")]))
         
-        # Fetch related data
-        patients_map = {}
-        if patient_ids:
-            p_res = supabase.from_("patients").select("id, full_name").in_("id", patient_ids).execute()
-            if p_res.data:
-                patients_map = {p["id"]: p for p in p_res.data}
-                
-        exercises_map = {}
-        if exercise_ids:
-            # Column is 'name' not 'title' based on exercises.py
-            e_res = supabase.from_("exercises").select("id, name").in_("id", exercise_ids).execute()
-            if e_res.data:
-                exercises_map = {e["id"]: e for e in e_res.data}
+        # Names come from the cached patient directory and exercise catalog
+        if any(patient_directory.name(s["patient_id"]) is None for s in sessions):
+            await patient_directory.get(doctor_db_id)
         
         # Merge data
         enriched_sessions = []
-        for s in sessions:
-            s["patients"] = patients_map.get(s["patient_id"], {"full_name": "Unknown"})
+        for session in sessions:
+            s = {k: v for k, v in session.items() if k != "doctor_id"}
+            s["patients"] = {"full_name": patient_directory.name(s["patient_id"]) or "Unknown"}
             # Mapping 'name' to 'title' for frontend compatibility if frontend expects title,
             # OR just pass 'name' and update frontend.
             # Frontend doctor/sessions/page.tsx: exerciseName: item.exercises?.title || ...
             # I should provide 'title' key locally or update frontend.
             # Let's map it here to keep frontend happy.
-            ex_data = exercises_map.get(s["exercise_id"], {"name": "Unknown"})
+            ex_data = await exercise_catalog.get(s["exercise_id"]) or {"name": "Unknown"}
             s["exercises"] = {"title": ex_data.get("name", "Unknown")} 
+            s["patient_online"] = active_sessions.is_online(s["patient_id"])
             enriched_sessions.append(s)
             
         return enriched_sessions
@@ -377,32 +613,84 @@ def get_active_sessions(request: Request):
         return []
 
 @router.post("/assignments")
-def assign_exercise(payload: AssignExercisePayload, request: Request):
+async def assign_exercise(payload: AssignExercisePayload, request: Request):
+    """
+    Assign an exercise to several of the doctor's patients. Safe to retry:
+    rows are upserted per (patient, exercise) and a repeated Idempotency-Key
+    header replays the original result. Ids that aren't the doctor's
+    patients are reported as "not_found" instead of failing the request.
+    """
     try:
         doctor = request.state.user
         if doctor.user_metadata.get("role") != "doctor":
             raise HTTPException(status_code=403, detail="Only doctors can assign exercises")
 
-        # Prepare records for insertion
-        records = []
-        for pid in payload.patient_ids:
-            records.append({
-                "patient_id": pid,
-                "exercise_id": payload.exercise_id,
-                "sets": payload.sets,
-                "reps": payload.reps,
-                "frequency": payload.frequency,
-                "notes": payload.notes
-            })
-            
-        if not records:
+        if not payload.patient_ids:
              raise HTTPException(status_code=400, detail="No patients selected")
 
-        # Bulk insert
-        res = supabase.from_("assigned_exercises").insert(records).execute()
-        
-        return {"status": "success", "message": f"Assigned to {len(records)} patients"}
+        doctor_db_id = await identity.doctor_id(doctor.id)
+        if not doctor_db_id:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
 
+        if not await exercise_catalog.get(payload.exercise_id, refresh_on_miss=True):
+            raise HTTPException(status_code=404, detail="Exercise not found")
+
+        try:
+            report = await assignment_engine.assign(
+                doctor_db_id,
+                payload.exercise_id,
+                payload.patient_ids,
+                {
+                    "sets": payload.sets,
+                    "reps": payload.reps,
+                    "frequency": payload.frequency,
+                    "notes": payload.notes
+                },
+                idempotency_key=request.headers.get("Idempotency-Key")
+            )
+        except IdempotencyConflict:
+            raise HTTPException(status_code=409, detail="Idempotency-Key was already used with a different request")
+
+        for pid in report["assigned"]:
+            patient_stats.invalidate_assignments(pid)
+            dashboard_stats.invalidate("patient", pid)
+
+        counts = report["counts"]
+        if not counts["assigned"]:
+            if counts["failed"]:
+                raise HTTPException(status_code=500, detail="Failed to assign exercises")
+            raise HTTPException(status_code=404, detail="None of the selected patients were found")
+
+        return {
+            "status": "success" if counts["assigned"] == len(report["results"]) else "partial",
+            "message": f"Assigned to {counts['assigned']} patients",
+            **report
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error assigning exercises: {e}")
-        raise HTTPException(status_code=500, detail="Failed to assign exercises")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to assign exercises")
+
+@router.get("/emails/status")
+async def email_status(request: Request):
+    doctor = request.state.user
+    if doctor.user_metadata.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors can view email status")
+    doctor_db_id = await identity.doctor_id(doctor.id)
+    if not doctor_db_id:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+    return email_dispatcher.stats(doctor_db_id)
+
+@router.get("/emails/{job_id}")
+async def email_job_status(job_id: str, request: Request):
+    doctor = request.state.user
+    if doctor.user_metadata.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors can view email status")
+    doctor_db_id = await identity.doctor_id(doctor.id)
+    # Other doctors' jobs look the same as unknown ones
+    job = email_dispatcher.job(job_id, doctor_db_id) if doctor_db_id else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Email job not found")
+    return job
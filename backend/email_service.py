@@ -1,41 +1,210 @@
 import smtplib
 from email.message import EmailMessage
 import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict, deque
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
 
-def send_email(to: str, subject: str, content: str):
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "1"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("EMAIL_RETRY_BASE_DELAY", "2"))
+EMAIL_JOB_HISTORY = 1000
+EMAIL_DEAD_LETTER_SIZE = 200
+
+def _smtp_settings():
+    settings = {
+        "host": os.getenv("SMTP_HOST"),
+        "port": os.getenv("SMTP_PORT"),
+        "user": os.getenv("SMTP_USER"),
+        "password": os.getenv("SMTP_PASS"),
+        "sender": os.getenv("SMTP_FROM"),
+    }
+    return settings if all(settings.values()) else None
+
+class EmailJob:
+    __slots__ = ("id", "owner", "to", "subject", "content", "status", "attempts", "error",
+                 "created_at", "sent_at")
+
+    def __init__(self, to: str, subject: str, content: str, owner: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        # Who queued it (the doctor's id); only they can look the job up
+        self.owner = owner
+        self.to = to
+        self.subject = subject
+        self.content = content
+        self.status = "queued"
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.sent_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        # Never expose content: credential emails contain temporary passwords
+        return {
+            "id": self.id,
+            "to": self.to,
+            "subject": self.subject,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "sent_at": self.sent_at,
+        }
+
+
+class EmailDispatcher:
     """
-    Send email with proper error handling.
-    Raises exception if email cannot be sent.
+    Background email queue. Worker tasks each keep one authenticated SMTP
+    connection open and reuse it across messages (reconnecting when the
+    server drops it). Failed sends are retried with exponential backoff up
+    to EMAIL_MAX_ATTEMPTS, then moved to a bounded dead-letter list.
     """
-    try:
-        # Check if SMTP settings are configured
-        smtp_host = os.getenv("SMTP_HOST")
-        smtp_port = os.getenv("SMTP_PORT")
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_pass = os.getenv("SMTP_PASS")
-        smtp_from = os.getenv("SMTP_FROM")
-        
-        if not all([smtp_host, smtp_port, smtp_user, smtp_pass, smtp_from]):
+    def __init__(self, workers: int = EMAIL_WORKERS, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 retry_base_delay: float = EMAIL_RETRY_BASE_DELAY):
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._connections: dict[int, smtplib.SMTP] = {}
+        self._jobs: OrderedDict[str, EmailJob] = OrderedDict()
+        self.dead_letters: deque[EmailJob] = deque(maxlen=EMAIL_DEAD_LETTER_SIZE)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=EMAIL_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.worker_count)]
+
+    def enqueue(self, to: str, subject: str, content: str, owner: Optional[str] = None) -> str:
+        """Queue an email on behalf of `owner` and return its job id; never blocks on SMTP."""
+        job = EmailJob(to, subject, content, owner)
+        self._jobs[job.id] = job
+        while len(self._jobs) > EMAIL_JOB_HISTORY:
+            self._jobs.popitem(last=False)
+
+        if self._queue is None:
+            self.start()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._dead_letter(job, "Email queue full")
+        return job.id
+
+    def _dead_letter(self, job: EmailJob, error: str):
+        job.status = "failed"
+        job.error = error
+        job.content = ""
+        self.failed += 1
+        self.dead_letters.append(job)
+        print(f"Email to {job.to} dead-lettered: {error}")
+
+    async def _retry_later(self, job: EmailJob, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._dead_letter(job, "Email queue full")
+
+    async def _worker(self, worker: int):
+        while True:
+            job = await self._queue.get()
+            job.attempts += 1
+            job.status = "sending"
+            try:
+                sent = await run_in_threadpool(self._send, worker, job)
+                job.status = "sent" if sent else "skipped"
+                job.sent_at = time.time() if sent else None
+                job.content = ""
+                if sent:
+                    self.sent += 1
+            except Exception as e:
+                self._drop_connection(worker)
+                if job.attempts >= self.max_attempts:
+                    self._dead_letter(job, str(e))
+                else:
+                    job.status = "retrying"
+                    job.error = str(e)
+                    self.retried += 1
+                    delay = self.retry_base_delay * (2 ** (job.attempts - 1))
+                    asyncio.create_task(self._retry_later(job, delay))
+            finally:
+                self._queue.task_done()
+
+    def _connect(self, settings: dict) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings["host"], int(settings["port"]), timeout=10)
+        server.starttls()
+        server.login(settings["user"], settings["password"])
+        return server
+
+    def _drop_connection(self, worker: int):
+        server = self._connections.pop(worker, None)
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _send(self, worker: int, job: EmailJob) -> bool:
+        # Runs in the threadpool; one connection per worker, so no sharing across threads
+        settings = _smtp_settings()
+        if settings is None:
             print("Warning: SMTP settings not fully configured. Skipping email.")
             return False
-        
+
         msg = EmailMessage()
-        msg["From"] = smtp_from
-        msg["To"] = to
-        msg["Subject"] = subject
-        msg.set_content(content)
-
-        with smtplib.SMTP(smtp_host, int(smtp_port), timeout=10) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-        
-        print(f"Email sent successfully to {to}")
+        msg["From"] = settings["sender"]
+        msg["To"] = job.to
+        msg["Subject"] = job.subject
+        msg.set_content(job.content)
+
+        server = self._connections.get(worker)
+        if server is not None:
+            try:
+                server.send_message(msg)
+                return True
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection was closed by the server; reconnect below
+                self._drop_connection(worker)
+
+        server = self._connect(settings)
+        self._connections[worker] = server
+        server.send_message(msg)
         return True
-        
-    except smtplib.SMTPException as e:
-        print(f"SMTP error sending email to {to}: {e}")
-        raise Exception(f"Failed to send email: {str(e)}")
-    except Exception as e:
-        print(f"Error sending email to {to}: {e}")
-        raise Exception(f"Failed to send email: {str(e)}")
\ No newline at end of file
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        for worker in list(self._connections):
+            server = self._connections.pop(worker)
+            try:
+                await run_in_threadpool(server.quit)
+            except Exception:
+                pass
+
+    def job(self, job_id: str, owner: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job and job.owner == owner else None
+
+    def stats(self, owner: str) -> dict:
+        """Queue-wide counters, plus the dead letters of `owner`'s own jobs."""
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "workers": len(self._workers),
+            "open_connections": len(self._connections),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dead_letters": [job.to_dict() for job in self.dead_letters if job.owner == owner],
+        }
+
+
+email_dispatcher = EmailDispatcher()
@@ -0,0 +1,103 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+from typing import Optional
+from async_database import db
+
+CATALOG_TTL = int(os.getenv("EXERCISE_CATALOG_TTL", "300"))
+# Minimum age before a lookup miss may force a reload (guards against id probing)
+CATALOG_MISS_RELOAD_INTERVAL = 5
+
+
+def compute_etag(data) -> str:
+    body = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ExerciseCatalog:
+    """
+    In-process copy of the `exercises` table. Loaded once on first use, then
+    reloaded in the background whenever it is older than `ttl`; readers are
+    always served from memory (stale data while a reload is in flight).
+    """
+    def __init__(self, ttl: int = CATALOG_TTL):
+        self.ttl = ttl
+        self._items: list[dict] = []
+        self._by_id: dict[str, dict] = {}
+        self._item_etags: dict[str, str] = {}
+        self.etag: Optional[str] = None
+        self.version = 0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.etag is not None
+
+    async def _load(self):
+        res = await db.from_("exercises")\
+            .select("*")\
+            .order("name")\
+            .execute()
+
+        items = res.data or []
+        etag = compute_etag(items)
+        if etag != self.etag:
+            self._items = items
+            self._by_id = {str(item["id"]): item for item in items}
+            self._item_etags = {key: compute_etag(item) for key, item in self._by_id.items()}
+            self.etag = etag
+            self.version += 1
+        self._loaded_at = time.time()
+
+    async def _refresh(self):
+        try:
+            async with self._lock:
+                await self._load()
+        except Exception as e:
+            print(f"Error refreshing exercise catalog: {e}")
+            # Back off until the next TTL window instead of retrying every request
+            self._loaded_at = time.time()
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self._load()
+        elif time.time() - self._loaded_at > self.ttl:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def all(self) -> list[dict]:
+        await self.ensure_loaded()
+        return self._items
+
+    async def get(self, exercise_id: str, refresh_on_miss: bool = False) -> Optional[dict]:
+        """Look up one exercise. `refresh_on_miss` reloads once for ids added since the last load."""
+        await self.ensure_loaded()
+        item = self._by_id.get(str(exercise_id))
+        if item is None and refresh_on_miss and time.time() - self._loaded_at > CATALOG_MISS_RELOAD_INTERVAL:
+            async with self._lock:
+                await self._load()
+            item = self._by_id.get(str(exercise_id))
+        return item
+
+    def etag_for(self, exercise_id: str) -> Optional[str]:
+        return self._item_etags.get(str(exercise_id))
+
+    def invalidate(self):
+        """Force the next read to trigger a background reload."""
+        self._loaded_at = 0.0
+
+
+exercise_catalog = ExerciseCatalog()
@@ -1,38 +1,49 @@
-from fastapi import APIRouter, HTTPException, Request
-from database import supabase
+from fastapi import APIRouter, HTTPException, Request, Response
+from exercise_catalog import exercise_catalog, etag_matches
 
 router = APIRouter(prefix="/exercises", tags=["Exercises"])
 
+# Clients may cache but must revalidate with If-None-Match
+CATALOG_CACHE_CONTROL = "no-cache"
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL})
+
 @router.get("")
-def list_exercises(request: Request):
+async def list_exercises(request: Request, response: Response):
     """Get all available exercises"""
     try:
-        exercises = supabase.from_("exercises")\
-            .select("*")\
-            .order("name")\
-            .execute()
-        
-        return exercises.data or []
+        exercises = await exercise_catalog.all()
+        etag = exercise_catalog.etag
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return _not_modified(etag)
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+        return exercises
     except Exception as e:
         print(f"Error fetching exercises: {e}")
         raise HTTPException(500, "Failed to fetch exercises")
 
 @router.get("/{id}")
-def exercise_details(id: str, request: Request):
+async def exercise_details(id: str, request: Request, response: Response):
     """Get detailed information about a specific exercise"""
     try:
-        exercise = supabase.from_("exercises")\
-            .select("*")\
-            .eq("id", id)\
-            .single()\
-            .execute()
-        
-        if not exercise.data:
+        exercise = await exercise_catalog.get(id, refresh_on_miss=True)
+
+        if not exercise:
             raise HTTPException(404, "Exercise not found")
-        
-        return exercise.data
+
+        etag = exercise_catalog.etag_for(id)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return _not_modified(etag)
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+        return exercise
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error fetching exercise details: {e}")
-        raise HTTPException(500, "Failed to fetch exercise details")
\ No newline at end of file
+        raise HTTPException(500, "Failed to fetch exercise details")
@@ -0,0 +1,92 @@
+import os
+import time
+from typing import Optional
+from async_database import db
+
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", "600"))
+
+
+class IdentityResolver:
+    """
+    Caches auth_user_id -> patients/doctors row ids so endpoints don't spend a
+    PostgREST round-trip resolving the caller on every request.
+    Only found rows are cached; call `invalidate` when profile rows change.
+    """
+    def __init__(self, ttl: int = IDENTITY_CACHE_TTL):
+        self.ttl = ttl
+        # auth_user_id -> (expires_at, {"id": ..., "doctor_id": ...})
+        self._patients: dict[str, tuple[float, dict]] = {}
+        # auth_user_id -> (expires_at, doctor row id)
+        self._doctors: dict[str, tuple[float, str]] = {}
+
+    def _fresh(self, cache: dict, key: str):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del cache[key]
+            return None
+        return entry[1]
+
+    def remember_patient(self, auth_user_id: str, row: dict):
+        self._patients[auth_user_id] = (
+            time.time() + self.ttl,
+            {"id": row["id"], "doctor_id": row.get("doctor_id")}
+        )
+
+    def remember_doctor(self, auth_user_id: str, doctor_id: str):
+        self._doctors[auth_user_id] = (time.time() + self.ttl, doctor_id)
+
+    def invalidate(self, auth_user_id: str):
+        self._patients.pop(auth_user_id, None)
+        self._doctors.pop(auth_user_id, None)
+
+    async def patient(self, auth_user_id: str) -> Optional[dict]:
+        """Return {"id", "doctor_id"} for the patient profile, or None."""
+        cached = self._fresh(self._patients, auth_user_id)
+        if cached is not None:
+            return cached
+
+        res = await db.from_("patients")\
+            .select("id, doctor_id")\
+            .eq("auth_user_id", auth_user_id)\
+            .limit(1)\
+            .execute()
+
+        if not res.data:
+            return None
+
+        self.remember_patient(auth_user_id, res.data[0])
+        return self._patients[auth_user_id][1]
+
+    async def patient_id(self, auth_user_id: str) -> Optional[str]:
+        patient = await self.patient(auth_user_id)
+        return patient["id"] if patient else None
+
+    async def doctor_id(self, auth_user_id: str, create: bool = False) -> Optional[str]:
+        """
+        Return the doctors row id. With `create=True` a missing profile is
+        auto-created (the failsafe the doctor endpoints rely on).
+        """
+        cached = self._fresh(self._doctors, auth_user_id)
+        if cached is not None:
+            return cached
+
+        res = await db.from_("doctors").select("id").eq("auth_user_id", auth_user_id).execute()
+
+        if res.data:
+            doctor_id = res.data[0]["id"]
+        elif create:
+            print(f"Doctor profile missing for {auth_user_id}, attempting auto-create...")
+            new_doc = await db.from_("doctors").insert({"auth_user_id": auth_user_id}).execute()
+            if not new_doc.data:
+                return None
+            doctor_id = new_doc.data[0]["id"]
+        else:
+            return None
+
+        self.remember_doctor(auth_user_id, doctor_id)
+        return doctor_id
+
+
+identity = IdentityResolver()
@@ -0,0 +1,143 @@
+"""
+Load test: websocket latency while session writes hit the database.
+
+Starts a stand-in PostgREST server (every request answers after
+--db-latency ms), then runs --sockets simulated websocket streams at 30
+frames/s on one event loop while --writers tasks keep updating
+exercise_sessions, the way update_session does. Each run reports how late
+frames were delivered (event-loop stall as seen by a live socket) and how
+long the writes took.
+
+  sync     the old path: the blocking `database.supabase` client called
+           from an async handler, as the routers did before async_database
+  default  an AsyncPostgrestClient on postgrest's own default session
+           (what `db` ran on while the pool settings were not applied)
+  pooled   the shared `async_database.db` client on its pooled HTTP/2 session
+
+Usage: python load_test_db.py [--sockets 200] [--writers 20] [--seconds 5]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+FRAME_INTERVAL = 1 / 30
+
+
+def start_fake_postgrest(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            time.sleep(latency)
+            body = json.dumps([{"id": "s1", "patient_id": "p1", "status": "in_progress"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_PATCH = do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    # Room in the accept backlog for every pooled connection opening at once
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def socket_stream(deadline: float, delays: list):
+    """One live stream: a frame is due every FRAME_INTERVAL; record how late each goes out."""
+    loop = asyncio.get_running_loop()
+    due = loop.time()
+    while due < deadline:
+        due += FRAME_INTERVAL
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        delays.append(max(0.0, loop.time() - due) * 1000)
+
+
+async def writer(mode: str, client, deadline: float, durations: list):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        started = time.perf_counter()
+        if mode == "sync":
+            client.table("exercise_sessions").update({"repetitions": 1}).eq("id", "s1").execute()
+        else:
+            await client.from_("exercise_sessions").update({"repetitions": 1}).eq("id", "s1").execute()
+        durations.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def run(mode: str, sockets: int, writers: int, seconds: float) -> dict:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    delays, durations = [], []
+    if mode == "sync":
+        from database import supabase as client
+    elif mode == "default":
+        from postgrest import AsyncPostgrestClient
+        from async_database import DB_URL, DB_HEADERS
+        client = AsyncPostgrestClient(DB_URL, headers=DB_HEADERS)
+    else:
+        from async_database import db as client
+    await asyncio.gather(
+        *(socket_stream(deadline, delays) for _ in range(sockets)),
+        *(writer(mode, client, deadline, durations) for _ in range(writers)),
+    )
+    if mode != "sync":
+        await client.aclose()
+    return {
+        "mode": mode,
+        "frames": len(delays),
+        "writes": len(durations),
+        "frame_p50": percentile(delays, 50),
+        "frame_p99": percentile(delays, 99),
+        "frame_max": max(delays, default=0.0),
+        "write_p99": percentile(durations, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sockets", type=int, default=200)
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--db-latency", type=float, default=20, help="ms per database request")
+    args = parser.parse_args()
+
+    server = start_fake_postgrest(args.db_latency / 1000)
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "load-test")
+
+    print(f"{args.sockets} sockets at 30 fps, {args.writers} writers, "
+          f"{args.db_latency:.0f} ms database latency, {args.seconds:.0f} s per run")
+    for mode in ("sync", "default", "pooled"):
+        r = asyncio.run(run(mode, args.sockets, args.writers, args.seconds))
+        print(f"{r['mode']:7s}  frames={r['frames']:6d}  writes={r['writes']:5d}  "
+              f"frame delay p50={r['frame_p50']:7.1f} ms  p99={r['frame_p99']:7.1f} ms  "
+              f"max={r['frame_max']:7.1f} ms  write p99={r['write_p99']:7.1f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from middleware import supabase_auth_middleware
+from token_verifier import verifier
+from async_database import close_db
+from telemetry import telemetry
+from active_sessions import active_sessions
+from email_service import email_dispatcher
+from session_writes import session_writes
+from replay_buffer import replay_buffer
+from pose_scoring import pose_scoring
+from rep_counter import rep_counters
+from motion_templates import motion_templates
+from motion_analytics import motion_analytics
 from auth import router as auth_router
 from doctor import router as doctor_router
 from patients import router as patient_router
 from exercises import router as exercises_router
 from sessions import router as sessions_router
-from websocket import router as websocket_router
+from websocket import router as websocket_router, manager, coalescer
 
 app = FastAPI(
     title="PhysioCheck Backend",
@@ -15,6 +26,22 @@ app = FastAPI(
     openapi_url="/api/v1/openapi.json"
 )
 
+@app.on_event("startup")
+async def startup():
+    await manager.start()
+    telemetry.start()
+    active_sessions.start()
+    email_dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await manager.close()
+    await session_writes.close()
+    await active_sessions.close()
+    await email_dispatcher.close()
+    await telemetry.close()
+    await close_db()
+
 # Auth middleware
 app.middleware("http")(supabase_auth_middleware)
 
@@ -49,6 +76,35 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/v1/health/auth-cache")
+def auth_cache_stats():
+    return verifier.stats()
+
+@app.get("/api/v1/health/websockets")
+def websocket_stats():
+    return {
+        "connections": manager.stats(),
+        "coalescer": coalescer.stats(),
+        "replay": replay_buffer.stats()
+    }
+
+@app.get("/api/v1/health/telemetry")
+def telemetry_stats():
+    return telemetry.stats()
+
+@app.get("/api/v1/health/analysis")
+def analysis_stats():
+    return {
+        "pose_scoring": pose_scoring.stats(),
+        "rep_counter": rep_counters.stats(),
+        "motion_templates": motion_templates.stats(),
+        "motion_analytics": motion_analytics.stats()
+    }
+
+@app.get("/api/v1/health/session-writes")
+def session_write_stats():
+    return session_writes.stats()
+
 if __name__ == "__main__":
     import uvicorn
     import os
@@ -1,6 +1,6 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from database import supabase
+from token_verifier import verifier
 
 async def supabase_auth_middleware(request: Request, call_next):
     # Skip auth for public routes
@@ -35,14 +35,14 @@ async def supabase_auth_middleware(request: Request, call_next):
     token = auth_header.replace("Bearer ", "")
     
     try:
-        # Verify token with Supabase
-        user_data = supabase.auth.get_user(token)
+        # Verify token locally (cached), falling back to Supabase on a miss
+        user = await verifier.verify(token)
         
-        if not user_data or not user_data.user:
+        if not user:
             return JSONResponse(status_code=401, content={"detail": "Invalid token"})
         
         # Store user in request state
-        request.state.user = user_data.user
+        request.state.user = user
         
     except Exception as e:
         with open("debug_auth.log", "a") as f:
@@ -0,0 +1,299 @@
+"""
+Incremental fatigue and anomaly detection on the live joint-angle stream.
+
+Per session and joint this keeps a Welford running mean/variance and a
+ring buffer of the last ANALYTICS_WINDOW frames. Every frame is checked
+against the running statistics (a joint far outside its usual spread
+suggests compensation or a tracking glitch); every full window yields a
+range of motion that is compared with the session's baseline (the first
+ANALYTICS_BASELINE_WINDOWS windows), and sustained shrinkage is reported
+as fatigue.
+
+All state lives in arrays allocated when the session opens; the per-frame
+path only writes into them (NumPy `out=` throughout), so memory per
+session is constant.
+"""
+import os
+from collections import OrderedDict
+from typing import Optional, Union
+
+import numpy as np
+
+from wire import JOINTS, JOINT_IDS, WireError, unpack_frame
+
+# Frames per range-of-motion window (~3 s at 30 fps)
+ANALYTICS_WINDOW = int(os.getenv("ANALYTICS_WINDOW", "90"))
+ANALYTICS_BASELINE_WINDOWS = int(os.getenv("ANALYTICS_BASELINE_WINDOWS", "2"))
+# Range of motion this far below baseline for ANALYTICS_FATIGUE_WINDOWS windows in a row is fatigue
+ANALYTICS_ROM_DECAY = float(os.getenv("ANALYTICS_ROM_DECAY", "0.3"))
+ANALYTICS_FATIGUE_WINDOWS = int(os.getenv("ANALYTICS_FATIGUE_WINDOWS", "2"))
+# Joints that barely move are not judged for fatigue
+ANALYTICS_MIN_ROM = 10.0
+# Standard deviations from the running mean that count as an anomaly, once enough samples exist
+ANALYTICS_ANOMALY_Z = float(os.getenv("ANALYTICS_ANOMALY_Z", "4"))
+ANALYTICS_MIN_SAMPLES = 60
+# Frames before the same joint may raise the same kind of alert again
+ANALYTICS_COOLDOWN_FRAMES = int(os.getenv("ANALYTICS_COOLDOWN_FRAMES", "300"))
+ANALYTICS_MAX_SESSIONS = int(os.getenv("ANALYTICS_MAX_SESSIONS", "5000"))
+
+_LABELS = [name.replace("_", " ") for name in JOINTS]
+
+Frame = Union[dict, bytes]
+
+
+class SessionMonitor:
+    """Constant-size analytics state for one session."""
+    __slots__ = (
+        "frames", "timestamp", "x", "valid", "invalid", "count", "mean", "m2",
+        "delta", "scratch", "limit", "flag", "ready",
+        "ring", "ring_pos", "rom_max", "rom_min", "rom", "baseline", "windows",
+        "streak", "decayed", "last_anomaly", "last_fatigue",
+    )
+
+    def __init__(self, window: int = ANALYTICS_WINDOW):
+        joints = len(JOINTS)
+        self.frames = 0
+        self.timestamp = 0.0
+        self.x = np.full(joints, np.nan)
+        self.valid = np.zeros(joints, dtype=bool)
+        self.invalid = np.zeros(joints, dtype=bool)
+        self.count = np.zeros(joints)
+        self.mean = np.zeros(joints)
+        self.m2 = np.zeros(joints)
+        self.delta = np.zeros(joints)
+        self.scratch = np.zeros(joints)
+        self.limit = np.zeros(joints)
+        self.flag = np.zeros(joints, dtype=bool)
+        self.ready = np.zeros(joints, dtype=bool)
+        self.ring = np.full((window, joints), np.nan)
+        self.ring_pos = 0
+        self.rom_max = np.zeros(joints)
+        self.rom_min = np.zeros(joints)
+        self.rom = np.zeros(joints)
+        self.baseline = np.zeros(joints)
+        self.windows = 0
+        self.streak = np.zeros(joints)
+        self.decayed = np.zeros(joints, dtype=bool)
+        self.last_anomaly = np.full(joints, -ANALYTICS_COOLDOWN_FRAMES, dtype=np.int64)
+        self.last_fatigue = np.full(joints, -ANALYTICS_COOLDOWN_FRAMES, dtype=np.int64)
+
+    def _load(self, frame: Frame) -> bool:
+        x = self.x
+        x.fill(np.nan)
+        if isinstance(frame, bytes):
+            try:
+                timestamp, _, ids, angles = unpack_frame(frame)
+            except WireError:
+                return False
+            x[list(ids)] = angles
+            self.timestamp = timestamp
+            return True
+        angles = frame.get("angles")
+        if not isinstance(angles, dict):
+            return False
+        for name, angle in angles.items():
+            joint_id = JOINT_IDS.get(name)
+            if joint_id is not None and isinstance(angle, (int, float)):
+                x[joint_id] = angle
+        timestamp = frame.get("timestamp")
+        if isinstance(timestamp, (int, float)):
+            self.timestamp = float(timestamp)
+        return True
+
+    def push(self, frame: Frame) -> Optional[list]:
+        """Fold one frame into the statistics; returns alerts, or None (the common case)."""
+        if not self._load(frame):
+            return None
+        self.frames += 1
+        x, delta, scratch = self.x, self.delta, self.scratch
+        np.isfinite(x, out=self.valid)
+        np.logical_not(self.valid, out=self.invalid)
+
+        # Deviation from the running mean, judged against the spread seen so far
+        np.subtract(x, self.mean, out=delta)
+        np.copyto(delta, 0.0, where=self.invalid)
+        alerts = self._check_anomalies()
+
+        # Welford update (joints missing from this frame are left untouched)
+        np.add(self.count, self.valid, out=self.count)
+        np.maximum(self.count, 1.0, out=scratch)
+        np.divide(delta, scratch, out=scratch)
+        np.add(self.mean, scratch, out=self.mean)
+        np.subtract(x, self.mean, out=scratch)
+        np.copyto(scratch, 0.0, where=self.invalid)
+        np.multiply(delta, scratch, out=scratch)
+        np.add(self.m2, scratch, out=self.m2)
+
+        self.ring[self.ring_pos] = x
+        self.ring_pos += 1
+        if self.ring_pos == len(self.ring):
+            self.ring_pos = 0
+            alerts = self._close_window(alerts)
+        return alerts
+
+    def _check_anomalies(self) -> Optional[list]:
+        limit, flag, ready = self.limit, self.flag, self.ready
+        np.subtract(self.count, 1.0, out=limit)
+        np.maximum(limit, 1.0, out=limit)
+        np.divide(self.m2, limit, out=limit)
+        np.sqrt(limit, out=limit)
+        np.multiply(limit, ANALYTICS_ANOMALY_Z, out=limit)
+        np.abs(self.delta, out=self.scratch)
+        np.greater(self.scratch, limit, out=flag)
+        np.greater_equal(self.count, ANALYTICS_MIN_SAMPLES, out=ready)
+        np.logical_and(flag, ready, out=flag)
+        np.less_equal(self.last_anomaly, self.frames - ANALYTICS_COOLDOWN_FRAMES, out=ready)
+        np.logical_and(flag, ready, out=flag)
+        if not flag.any():
+            return None
+        alerts = []
+        for joint_id in np.flatnonzero(flag):
+            self.last_anomaly[joint_id] = self.frames
+            angle = float(self.x[joint_id])
+            mean = float(self.mean[joint_id])
+            alerts.append({
+                "kind": "anomaly",
+                "severity": "warning",
+                "joint": JOINTS[joint_id],
+                "value": round(angle, 1),
+                "baseline": round(mean, 1),
+                "message": f"Unusual {_LABELS[joint_id]} angle ({angle:.0f}° vs typical {mean:.0f}°), "
+                           f"possible compensation",
+                "timestamp": self.timestamp,
+            })
+        return alerts
+
+    def _close_window(self, alerts: Optional[list]) -> Optional[list]:
+        np.fmax.reduce(self.ring, axis=0, out=self.rom_max)
+        np.fmin.reduce(self.ring, axis=0, out=self.rom_min)
+        np.subtract(self.rom_max, self.rom_min, out=self.rom)
+        np.nan_to_num(self.rom, copy=False, nan=0.0)
+        self.windows += 1
+
+        if self.windows <= ANALYTICS_BASELINE_WINDOWS:
+            # Baseline: mean range of motion over the first windows
+            np.add(self.baseline, self.rom, out=self.baseline)
+            if self.windows == ANALYTICS_BASELINE_WINDOWS:
+                np.divide(self.baseline, ANALYTICS_BASELINE_WINDOWS, out=self.baseline)
+            return alerts
+
+        decayed, limit = self.decayed, self.limit
+        np.multiply(self.baseline, 1.0 - ANALYTICS_ROM_DECAY, out=limit)
+        np.less(self.rom, limit, out=decayed)
+        np.greater_equal(self.baseline, ANALYTICS_MIN_ROM, out=self.flag)
+        np.logical_and(decayed, self.flag, out=decayed)
+        np.add(self.streak, decayed, out=self.streak)
+        np.multiply(self.streak, decayed, out=self.streak)
+
+        np.greater_equal(self.streak, ANALYTICS_FATIGUE_WINDOWS, out=self.flag)
+        np.less_equal(self.last_fatigue, self.frames - ANALYTICS_COOLDOWN_FRAMES, out=self.ready)
+        np.logical_and(self.flag, self.ready, out=self.flag)
+        if not self.flag.any():
+            return alerts
+        alerts = alerts or []
+        for joint_id in np.flatnonzero(self.flag):
+            self.last_fatigue[joint_id] = self.frames
+            rom = float(self.rom[joint_id])
+            baseline = float(self.baseline[joint_id])
+            alerts.append({
+                "kind": "fatigue",
+                "severity": "warning",
+                "joint": JOINTS[joint_id],
+                "value": round(rom, 1),
+                "baseline": round(baseline, 1),
+                "message": f"{_LABELS[joint_id].capitalize()} range of motion down "
+                           f"{(1 - rom / baseline) * 100:.0f}% from the start of the session",
+                "timestamp": self.timestamp,
+            })
+        return alerts
+
+
+class MotionAnalytics:
+    """Per-session monitors, bounded by ANALYTICS_MAX_SESSIONS (least recently fed forgotten first)."""
+    def __init__(self, window: int = ANALYTICS_WINDOW, max_sessions: int = ANALYTICS_MAX_SESSIONS):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._monitors: OrderedDict[str, SessionMonitor] = OrderedDict()
+        self.frames = 0
+        self.alerts = 0
+
+    def has(self, session_id: str) -> bool:
+        return session_id in self._monitors
+
+    def open(self, session_id: str, exercise: Optional[dict] = None) -> SessionMonitor:
+        monitor = SessionMonitor(self.window)
+        self._monitors[session_id] = monitor
+        if len(self._monitors) > self.max_sessions:
+            self._monitors.popitem(last=False)
+        return monitor
+
+    def push(self, session_id: str, frame: Frame) -> Optional[list]:
+        monitor = self._monitors.get(session_id)
+        if monitor is None:
+            return None
+        self._monitors.move_to_end(session_id)
+        self.frames += 1
+        alerts = monitor.push(frame)
+        if alerts:
+            self.alerts += len(alerts)
+        return alerts
+
+    def close(self, session_id: str):
+        self._monitors.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._monitors),
+            "frames": self.frames,
+            "alerts": self.alerts,
+        }
+
+
+motion_analytics = MotionAnalytics()
+
+
+if __name__ == "__main__":
+    # Benchmark: throughput over many sessions, plus a check that memory stays flat
+    import math
+    import time
+    import tracemalloc
+    from wire import encode_frame
+
+    sessions = 200
+    seconds_of_stream = 30
+    fps = 30
+    analytics = MotionAnalytics(max_sessions=sessions)
+
+    # Squats whose depth fades by 60% over the stream (should raise fatigue alerts)
+    frames = []
+    for i in range(seconds_of_stream * fps):
+        depth = 45 * (1 - 0.6 * i / (seconds_of_stream * fps))
+        knee = 125 + depth * math.cos(i / 60 * 2 * math.pi)
+        frames.append({"timestamp": i * 1000 / fps,
+                       "angles": {"left_knee": knee, "right_knee": knee, "left_hip": 170.0, "spine": 5.0}})
+    binary = [encode_frame(f["angles"], f["timestamp"]) for f in frames]
+
+    for label, stream in (("json", frames), ("binary", binary)):
+        for s in range(sessions):
+            analytics.open(f"s{s}")
+        alerts = 0
+        started = time.perf_counter()
+        for frame in stream:
+            for s in range(sessions):
+                alerts += len(analytics.push(f"s{s}", frame) or ())
+        elapsed = time.perf_counter() - started
+        total = sessions * len(stream)
+        print(f"{label:6s} {total / elapsed:10.0f} frames/s  {elapsed / total * 1e6:6.2f} us/frame  "
+              f"alerts/session={alerts / sessions:.1f}")
+
+    monitor = SessionMonitor()
+    for frame in frames:
+        monitor.push(frame)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(5):
+        for frame in binary:
+            monitor.push(frame)
+    growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    print(f"memory growth after {5 * len(binary)} frames on one session: {growth} bytes")
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import deque
+from typing import Optional, Union
+from fastapi import WebSocket
+
+OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "64"))
+# Non-droppable messages may overshoot the queue bound up to this factor before
+# the socket is treated as a stalled consumer and closed.
+OUTBOUND_HARD_LIMIT_FACTOR = 4
+# Message types that may be dropped (oldest first) when a socket falls behind;
+# everything else (e.g. WebRTC "signal") is never dropped.
+DROPPABLE_TYPES = set(
+    t.strip() for t in os.getenv("WS_DROPPABLE_TYPES", "exercise_update,posture_feedback").split(",") if t.strip()
+)
+
+Payload = Union[str, bytes]
+
+
+def encode(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+
+def is_droppable(message: dict) -> bool:
+    return message.get("type") in DROPPABLE_TYPES
+
+
+class SocketSender:
+    """
+    Bounded outbound queue for one websocket, drained by its own writer task,
+    so a slow peer never delays the sockets it shares a broadcast with.
+    Payloads are pre-serialized so a broadcast encodes once for all receivers.
+    """
+    def __init__(self, websocket: WebSocket, binary: bool = False, max_queue: int = OUTBOUND_QUEUE_SIZE):
+        self.websocket = websocket
+        # Peer negotiated binary exercise frames (control messages stay JSON text)
+        self.binary = binary
+        self.max_queue = max_queue
+        # (enqueued_at, payload, droppable)
+        self._queue: deque[tuple[float, Payload, bool]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.connection_id = uuid.uuid4().hex
+        # Monotonic time of the last message received from the peer (see touch)
+        self.last_seen = time.monotonic()
+        # Set when a newer connection of the same patient took this one's place
+        self.replaced = False
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def touch(self):
+        """Record that the peer is alive (any inbound message counts)."""
+        self.last_seen = time.monotonic()
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_seen
+
+    def enqueue(self, payload: Payload, droppable: bool = False) -> bool:
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            if droppable:
+                if not self._drop_oldest_droppable():
+                    self.dropped += 1
+                    return False
+            elif len(self._queue) >= self.max_queue * OUTBOUND_HARD_LIMIT_FACTOR:
+                print("Outbound queue overflow, closing slow websocket")
+                self._abort()
+                return False
+
+        self._queue.append((time.monotonic(), payload, droppable))
+        self._wakeup.set()
+        return True
+
+    def send_json(self, message: dict) -> bool:
+        return self.enqueue(encode(message), is_droppable(message))
+
+    def _drop_oldest_droppable(self) -> bool:
+        for index, entry in enumerate(self._queue):
+            if entry[2]:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+
+                enqueued_at, payload, _ = self._queue.popleft()
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+
+                self.sent += 1
+                self.last_lag = time.monotonic() - enqueued_at
+                if self.last_lag > self.max_lag:
+                    self.max_lag = self.last_lag
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Websocket writer stopped: {e}")
+            self.closed = True
+            self._queue.clear()
+
+    def _abort(self):
+        self.closed = True
+        self._queue.clear()
+        if self._task:
+            self._task.cancel()
+        asyncio.create_task(self._close_socket(1013, "Slow consumer"))
+
+    async def terminate(self, code: int = 1000, reason: str = ""):
+        """Drop anything still queued and close the underlying socket."""
+        self.closed = True
+        self._queue.clear()
+        if self._task:
+            self._task.cancel()
+        await self._close_socket(code, reason)
+
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def close(self, drain_timeout: float = 1.0):
+        """Stop the writer, giving already-queued messages a short chance to go out."""
+        if self._task and not self.closed and self._queue:
+            deadline = time.monotonic() + drain_timeout
+            while self._queue and not self.closed and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        oldest = self._queue[0][0] if self._queue else None
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "oldest_queued_ms": round((time.monotonic() - oldest) * 1000, 2) if oldest else 0.0,
+            "idle_ms": round(self.idle_for() * 1000, 2),
+            "closed": self.closed,
+        }
@@ -0,0 +1,50 @@
+import json
+import base64
+from typing import Optional
+from fastapi import HTTPException
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode an opaque cursor into its `size` key values, or raise a 400."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def keyset_filter(sort_column: str, sort_value, tie_column: str, tie_value, desc: bool = True) -> str:
+    """
+    PostgREST `or` filter selecting rows strictly after (sort_value, tie_value)
+    in (sort_column, tie_column) order.
+    """
+    op = "lt" if desc else "gt"
+    return (
+        f'{sort_column}.{op}."{sort_value}",'
+        f'and({sort_column}.eq."{sort_value}",{tie_column}.{op}."{tie_value}")'
+    )
+
+
+def parse_fields(fields: Optional[str], allowed: set, required: tuple = ()) -> Optional[str]:
+    """
+    Validate a `fields=a,b,c` projection against `allowed`; returns the select
+    string (always including `required` columns) or None for all columns.
+    """
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+    columns = list(required) + [f for f in requested if f not in required]
+    return ", ".join(columns)
@@ -0,0 +1,90 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from typing import Optional
+from async_database import db
+
+PATIENT_DIRECTORY_TTL = int(os.getenv("PATIENT_DIRECTORY_TTL", "300"))
+# Lightweight projection served by default from /doctor/patients
+SUMMARY_COLUMNS = "id, full_name, email, phone, status, age, created_at"
+
+
+class DoctorDirectory:
+    """
+    One doctor's patient summaries, newest first, plus a sorted prefix index
+    over lower-cased full name, each name token and email.
+    """
+    def __init__(self, summaries: list[dict]):
+        self.summaries = summaries
+        self.loaded_at = time.time()
+        keys = []
+        for position, patient in enumerate(summaries):
+            name = (patient.get("full_name") or "").lower()
+            email = (patient.get("email") or "").lower()
+            terms = {name, email, *name.split()}
+            keys.extend((term, position) for term in terms if term)
+        keys.sort()
+        self._keys = keys
+
+    def search(self, prefix: str) -> list[dict]:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return self.summaries
+        positions = set()
+        index = bisect_left(self._keys, (prefix, -1))
+        while index < len(self._keys) and self._keys[index][0].startswith(prefix):
+            positions.add(self._keys[index][1])
+            index += 1
+        return [self.summaries[p] for p in sorted(positions)]
+
+
+class PatientDirectory:
+    """
+    Per-doctor cache of patient summaries backing the paginated, searchable
+    patient list. Entries expire after PATIENT_DIRECTORY_TTL and are dropped
+    explicitly whenever the doctor's patients change (`invalidate`).
+    """
+    def __init__(self, ttl: int = PATIENT_DIRECTORY_TTL):
+        self.ttl = ttl
+        self._doctors: dict[str, DoctorDirectory] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # patient_id -> full_name for every patient seen while loading
+        self._names: dict[str, str] = {}
+
+    async def _load(self, doctor_id: str) -> DoctorDirectory:
+        res = await db.from_("patients")\
+            .select(SUMMARY_COLUMNS)\
+            .eq("doctor_id", doctor_id)\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .execute()
+        summaries = res.data or []
+        for patient in summaries:
+            self._names[patient["id"]] = patient.get("full_name")
+        directory = DoctorDirectory(summaries)
+        self._doctors[doctor_id] = directory
+        return directory
+
+    async def get(self, doctor_id: str) -> DoctorDirectory:
+        directory = self._doctors.get(doctor_id)
+        if directory is not None and time.time() - directory.loaded_at < self.ttl:
+            return directory
+        lock = self._locks.setdefault(doctor_id, asyncio.Lock())
+        async with lock:
+            directory = self._doctors.get(doctor_id)
+            if directory is not None and time.time() - directory.loaded_at < self.ttl:
+                return directory
+            return await self._load(doctor_id)
+
+    def invalidate(self, doctor_id: str):
+        self._doctors.pop(doctor_id, None)
+
+    def name(self, patient_id: str) -> Optional[str]:
+        return self._names.get(patient_id)
+
+    def remember_name(self, patient_id: str, full_name: Optional[str]):
+        self._names[patient_id] = full_name
+
+
+patient_directory = PatientDirectory()
@@ -0,0 +1,255 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from async_database import db
+from pagination import keyset_filter
+
+COMPLIANCE_WINDOW_DAYS = 7
+ASSIGNMENT_CACHE_TTL = 300
+PATIENT_STATS_MAX_PATIENTS = int(os.getenv("PATIENT_STATS_MAX_PATIENTS", "10000"))
+# Most recent completion ids kept per patient, so a completion reported twice counts once
+PATIENT_STATS_RECENT_IDS = int(os.getenv("PATIENT_STATS_RECENT_IDS", "32"))
+LOAD_PAGE_SIZE = 1000
+
+_WORD_COUNTS = {"once": 1, "twice": 2, "thrice": 3, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+
+
+def sessions_per_week(frequency: Optional[str]) -> float:
+    """
+    Expected sessions per week for an assigned_exercises.frequency string,
+    e.g. "daily", "twice daily", "3x/week", "weekly", "every other day".
+    """
+    text = (frequency or "daily").strip().lower()
+    if "other day" in text:
+        return 3.5
+
+    match = re.search(r"(\d+(?:\.\d+)?)", text)
+    if match:
+        count = float(match.group(1))
+    else:
+        count = next((n for word, n in _WORD_COUNTS.items() if re.search(rf"\b{word}\b", text)), 1)
+
+    if "day" in text or "daily" in text:
+        return count * 7
+    if "month" in text:
+        return count * 7 / 30
+    return count
+
+
+def _parse_time(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class PatientAggregate:
+    __slots__ = ("total_sessions", "total_duration", "accuracy_sum", "accuracy_count",
+                 "last_session", "recent", "seen")
+
+    def __init__(self, recent_ids: int = PATIENT_STATS_RECENT_IDS):
+        self.total_sessions = 0
+        self.total_duration = 0
+        self.accuracy_sum = 0.0
+        self.accuracy_count = 0
+        self.last_session: Optional[float] = None
+        # completion times inside the compliance window
+        self.recent: deque[float] = deque()
+        # ids of the latest completions counted; older duplicates can no longer arrive
+        self.seen: deque[str] = deque(maxlen=recent_ids)
+
+    def add(self, session_id: str, duration: Optional[int], accuracy: Optional[float],
+            completed_at: Optional[float], remember: bool = True) -> bool:
+        if session_id in self.seen:
+            return False
+        if remember:
+            self.seen.append(session_id)
+        self.total_sessions += 1
+        self.total_duration += duration or 0
+        if accuracy is not None:
+            self.accuracy_sum += float(accuracy)
+            self.accuracy_count += 1
+        if completed_at is not None:
+            if self.last_session is None or completed_at > self.last_session:
+                self.last_session = completed_at
+            if completed_at >= time.time() - COMPLIANCE_WINDOW_DAYS * 86400:
+                self.recent.append(completed_at)
+        return True
+
+    def completed_in_window(self) -> int:
+        cutoff = time.time() - COMPLIANCE_WINDOW_DAYS * 86400
+        self.recent = deque(t for t in self.recent if t >= cutoff)
+        return len(self.recent)
+
+
+class PatientStatsEngine:
+    """
+    Per-patient session counters. An aggregate is built from the patient's
+    completed exercise_sessions the first time it is asked for and from then
+    on only updated incrementally by `record_completed`; completions on other
+    workers arrive the same way through the backplane (see `set_publisher`).
+    Each aggregate is a handful of counters plus the ids of its
+    PATIENT_STATS_RECENT_IDS latest completions, and at most
+    PATIENT_STATS_MAX_PATIENTS aggregates are kept, least recently used
+    dropped first.
+    """
+    def __init__(self, max_patients: int = PATIENT_STATS_MAX_PATIENTS, recent_ids: int = PATIENT_STATS_RECENT_IDS):
+        self.max_patients = max_patients
+        self.recent_ids = recent_ids
+        self._aggregates: OrderedDict[str, PatientAggregate] = OrderedDict()
+        # patient_id -> (expires_at, expected sessions per week)
+        self._expected: dict[str, tuple[float, float]] = {}
+        # patient_id -> load in flight, shared by concurrent requests
+        self._loading: dict[str, asyncio.Task] = {}
+        # completions recorded while the patient's load is in flight, applied afterwards
+        self._during_load: dict[str, list[dict]] = {}
+        self._publish: Optional[Callable[[dict], Awaitable[None]]] = None
+        self._publishing: set[asyncio.Task] = set()
+        self.loads = 0
+
+    def set_publisher(self, publish: Callable[[dict], Awaitable[None]]):
+        """Send this worker's completions to every worker's `record_completed`."""
+        self._publish = publish
+
+    async def _load(self, patient_id: str) -> PatientAggregate:
+        # Newest first, so the most recent ids (the only ones that can still be
+        # reported again) are the ones remembered
+        aggregate = PatientAggregate(self.recent_ids)
+        after = None
+        while True:
+            query = db.from_("exercise_sessions")\
+                .select("id, duration_seconds, accuracy_percent, completed_at")\
+                .eq("patient_id", patient_id)\
+                .eq("status", "completed")
+            if after:
+                query = query.or_(keyset_filter("completed_at", after[0], "id", after[1]))
+            res = await query\
+                .order("completed_at", desc=True)\
+                .order("id", desc=True)\
+                .limit(LOAD_PAGE_SIZE)\
+                .execute()
+            rows = res.data or []
+            for row in rows:
+                aggregate.add(
+                    row["id"],
+                    row.get("duration_seconds"),
+                    row.get("accuracy_percent"),
+                    _parse_time(row.get("completed_at")),
+                    remember=len(aggregate.seen) < self.recent_ids
+                )
+            if len(rows) < LOAD_PAGE_SIZE:
+                break
+            after = (rows[-1]["completed_at"], rows[-1]["id"])
+        self.loads += 1
+        return aggregate
+
+    async def _aggregate(self, patient_id: str) -> PatientAggregate:
+        aggregate = self._aggregates.get(patient_id)
+        if aggregate is not None:
+            self._aggregates.move_to_end(patient_id)
+            return aggregate
+
+        task = self._loading.get(patient_id)
+        if task is None:
+            task = self._loading[patient_id] = asyncio.create_task(self._load(patient_id))
+            task.add_done_callback(lambda done: self._loaded(patient_id, done))
+        return await asyncio.shield(task)
+
+    def _loaded(self, patient_id: str, task: asyncio.Task):
+        if self._loading.get(patient_id) is task:
+            del self._loading[patient_id]
+        pending = self._during_load.pop(patient_id, [])
+        if task.cancelled() or task.exception() is not None:
+            return
+        aggregate = task.result()
+        # Completions written while the rows were being read
+        for session in pending:
+            self._apply(aggregate, session)
+        self._store(patient_id, aggregate)
+
+    def _store(self, patient_id: str, aggregate: PatientAggregate):
+        self._aggregates[patient_id] = aggregate
+        self._aggregates.move_to_end(patient_id)
+        while len(self._aggregates) > self.max_patients:
+            self._aggregates.popitem(last=False)
+
+    def record_completed(self, session: dict, publish: bool = True):
+        """
+        Fold a session that just transitioned to completed into its patient's
+        aggregate, and pass it on to the other workers unless it came from one.
+        """
+        patient_id = session.get("patient_id")
+        if not patient_id or not session.get("id"):
+            return
+        if patient_id in self._loading:
+            self._during_load.setdefault(patient_id, []).append(session)
+        aggregate = self._aggregates.get(patient_id)
+        # Patients without an aggregate pick the session up when first loaded
+        if aggregate is not None:
+            self._apply(aggregate, session)
+        if publish and self._publish is not None:
+            task = asyncio.create_task(self._publish_completed(session))
+            self._publishing.add(task)
+            task.add_done_callback(self._publishing.discard)
+
+    async def _publish_completed(self, session: dict):
+        try:
+            await self._publish(session)
+        except Exception as e:
+            print(f"Error publishing completion of session {session.get('id')}: {e}")
+
+    @staticmethod
+    def _apply(aggregate: PatientAggregate, session: dict):
+        aggregate.add(
+            session["id"],
+            session.get("duration_seconds"),
+            session.get("accuracy_percent"),
+            _parse_time(session.get("completed_at")) or time.time()
+        )
+
+    def invalidate_assignments(self, patient_id: str):
+        self._expected.pop(patient_id, None)
+
+    async def _expected_per_week(self, patient_id: str) -> float:
+        cached = self._expected.get(patient_id)
+        if cached and cached[0] > time.time():
+            return cached[1]
+        res = await db.from_("assigned_exercises")\
+            .select("frequency")\
+            .eq("patient_id", patient_id)\
+            .execute()
+        expected = sum(sessions_per_week(row.get("frequency")) for row in (res.data or []))
+        self._expected[patient_id] = (time.time() + ASSIGNMENT_CACHE_TTL, expected)
+        return expected
+
+    async def get(self, patient_id: str) -> dict:
+        aggregate = await self._aggregate(patient_id)
+        expected = await self._expected_per_week(patient_id)
+
+        if expected > 0:
+            compliance = min(100, round(aggregate.completed_in_window() / expected * 100))
+        else:
+            compliance = 100 if aggregate.total_sessions else 0
+
+        return {
+            "totalSessions": aggregate.total_sessions,
+            "avgAccuracy": round(aggregate.accuracy_sum / aggregate.accuracy_count) if aggregate.accuracy_count else 0,
+            # minutes, like the dashboard cards display
+            "totalDuration": round(aggregate.total_duration / 60),
+            "compliance": compliance,
+            "lastSession": datetime.fromtimestamp(aggregate.last_session, tz=timezone.utc).isoformat()
+                if aggregate.last_session else None,
+            "nextAppointment": None
+        }
+
+
+patient_stats = PatientStatsEngine()
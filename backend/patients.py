@@ -1,22 +1,40 @@
-from fastapi import APIRouter, HTTPException, Request
-from database import supabase
+from fastapi import APIRouter, HTTPException, Request, Response, Query
+from typing import Optional
+from datetime import datetime
+from async_database import db
+from identity import identity
+from dashboard_stats import dashboard_stats
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, keyset_filter, parse_fields
 
 router = APIRouter(prefix="/patient", tags=["Patient"])
 
+SESSION_HISTORY_FIELDS = {
+    "id", "exercise_id", "status", "duration_seconds", "repetitions", "accuracy_percent",
+    "notes", "started_at", "completed_at", "created_at"
+}
+SESSION_HISTORY_PAGE_SIZE = 100
+SESSION_HISTORY_MAX_PAGE_SIZE = 500
+
+def _parse_window_bound(value: Optional[str], name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise HTTPException(400, f"Invalid {name} timestamp")
+
 @router.get("/my_exercises")
-def my_exercises(request: Request):
+async def my_exercises(request: Request):
     try:
         user = request.state.user
         
         # Get patient record first
-        patient_res = supabase.from_("patients").select("id").eq("auth_user_id", user.id).single().execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient_res.data:
+        if not patient_id:
             raise HTTPException(404, "Patient profile not found")
         
-        patient_id = patient_res.data["id"]
-        
-        exercises = supabase.from_("assigned_exercises")\
+        exercises = await db.from_("assigned_exercises")\
             .select("*, exercises(*)")\
             .eq("patient_id", patient_id)\
             .execute()
@@ -35,26 +53,59 @@ def my_exercises(request: Request):
         raise HTTPException(500, "Failed to fetch exercises")
 
 @router.get("/session/history")
-def session_history(request: Request):
+async def session_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(SESSION_HISTORY_PAGE_SIZE, ge=1, le=SESSION_HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Newest-first session history, keyset-paginated on (created_at, id).
+    Pass the X-Next-Cursor response header back as `cursor` for the next page;
+    `fields` limits the columns and `since`/`until` bound created_at.
+    """
     try:
         user = request.state.user
         
         # Get patient record first
-        patient_res = supabase.from_("patients").select("id").eq("auth_user_id", user.id).single().execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient_res.data:
+        if not patient_id:
             raise HTTPException(404, "Patient profile not found")
         
-        patient_id = patient_res.data["id"]
+        columns = parse_fields(fields, SESSION_HISTORY_FIELDS, required=("id", "created_at")) or "*"
+        since = _parse_window_bound(since, "since")
+        until = _parse_window_bound(until, "until")
         
         # Get session history for this patient only
-        sessions = supabase.from_("exercise_sessions")\
-            .select("*")\
-            .eq("patient_id", patient_id)\
+        query = db.from_("exercise_sessions")\
+            .select(columns)\
+            .eq("patient_id", patient_id)
+        
+        if since:
+            query = query.gte("created_at", since)
+        if until:
+            query = query.lt("created_at", until)
+        if cursor:
+            created_at, session_id = decode_cursor(cursor, 2)
+            query = query.or_(keyset_filter("created_at", created_at, "id", session_id))
+        
+        # One extra row tells us whether another page exists
+        sessions = await query\
             .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)\
             .execute()
         
-        return sessions.data or []
+        rows = sessions.data or []
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        
+        return rows
     except HTTPException:
         raise
     except Exception as e:
@@ -62,34 +113,18 @@ def session_history(request: Request):
         raise HTTPException(500, "Failed to fetch session history")
 
 @router.get("/dashboard/stats")
-def dashboard(request: Request):
+async def dashboard(request: Request):
     try:
         user = request.state.user
         
         # Get patient record
-        patient_res = supabase.from_("patients").select("id").eq("auth_user_id", user.id).single().execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient_res.data:
+        if not patient_id:
             return {"completed_sessions": 0, "total_exercises": 0}
         
-        patient_id = patient_res.data["id"]
-        
-        # Get stats
-        sessions = supabase.from_("exercise_sessions")\
-            .select("*", count="exact")\
-            .eq("patient_id", patient_id)\
-            .eq("status", "completed")\
-            .execute()
-        
-        exercises = supabase.from_("assigned_exercises")\
-            .select("*", count="exact")\
-            .eq("patient_id", patient_id)\
-            .execute()
-        
-        return {
-            "completed_sessions": sessions.count or 0,
-            "total_exercises": exercises.count or 0
-        }
+        # Get stats (concurrent count-only requests, micro-cached)
+        return await dashboard_stats.patient(patient_id)
     except Exception as e:
         print(f"Error fetching dashboard stats: {e}")
         return {"completed_sessions": 0, "total_exercises": 0}
\ No newline at end of file
@@ -0,0 +1,314 @@
+"""
+Server-side posture scoring for the live exercise stream.
+
+Frames (JSON angle maps, binary wire frames or MediaPipe landmark batches)
+are written into a fixed-size per-session window; when the window fills,
+the whole window is scored at once with NumPy: the per-joint mean angle is
+compared against the exercise's expected angles and every joint gets
+correct / warning / incorrect feedback in the frontend PostureFeedback
+shape.
+
+Exercises opt in with `expected_angles` ({joint: degrees}) and may set
+`angle_tolerance` ({"warning": degrees, "incorrect": degrees}); only the
+listed joints are scored, and thresholds left out fall back to the defaults
+below. Sessions of exercises without target angles are not scored.
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+import numpy as np
+
+from wire import JOINTS, JOINT_IDS, WireError, unpack_frame
+
+# Frames per scoring window
+POSE_WINDOW = int(os.getenv("POSE_WINDOW", "15"))
+# Absolute deviation (degrees) at which a joint becomes a warning / incorrect
+POSE_WARNING_DEVIATION = float(os.getenv("POSE_WARNING_DEVIATION", "10"))
+POSE_INCORRECT_DEVIATION = float(os.getenv("POSE_INCORRECT_DEVIATION", "20"))
+# Sessions scored concurrently per worker (least recently fed forgotten first)
+POSE_MAX_SESSIONS = int(os.getenv("POSE_MAX_SESSIONS", "5000"))
+
+# MediaPipe Pose landmark triplets (a, vertex, c) whose angle at the vertex
+# gives each joint angle
+LANDMARK_TRIPLETS = {
+    "left_shoulder": (13, 11, 23), "right_shoulder": (14, 12, 24),
+    "left_elbow": (11, 13, 15), "right_elbow": (12, 14, 16),
+    "left_hip": (11, 23, 25), "right_hip": (12, 24, 26),
+    "left_knee": (23, 25, 27), "right_knee": (24, 26, 28),
+    "left_ankle": (25, 27, 31), "right_ankle": (26, 28, 32),
+}
+_TRIPLET_JOINTS = np.array([JOINT_IDS[name] for name in LANDMARK_TRIPLETS], dtype=np.intp)
+_TRIPLETS = np.array(list(LANDMARK_TRIPLETS.values()), dtype=np.intp)
+
+_LABELS = [name.replace("_", " ") for name in JOINTS]
+
+Frame = Union[dict, bytes]
+
+
+def angles_from_landmarks(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Joint angles (degrees) for a batch of poses.
+
+    `landmarks` is (frames, 33, 2 or 3); returns (frames, len(JOINTS)) with
+    NaN for joints that can't be derived from landmarks.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    a = landmarks[:, _TRIPLETS[:, 0]]
+    b = landmarks[:, _TRIPLETS[:, 1]]
+    c = landmarks[:, _TRIPLETS[:, 2]]
+    ba = a - b
+    bc = c - b
+    cosine = np.einsum("fjk,fjk->fj", ba, bc) / (
+        np.linalg.norm(ba, axis=2) * np.linalg.norm(bc, axis=2) + 1e-9
+    )
+    angles = np.full((landmarks.shape[0], len(JOINTS)), np.nan, dtype=np.float32)
+    angles[:, _TRIPLET_JOINTS] = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+    return angles
+
+
+def _to_iso(timestamp) -> str:
+    try:
+        seconds = float(timestamp) / 1000.0
+    except (TypeError, ValueError):
+        seconds = 0.0
+    if not seconds:
+        return datetime.now(timezone.utc).isoformat()
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+
+class PoseTargets:
+    """Expected angle vector and thresholds for one exercise."""
+    __slots__ = ("expected", "warning", "incorrect")
+
+    def __init__(self, expected_angles: dict, tolerance: Optional[dict] = None):
+        expected = np.full(len(JOINTS), np.nan, dtype=np.float32)
+        for name, angle in expected_angles.items():
+            joint_id = JOINT_IDS.get(name)
+            if joint_id is not None and isinstance(angle, (int, float)):
+                expected[joint_id] = float(angle)
+        tolerance = tolerance if isinstance(tolerance, dict) else {}
+        self.expected = expected
+        self.warning = float(tolerance.get("warning", POSE_WARNING_DEVIATION))
+        self.incorrect = float(tolerance.get("incorrect", POSE_INCORRECT_DEVIATION))
+
+    @property
+    def empty(self) -> bool:
+        return not np.isfinite(self.expected).any()
+
+    @classmethod
+    def for_exercise(cls, exercise: Optional[dict]) -> Optional["PoseTargets"]:
+        """Targets of the exercise, or None if it defines no usable expected angles."""
+        exercise = exercise or {}
+        expected = exercise.get("expected_angles")
+        if not isinstance(expected, dict):
+            return None
+        targets = cls(expected, exercise.get("angle_tolerance"))
+        return None if targets.empty else targets
+
+
+class SessionScorer:
+    """Fixed-size frame window for one session; scores itself each time it fills."""
+    __slots__ = ("targets", "window", "count", "last_timestamp")
+
+    def __init__(self, targets: PoseTargets, window: int = POSE_WINDOW):
+        self.targets = targets
+        self.window = np.full((window, len(JOINTS)), np.nan, dtype=np.float32)
+        self.count = 0
+        self.last_timestamp = None
+
+    def push(self, frame: Frame) -> Optional[dict]:
+        """Add one frame; returns a feedback report when the window completes."""
+        row = self.window[self.count]
+        row.fill(np.nan)
+        if isinstance(frame, bytes):
+            self._fill_from_bytes(row, frame)
+        else:
+            self.last_timestamp = frame.get("timestamp")
+            landmarks = frame.get("landmarks")
+            if landmarks is not None:
+                return self.push_landmarks(landmarks)
+            angles = frame.get("angles")
+            if not isinstance(angles, dict):
+                angles = {}
+            for name, angle in angles.items():
+                joint_id = JOINT_IDS.get(name)
+                if joint_id is not None and angle is not None:
+                    row[joint_id] = angle
+        return self._advance()
+
+    def push_landmarks(self, landmarks) -> Optional[dict]:
+        """Add a batch of landmark poses ((frames, 33, 2|3) or a single (33, 2|3) pose)."""
+        points = np.asarray(landmarks, dtype=np.float32)
+        if points.ndim == 2:
+            points = points[None]
+        if points.ndim != 3 or points.shape[1] < 33:
+            return None
+        report = None
+        for angles in angles_from_landmarks(points):
+            self.window[self.count] = angles
+            report = self._advance() or report
+        return report
+
+    def _fill_from_bytes(self, row: np.ndarray, frame: bytes):
+        timestamp, _, ids, angles = unpack_frame(frame)
+        # One fancy-indexed store instead of a per-joint loop
+        row[list(ids)] = angles
+        self.last_timestamp = timestamp
+
+    def _advance(self) -> Optional[dict]:
+        self.count += 1
+        if self.count < len(self.window):
+            return None
+        self.count = 0
+        return self.score()
+
+    def score(self) -> Optional[dict]:
+        window = self.window if self.count == 0 else self.window[:self.count]
+        observed = np.isfinite(window)
+        frames_seen = observed.sum(axis=0)
+        means = np.where(frames_seen > 0, np.nansum(window, axis=0) / np.maximum(frames_seen, 1), np.nan)
+        deviation = means - self.targets.expected
+        scored = np.isfinite(deviation)
+        if not scored.any():
+            return None
+
+        magnitude = np.abs(deviation)
+        status = np.where(magnitude >= self.targets.incorrect, 2, np.where(magnitude >= self.targets.warning, 1, 0))
+        per_joint = np.clip(1.0 - magnitude[scored] / self.targets.incorrect, 0.0, 1.0)
+        accuracy = round(float(per_joint.mean()) * 100, 1)
+
+        timestamp = _to_iso(self.last_timestamp)
+        feedback = []
+        for joint_id in np.flatnonzero(scored):
+            feedback.append(self._feedback(
+                int(joint_id), float(means[joint_id]), float(self.targets.expected[joint_id]),
+                float(deviation[joint_id]), int(status[joint_id]), timestamp
+            ))
+        return {
+            "accuracy": accuracy,
+            "posture_status": ("correct", "warning", "incorrect")[int(status[scored].max())],
+            "feedback": feedback,
+            "timestamp": timestamp,
+        }
+
+    @staticmethod
+    def _feedback(joint_id: int, angle: float, expected: float, deviation: float,
+                  status: int, timestamp: str) -> dict:
+        label = _LABELS[joint_id]
+        if status == 0:
+            message = f"Good {label} position"
+        else:
+            direction = "Reduce" if deviation > 0 else "Increase"
+            message = f"{direction} {label} angle by {abs(deviation):.0f}°"
+        return {
+            "timestamp": timestamp,
+            "joint": JOINTS[joint_id],
+            "angle": round(angle, 1),
+            "expectedAngle": round(expected, 1),
+            "deviation": round(deviation, 1),
+            "feedback": ("correct", "warning", "incorrect")[status],
+            "message": message,
+        }
+
+
+class PoseScoringEngine:
+    """
+    Per-session scorers, created on a session's first frame and bounded by
+    POSE_MAX_SESSIONS. Sessions of exercises without target angles are
+    remembered as None and skipped.
+    """
+    def __init__(self, window: int = POSE_WINDOW, max_sessions: int = POSE_MAX_SESSIONS):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._scorers: OrderedDict[str, Optional[SessionScorer]] = OrderedDict()
+        self.frames = 0
+        self.reports = 0
+        self.errors = 0
+
+    def has(self, session_id: str) -> bool:
+        return session_id in self._scorers
+
+    def open(self, session_id: str, exercise: Optional[dict]) -> Optional[SessionScorer]:
+        targets = PoseTargets.for_exercise(exercise)
+        scorer = SessionScorer(targets, self.window) if targets is not None else None
+        self._scorers[session_id] = scorer
+        if len(self._scorers) > self.max_sessions:
+            self._scorers.popitem(last=False)
+        return scorer
+
+    def push(self, session_id: str, frame: Frame) -> Optional[dict]:
+        scorer = self._scorers.get(session_id)
+        if scorer is None:
+            return None
+        self._scorers.move_to_end(session_id)
+        self.frames += 1
+        try:
+            report = scorer.push(frame)
+        except (WireError, ValueError, TypeError) as e:
+            self.errors += 1
+            print(f"Pose scoring skipped a frame for session {session_id}: {e}")
+            return None
+        if report is not None:
+            self.reports += 1
+        return report
+
+    def close(self, session_id: str) -> Optional[dict]:
+        """Forget the session, scoring whatever partial window is left."""
+        scorer = self._scorers.pop(session_id, None)
+        if scorer is None or scorer.count == 0:
+            return None
+        return scorer.score()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": sum(1 for s in self._scorers.values() if s is not None),
+            "frames": self.frames,
+            "reports": self.reports,
+            "errors": self.errors,
+        }
+
+
+pose_scoring = PoseScoringEngine()
+
+
+if __name__ == "__main__":
+    # Benchmark: many concurrent sessions streaming JSON and binary frames at 30 fps
+    import time
+    import random
+    from wire import encode_frame
+
+    sessions = 500
+    seconds_of_stream = 4
+    fps = 30
+    engine = PoseScoringEngine(max_sessions=sessions)
+    rng = random.Random(1)
+    for s in range(sessions):
+        engine.open(f"s{s}", {"expected_angles": {"left_knee": 90, "right_knee": 90}})
+
+    def make_angles():
+        return {name: 90.0 + rng.uniform(-25, 25) for name in JOINTS}
+
+    json_frames = [{"timestamp": 1718000000000.0 + i, "angles": make_angles()} for i in range(64)]
+    binary_frames = [encode_frame(f["angles"], f["timestamp"]) for f in json_frames]
+
+    for label, frames in (("json", json_frames), ("binary", binary_frames)):
+        total = sessions * seconds_of_stream * fps
+        started = time.perf_counter()
+        for i in range(seconds_of_stream * fps):
+            frame = frames[i % len(frames)]
+            for s in range(sessions):
+                engine.push(f"s{s}", frame)
+        elapsed = time.perf_counter() - started
+        print(f"{label:6s} {total / elapsed:10.0f} frames/s  "
+              f"{elapsed / total * 1e6:6.2f} us/frame  "
+              f"~{total / elapsed / fps:6.0f} sessions/core at {fps} fps")
+
+    landmarks = np.random.default_rng(1).random((POSE_WINDOW, 33, 3), dtype=np.float32)
+    runs = 2000
+    started = time.perf_counter()
+    for _ in range(runs):
+        angles_from_landmarks(landmarks)
+    elapsed = time.perf_counter() - started
+    print(f"landmarks {runs * POSE_WINDOW / elapsed:10.0f} poses/s  (batches of {POSE_WINDOW})")
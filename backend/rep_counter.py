@@ -0,0 +1,197 @@
+"""
+Server-side repetition counting for the live exercise stream.
+
+Each session tracks one joint angle through a two-threshold hysteresis
+band: a rep starts when the angle crosses `start` towards `peak`, reaches
+the far side once it crosses `peak`, and completes when it comes back past
+`start`. The gap between the thresholds absorbs landmark jitter, and reps
+faster than REP_MIN_DURATION_MS are ignored.
+
+Exercises opt in with `rep_counter` = {"joint": ..., "start": degrees,
+"peak": degrees}; `peak` below `start` counts flexion (e.g. squats), above
+it extension or raises. Sessions of exercises without a usable config are
+not counted, so their self-reported repetitions stand.
+"""
+import os
+from collections import OrderedDict
+from typing import Optional, Union
+
+from wire import JOINT_IDS, WireError, unpack_frame
+
+REP_MIN_DURATION_MS = float(os.getenv("REP_MIN_DURATION_MS", "400"))
+REP_MAX_SESSIONS = int(os.getenv("REP_MAX_SESSIONS", "5000"))
+
+Frame = Union[dict, bytes]
+
+IDLE, MOVING = 0, 1
+
+
+class RepCounter:
+    """O(1) hysteresis state for one session."""
+    __slots__ = (
+        "joint", "joint_id", "start", "peak", "falling",
+        "phase", "count", "rep_started_at", "extreme", "last_timestamp",
+    )
+
+    def __init__(self, joint: str, start: float, peak: float):
+        self.joint = joint
+        self.joint_id = JOINT_IDS.get(joint, -1)
+        self.start = float(start)
+        self.peak = float(peak)
+        # Flexion reps move the angle down towards the peak
+        self.falling = self.peak < self.start
+        self.phase = IDLE
+        self.count = 0
+        self.rep_started_at = 0.0
+        self.extreme = 0.0
+        self.last_timestamp = 0.0
+
+    @classmethod
+    def for_exercise(cls, exercise: Optional[dict]) -> Optional["RepCounter"]:
+        """Counter for the exercise's `rep_counter` config, or None if it has no usable one."""
+        config = (exercise or {}).get("rep_counter")
+        if not isinstance(config, dict) or config.get("joint") not in JOINT_IDS:
+            return None
+        start, peak = config.get("start"), config.get("peak")
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (start, peak)) or start == peak:
+            return None
+        return cls(config["joint"], start, peak)
+
+    def _angle(self, frame: Frame) -> Optional[float]:
+        if isinstance(frame, bytes):
+            try:
+                timestamp, _, ids, angles = unpack_frame(frame)
+            except WireError:
+                return None
+            self.last_timestamp = timestamp
+            try:
+                return angles[ids.index(self.joint_id)]
+            except ValueError:
+                return None
+        timestamp = frame.get("timestamp")
+        if isinstance(timestamp, (int, float)):
+            self.last_timestamp = float(timestamp)
+        angles = frame.get("angles")
+        if not isinstance(angles, dict):
+            return None
+        angle = angles.get(self.joint)
+        return float(angle) if isinstance(angle, (int, float)) else None
+
+    def push(self, frame: Frame) -> Optional[dict]:
+        """Advance on one frame; returns the rep_completed payload when a rep finishes."""
+        angle = self._angle(frame)
+        if angle is None:
+            return None
+
+        past_start = angle < self.start if self.falling else angle > self.start
+        if self.phase == IDLE:
+            if past_start:
+                self.phase = MOVING
+                self.rep_started_at = self.last_timestamp
+                self.extreme = angle
+            return None
+
+        if (angle < self.extreme) if self.falling else (angle > self.extreme):
+            self.extreme = angle
+        if past_start:
+            return None
+
+        # Back on the start side: a rep only counts if the peak was reached
+        self.phase = IDLE
+        reached_peak = self.extreme <= self.peak if self.falling else self.extreme >= self.peak
+        duration = self.last_timestamp - self.rep_started_at
+        if not reached_peak or 0 < duration < REP_MIN_DURATION_MS:
+            return None
+        self.count += 1
+        return {
+            "count": self.count,
+            "joint": self.joint,
+            "peak_angle": round(self.extreme, 1),
+            "duration_ms": round(duration),
+            "timestamp": self.last_timestamp,
+        }
+
+
+class RepCounterRegistry:
+    """
+    Per-session counters, bounded by REP_MAX_SESSIONS (least recently fed
+    forgotten first). Sessions of exercises without a counter config are
+    remembered as None and skipped.
+    """
+    def __init__(self, max_sessions: int = REP_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._counters: OrderedDict[str, Optional[RepCounter]] = OrderedDict()
+        self.frames = 0
+        self.reps = 0
+
+    def has(self, session_id: str) -> bool:
+        return session_id in self._counters
+
+    def open(self, session_id: str, exercise: Optional[dict]) -> Optional[RepCounter]:
+        counter = RepCounter.for_exercise(exercise)
+        self._counters[session_id] = counter
+        if len(self._counters) > self.max_sessions:
+            self._counters.popitem(last=False)
+        return counter
+
+    def push(self, session_id: str, frame: Frame) -> Optional[dict]:
+        counter = self._counters.get(session_id)
+        if counter is None:
+            return None
+        self._counters.move_to_end(session_id)
+        self.frames += 1
+        event = counter.push(frame)
+        if event is not None:
+            self.reps += 1
+        return event
+
+    def count(self, session_id: str) -> Optional[int]:
+        """Reps counted so far (None if the session isn't counted)."""
+        counter = self._counters.get(session_id)
+        return counter.count if counter is not None else None
+
+    def pop_count(self, session_id: str) -> Optional[int]:
+        """Final count of a session, forgetting its counter (None if it wasn't counted)."""
+        counter = self._counters.pop(session_id, None)
+        return counter.count if counter is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": sum(1 for c in self._counters.values() if c is not None),
+            "frames": self.frames,
+            "reps": self.reps,
+        }
+
+
+rep_counters = RepCounterRegistry()
+
+
+if __name__ == "__main__":
+    # Benchmark: counters fed a synthetic squat trajectory at 30 fps
+    import math
+    import time
+    from wire import encode_frame
+
+    sessions = 1000
+    frames_per_session = 300
+    registry = RepCounterRegistry(max_sessions=sessions)
+    squat = {"rep_counter": {"joint": "left_knee", "start": 160, "peak": 100}}
+
+    # One squat every 2 s: knee angle swings between 170 and 80 degrees
+    trajectory = [
+        {"timestamp": i * 1000 / 30, "angles": {"left_knee": 125 + 45 * math.cos(i / 60 * 2 * math.pi)}}
+        for i in range(frames_per_session)
+    ]
+    binary = [encode_frame(f["angles"], f["timestamp"]) for f in trajectory]
+
+    for label, frames in (("json", trajectory), ("binary", binary)):
+        for s in range(sessions):
+            registry.open(f"s{s}", squat)
+        started = time.perf_counter()
+        for frame in frames:
+            for s in range(sessions):
+                registry.push(f"s{s}", frame)
+        elapsed = time.perf_counter() - started
+        total = sessions * len(frames)
+        print(f"{label:6s} {total / elapsed:10.0f} frames/s  {elapsed / total * 1e6:5.2f} us/frame  "
+              f"reps/session={registry._counters['s0'].count}")
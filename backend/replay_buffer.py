@@ -0,0 +1,208 @@
+import os
+import uuid
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Union
+
+from outbound import encode
+from wire import WireError, frame_to_message, validate_frame
+
+# Events kept per patient stream, and for how long
+REPLAY_MAX_EVENTS = int(os.getenv("REPLAY_MAX_EVENTS", "600"))
+REPLAY_MAX_AGE = float(os.getenv("REPLAY_MAX_AGE", "60"))
+# Global budget across all streams; least recently active streams are evicted first
+REPLAY_MAX_BYTES = int(os.getenv("REPLAY_MAX_BYTES", str(32 * 1024 * 1024)))
+# Message types doctors can catch up on
+REPLAY_TYPES = set(
+    t.strip() for t in os.getenv(
+        "REPLAY_TYPES", "exercise_update,session_update,rep_completed,posture_feedback,alert"
+    ).split(",") if t.strip()
+)
+# High-rate types only replayed on explicit request (since_seq); the snapshot carries their latest value
+REPLAY_SNAPSHOT_ONLY = {"exercise_update", "posture_feedback"}
+# Rough per-event bookkeeping cost on top of the payload itself
+EVENT_OVERHEAD = 120
+
+Payload = Union[str, bytes]
+
+
+class _Stream:
+    __slots__ = ("id", "seq", "events", "latest", "bytes")
+
+    def __init__(self):
+        # Identifies this worker's numbering; sequence numbers from another stream don't apply
+        self.id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        # (seq, recorded_at, type, session_id, payload)
+        self.events: deque[tuple[int, float, str, Optional[str], Payload]] = deque()
+        # type -> (seq, session_id, payload) of the most recent event
+        self.latest: dict[str, tuple[int, Optional[str], Payload]] = {}
+        self.bytes = 0
+
+
+def _size(payload: Payload) -> int:
+    return len(payload) + EVENT_OVERHEAD
+
+
+def _as_text(event_type: str, seq: int, payload: Payload) -> Optional[str]:
+    if isinstance(payload, str):
+        return payload
+    # Binary exercise frames are stored as received and only expanded for catch-up
+    try:
+        return encode({**frame_to_message(payload, event_type), "seq": seq})
+    except Exception as e:
+        # A bad entry is skipped rather than failing the whole catch-up
+        print(f"Replay skipped an undecodable {event_type} event: {e}")
+        return None
+
+
+class ReplayBuffer:
+    """
+    Recent doctor-bound events per patient stream, so a doctor who opens (or
+    reopens) a monitor socket mid-session gets a compact snapshot of the
+    latest state plus a replay of what they missed.
+
+    Every event is numbered per stream (`seq`, also stamped into the live
+    JSON message). A stream keeps at most REPLAY_MAX_EVENTS events no older
+    than REPLAY_MAX_AGE seconds; across streams the total stays under
+    REPLAY_MAX_BYTES by evicting the least recently active streams.
+    Binary frames that fail validation are not kept.
+    """
+    def __init__(self, max_events: int = REPLAY_MAX_EVENTS, max_age: float = REPLAY_MAX_AGE,
+                 max_bytes: int = REPLAY_MAX_BYTES):
+        self.max_events = max_events
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._streams: OrderedDict[str, _Stream] = OrderedDict()
+        self.total_bytes = 0
+        self.recorded = 0
+        self.evicted_streams = 0
+        self.replays = 0
+        self.rejected = 0
+
+    def record(self, patient_id: str, message: dict) -> Optional[str]:
+        """
+        Number and keep one event. Returns the JSON text to deliver live
+        (with `seq`), or None for binary exercise frames, which are relayed
+        unchanged.
+        """
+        frame = message.get("frame")
+        if isinstance(frame, bytes):
+            try:
+                validate_frame(frame)
+            except WireError:
+                self.rejected += 1
+                return None
+
+        stream = self._streams.get(patient_id)
+        if stream is None:
+            stream = self._streams[patient_id] = _Stream()
+        else:
+            self._streams.move_to_end(patient_id)
+
+        stream.seq += 1
+        event_type = message.get("type")
+        if isinstance(frame, bytes):
+            payload, text = frame, None
+        else:
+            payload = text = encode({**message, "seq": stream.seq})
+        session_id = message.get("session_id")
+
+        now = time.monotonic()
+        stream.events.append((stream.seq, now, event_type, session_id, payload))
+        stream.latest[event_type] = (stream.seq, session_id, payload)
+        stream.bytes += _size(payload)
+        self.total_bytes += _size(payload)
+        self.recorded += 1
+
+        self._trim(stream, now)
+        self._enforce_budget(patient_id)
+        return text
+
+    def _trim(self, stream: _Stream, now: float):
+        events = stream.events
+        while events and (len(events) > self.max_events or now - events[0][1] > self.max_age):
+            size = _size(events.popleft()[4])
+            stream.bytes -= size
+            self.total_bytes -= size
+
+    def _enforce_budget(self, current: str):
+        while self.total_bytes > self.max_bytes and len(self._streams) > 1:
+            patient_id, stream = next(iter(self._streams.items()))
+            if patient_id == current:
+                break
+            del self._streams[patient_id]
+            self.total_bytes -= stream.bytes
+            self.evicted_streams += 1
+        # A single stream over budget sheds its own oldest events
+        stream = self._streams.get(current)
+        while stream is not None and self.total_bytes > self.max_bytes and stream.events:
+            size = _size(stream.events.popleft()[4])
+            stream.bytes -= size
+            self.total_bytes -= size
+
+    def catch_up(self, patient_id: str, session_id: Optional[str] = None,
+                 since_seq: Optional[int] = None, stream_id: Optional[str] = None) -> list[str]:
+        """
+        Payloads for a newly connected doctor: a `snapshot` of the latest
+        event of each type, then a `replay` batch of newer events. With
+        `since_seq` (from the same `stream_id`) everything after it is
+        replayed; otherwise only the low-rate events of the retained window.
+        """
+        stream = self._streams.get(patient_id)
+        if stream is None:
+            return [encode({"type": "snapshot", "stream": None, "seq": 0, "latest": {}})]
+        self._trim(stream, time.monotonic())
+
+        def relevant(event_session: Optional[str]) -> bool:
+            return session_id is None or event_session is None or event_session == session_id
+
+        latest = []
+        for event_type, (seq, event_session, payload) in stream.latest.items():
+            if relevant(event_session):
+                text = _as_text(event_type, seq, payload)
+                if text is not None:
+                    latest.append(f'"{event_type}":{text}')
+        # Pre-encoded events are spliced in as-is rather than decoded and re-encoded
+        snapshot = (
+            f'{{"type":"snapshot","stream":"{stream.id}","seq":{stream.seq},'
+            f'"latest":{{{",".join(latest)}}}}}'
+        )
+
+        resume = since_seq is not None and stream_id == stream.id
+        events = []
+        for seq, _, event_type, event_session, payload in stream.events:
+            if resume:
+                if seq <= since_seq:
+                    continue
+            elif event_type in REPLAY_SNAPSHOT_ONLY:
+                continue
+            if relevant(event_session):
+                text = _as_text(event_type, seq, payload)
+                if text is not None:
+                    events.append(text)
+
+        self.replays += 1
+        if not events:
+            return [snapshot]
+        # One message for the whole batch so catch-up can't overflow the socket's queue
+        replay = (
+            f'{{"type":"replay","stream":"{stream.id}","resumed":{"true" if resume else "false"},'
+            f'"events":[{",".join(events)}]}}'
+        )
+        return [snapshot, replay]
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self._streams),
+            "events": sum(len(s.events) for s in self._streams.values()),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "recorded": self.recorded,
+            "evicted_streams": self.evicted_streams,
+            "replays": self.replays,
+            "rejected": self.rejected,
+        }
+
+
+replay_buffer = ReplayBuffer()
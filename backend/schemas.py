@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from uuid import UUID
 
@@ -27,6 +27,13 @@ class ExerciseBase(BaseModel):
     video_url: Optional[str] = None
     duration_seconds: Optional[int] = None
     repetitions: Optional[int] = None
+    # Per-joint target angles (degrees) and {"warning", "incorrect"} deviation thresholds
+    expected_angles: Optional[Dict[str, float]] = None
+    angle_tolerance: Optional[Dict[str, float]] = None
+    # Rep counting hysteresis: {"joint": name, "start": degrees, "peak": degrees}
+    rep_counter: Optional[Dict[str, Any]] = None
+    # One ideal repetition per joint, {joint: [angles...]}, for per-rep similarity scoring
+    reference_trajectory: Optional[Dict[str, List[float]]] = None
 
 class SessionBase(BaseModel):
     exercise_id: UUID
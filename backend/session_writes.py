@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional
+from async_database import db
+from telemetry import telemetry
+from rep_counter import rep_counters
+from patient_stats import patient_stats
+from dashboard_stats import dashboard_stats
+from active_sessions import active_sessions
+
+# Write-behind delay for progress streamed over the patient websocket
+SESSION_WRITE_BEHIND_INTERVAL = float(os.getenv("SESSION_WRITE_BEHIND_INTERVAL", "2"))
+# Fields a patient may change on their own session
+PATIENT_WRITABLE_FIELDS = ("duration_seconds", "repetitions", "notes", "status")
+
+
+def completion_fields(session_id: str, fields: dict) -> dict:
+    """
+    Stamp completed_at, score the session from its telemetry unless the
+    client sent one, and record the server-counted reps. Those only exist
+    for exercises with a `rep_counter` config and then take precedence
+    over the self-reported count. The counters are only read here; they
+    are released once the completed write succeeds.
+    """
+    fields = {**fields, "completed_at": datetime.utcnow().isoformat()}
+    accuracy = telemetry.session_accuracy(session_id)
+    if "accuracy_percent" not in fields and accuracy is not None:
+        fields["accuracy_percent"] = accuracy
+    repetitions = rep_counters.count(session_id)
+    if repetitions:
+        fields["repetitions"] = repetitions
+    return fields
+
+
+class _PendingWrite:
+    __slots__ = ("fields", "future", "deadline", "timer")
+
+    def __init__(self):
+        self.fields: dict = {}
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.deadline = float("inf")
+        self.timer: Optional[asyncio.Task] = None
+
+
+class SessionWriteBuffer:
+    """
+    Coalesces exercise_sessions updates. A write to a (session, patient)
+    with nothing in flight is flushed straight away; writes arriving while
+    a flush of that session runs are merged last-write-wins into the next
+    one. Each flush is one `update ... eq(id).eq(patient_id)` statement, so
+    the ownership check costs no extra round-trip. Callers may instead pass
+    a write-behind `delay` (the patient websocket does); status changes
+    (such as completing the session) always flush immediately. Every writer
+    merged into a flush awaits the same future, which resolves to the
+    updated row or None when no row of that patient matched.
+    """
+    def __init__(self):
+        self._pending: dict[tuple[str, str], _PendingWrite] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        # Flushes holding or waiting for each lock
+        self._lock_users: dict[tuple[str, str], int] = {}
+        self.writes = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def submit(self, session_id: str, patient_id: str, fields: dict,
+               delay: Optional[float] = None) -> asyncio.Future:
+        """Queue `fields` for the session and return the future of the flush that persists them."""
+        key = (session_id, patient_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = _PendingWrite()
+        entry.fields.update(fields)
+        self.writes += 1
+
+        if delay is None or "status" in fields:
+            delay = 0
+        deadline = time.monotonic() + delay
+        if deadline < entry.deadline:
+            entry.deadline = deadline
+            if entry.timer is not None:
+                entry.timer.cancel()
+            entry.timer = asyncio.create_task(self._flush_at(key, entry, delay))
+        return entry.future
+
+    async def write(self, session_id: str, patient_id: str, fields: dict) -> Optional[dict]:
+        return await asyncio.shield(self.submit(session_id, patient_id, fields))
+
+    async def _flush_at(self, key: tuple[str, str], entry: _PendingWrite, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        entry.timer = None
+        # Due: later writes join this entry without rescheduling it
+        entry.deadline = float("-inf")
+        await self._flush(key, entry)
+
+    async def _flush(self, key: tuple[str, str], entry: _PendingWrite):
+        # Serialise flushes per session so an older batch can't land after a newer
+        # one; the entry stays open to new fields until it holds the lock
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            await self._write_locked(lock, key, entry)
+        finally:
+            # The lock goes only once nobody holds or waits for it, so flushes of
+            # one session never run under two different locks
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def _write_locked(self, lock: asyncio.Lock, key: tuple[str, str], entry: _PendingWrite):
+        session_id, patient_id = key
+        async with lock:
+            # Detach before the database call so later writes start a fresh batch
+            if self._pending.get(key) is entry:
+                del self._pending[key]
+            try:
+                result = await db.from_("exercise_sessions")\
+                    .update(entry.fields)\
+                    .eq("id", session_id)\
+                    .eq("patient_id", patient_id)\
+                    .execute()
+                row = result.data[0] if result.data else None
+                self.flushes += 1
+                if row is not None:
+                    self._after_write(row, entry.fields)
+                entry.future.set_result(row)
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Error writing session {session_id}: {e}")
+                entry.future.set_exception(e)
+                # Mark retrieved so a write-behind failure isn't reported as unhandled
+                entry.future.exception()
+
+    def _after_write(self, row: dict, fields: dict):
+        active_sessions.update(row["id"], row)
+        if fields.get("status") == "completed":
+            telemetry.pop_session_accuracy(row["id"])
+            rep_counters.pop_count(row["id"])
+            patient_stats.record_completed(row)
+            dashboard_stats.invalidate("patient", row["patient_id"])
+
+    async def flush_patient(self, patient_id: str):
+        """Persist everything buffered for the patient now (e.g. when their socket closes)."""
+        keys = [key for key in self._pending if key[1] == patient_id]
+        await asyncio.gather(*(self._flush_now(key) for key in keys), return_exceptions=True)
+
+    async def _flush_now(self, key: tuple[str, str]):
+        entry = self._pending.get(key)
+        if entry is None:
+            return
+        if entry.timer is None:
+            # Already due and waiting for the session's lock; let it finish
+            await asyncio.wait([entry.future])
+            return
+        entry.timer.cancel()
+        entry.timer = None
+        entry.deadline = float("-inf")
+        await self._flush(key, entry)
+
+    async def close(self):
+        await asyncio.gather(*(self._flush_now(key) for key in list(self._pending)), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
+
+
+session_writes = SessionWriteBuffer()
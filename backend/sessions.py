@@ -2,7 +2,11 @@ from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from database import supabase
+from async_database import db
+from identity import identity
+from exercise_catalog import exercise_catalog
+from active_sessions import active_sessions
+from session_writes import session_writes, completion_fields
 from websocket import manager
 
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
@@ -15,32 +19,23 @@ class CreateSessionPayload(BaseModel):
     status: Optional[str] = "in_progress"
 
 @router.post("")
-def create_session(payload: CreateSessionPayload, request: Request):
+async def create_session(payload: CreateSessionPayload, request: Request):
     """Create a new exercise session"""
     try:
         user = request.state.user
         
         # Get patient record
-        patient_res = supabase.from_("patients")\
-            .select("id")\
-            .eq("auth_user_id", user.id)\
-            .limit(1)\
-            .execute()
+        patient = await identity.patient(user.id)
+        patient_id = patient["id"] if patient else None
         
-        if not patient_res.data or len(patient_res.data) == 0:
+        if not patient_id:
             print(f"Patient profile not found for user {user.id}")
             raise HTTPException(404, "Patient profile not found. Please complete your profile.")
         
-        patient_id = patient_res.data[0]["id"]
-        
         # Verify exercise exists
-        exercise = supabase.from_("exercises")\
-            .select("id")\
-            .eq("id", payload.exercise_id)\
-            .limit(1)\
-            .execute()
+        exercise = await exercise_catalog.get(payload.exercise_id, refresh_on_miss=True)
         
-        if not exercise.data or len(exercise.data) == 0:
+        if not exercise:
             print(f"Exercise not found: {payload.exercise_id}")
             raise HTTPException(404, "Exercise not found")
         
@@ -55,7 +50,7 @@ def create_session(payload: CreateSessionPayload, request: Request):
             "started_at": datetime.utcnow().isoformat()
         }
         
-        result = supabase.from_("exercise_sessions")\
+        result = await db.from_("exercise_sessions")\
             .insert(session_data)\
             .execute()
         
@@ -64,6 +59,7 @@ def create_session(payload: CreateSessionPayload, request: Request):
             print(f"Result error: {result}")
             raise Exception("Failed to create session")
         
+        active_sessions.add(result.data[0], patient["doctor_id"])
         return result.data[0]
         
     except HTTPException:
@@ -84,28 +80,11 @@ async def update_session(session_id: str, payload: dict, request: Request):
         user = request.state.user
         
         # Get patient record
-        patient_res = supabase.from_("patients")\
-            .select("id")\
-            .eq("auth_user_id", user.id)\
-            .single()\
-            .execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient_res.data:
+        if not patient_id:
             raise HTTPException(404, "Patient profile not found")
         
-        patient_id = patient_res.data["id"]
-        
-        # Verify session belongs to this patient
-        session = supabase.from_("exercise_sessions")\
-            .select("*")\
-            .eq("id", session_id)\
-            .eq("patient_id", patient_id)\
-            .single()\
-            .execute()
-        
-        if not session.data:
-            raise HTTPException(404, "Session not found")
-        
         # Update session
         update_data = {}
         if "duration_seconds" in payload:
@@ -117,25 +96,32 @@ async def update_session(session_id: str, payload: dict, request: Request):
         if "status" in payload:
             update_data["status"] = payload["status"]
             if payload["status"] == "completed":
-                update_data["completed_at"] = datetime.utcnow().isoformat()
+                # Server-side counters are only read for the patient's own session
+                if not await active_sessions.owned(session_id, patient_id):
+                    raise HTTPException(404, "Session not found")
+                if "accuracy_percent" in payload:
+                    update_data["accuracy_percent"] = payload["accuracy_percent"]
+                update_data = completion_fields(session_id, update_data)
         
-        result = supabase.from_("exercise_sessions")\
-            .update(update_data)\
-            .eq("id", session_id)\
-            .execute()
+        if not update_data:
+            raise HTTPException(400, "No updatable fields")
         
-        if not result.data:
-            raise Exception("Failed to update session")
+        # One filtered update doubles as the ownership check; rapid PATCHes
+        # to the same session are merged into a single write
+        session = await session_writes.write(session_id, patient_id, update_data)
+        
+        if session is None:
+            raise HTTPException(404, "Session not found")
         
         # Notify doctor if session is updated
         await manager.signal_to_doctor(patient_id, {
             "type": "session_update",
             "session_id": session_id,
             "status": update_data.get("status"),
-            "data": result.data[0]
+            "data": session
         })
         
-        return result.data[0]
+        return session
         
     except HTTPException:
         raise
@@ -144,25 +130,19 @@ async def update_session(session_id: str, payload: dict, request: Request):
         raise HTTPException(500, "Failed to update exercise session")
 
 @router.get("/{session_id}")
-def get_session(session_id: str, request: Request):
+async def get_session(session_id: str, request: Request):
     """Get details of a specific session"""
     try:
         user = request.state.user
         
         # Get patient record
-        patient_res = supabase.from_("patients")\
-            .select("id")\
-            .eq("auth_user_id", user.id)\
-            .single()\
-            .execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient_res.data:
+        if not patient_id:
             raise HTTPException(404, "Patient profile not found")
         
-        patient_id = patient_res.data["id"]
-        
         # Get session
-        session = supabase.from_("exercise_sessions")\
+        session = await db.from_("exercise_sessions")\
             .select("*, exercises(*)")\
             .eq("id", session_id)\
             .eq("patient_id", patient_id)\
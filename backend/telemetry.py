@@ -0,0 +1,226 @@
+import os
+import time
+import gzip
+import json
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+from starlette.concurrency import run_in_threadpool
+from async_database import db
+from wire import decode_frame
+
+# "db" -> batch inserts into session_samples, "file" -> gzip JSONL segments, "off" -> disabled
+TELEMETRY_SINK = os.getenv("TELEMETRY_SINK", "db")
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "500"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "2"))
+TELEMETRY_MAX_BUFFERED = int(os.getenv("TELEMETRY_MAX_BUFFERED", "50000"))
+TELEMETRY_SEGMENT_DIR = os.getenv("TELEMETRY_SEGMENT_DIR", "telemetry_segments")
+# Sessions whose running accuracy is tracked (oldest forgotten first)
+TELEMETRY_ACCURACY_SESSIONS = 10000
+
+Frame = Union[dict, bytes]
+
+
+def _to_iso(timestamp, fallback: float) -> str:
+    # Clients send epoch milliseconds (Date.now()); fall back to receive time
+    try:
+        seconds = float(timestamp) / 1000.0 if timestamp else fallback
+    except (TypeError, ValueError):
+        seconds = fallback
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+
+class TelemetryPipeline:
+    """
+    Append-only sink for live exercise frames.
+
+    `ingest` only appends the raw frame to an in-memory buffer, so it never
+    blocks the websocket loop. A background task converts and writes buffered
+    frames in bulk every TELEMETRY_FLUSH_INTERVAL seconds, or sooner once
+    TELEMETRY_BATCH_SIZE frames are waiting. Frames beyond
+    TELEMETRY_MAX_BUFFERED are dropped (and counted) rather than queued.
+    Undecodable frames are skipped; batches whose write fails are retried on
+    the next flush, within the same buffer limit.
+
+    The "db" sink writes to session_samples, created by
+    supabase/migrations/20261017000300_session_samples.sql.
+    """
+    def __init__(self, sink: str = TELEMETRY_SINK, batch_size: int = TELEMETRY_BATCH_SIZE,
+                 flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+                 max_buffered: int = TELEMETRY_MAX_BUFFERED,
+                 segment_dir: str = TELEMETRY_SEGMENT_DIR):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.segment_dir = segment_dir
+        # (session_id, patient_id, received_at, frame)
+        self._buffer: list[tuple[Optional[str], str, float, Frame]] = []
+        # Converted rows from batches whose write failed, retried first on the next flush
+        self._retry: list[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._segment_seq = 0
+        # session_id -> [accuracy sum, sample count]
+        self._accuracy: OrderedDict[str, list] = OrderedDict()
+        self.started_at = time.time()
+        self.ingested = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink in ("db", "file")
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def ingest(self, session_id: Optional[str], patient_id: str, frame: Frame):
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            return
+        self._buffer.append((session_id, patient_id, time.time(), frame))
+        self.ingested += 1
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # One bad batch must not end the flush loop for the rest of the process
+                self.flush_errors += 1
+                print(f"Telemetry flush error: {e}")
+
+    def _to_row(self, session_id, patient_id, received_at, frame) -> dict:
+        if isinstance(frame, bytes):
+            timestamp, accuracy, angles = decode_frame(frame)
+            data = None
+        else:
+            timestamp = frame.get("timestamp")
+            accuracy = frame.get("accuracy")
+            angles = frame.get("angles")
+            data = {k: v for k, v in frame.items() if k not in ("type", "angles", "session_id")}
+        if session_id and accuracy is not None:
+            self._track_accuracy(session_id, accuracy)
+        return {
+            "session_id": session_id,
+            "patient_id": patient_id,
+            "recorded_at": _to_iso(timestamp, received_at),
+            "accuracy": accuracy,
+            "angles": angles,
+            "data": data,
+        }
+
+    def _track_accuracy(self, session_id: str, accuracy):
+        try:
+            value = float(accuracy)
+        except (TypeError, ValueError):
+            return
+        totals = self._accuracy.get(session_id)
+        if totals is None:
+            totals = self._accuracy[session_id] = [0.0, 0]
+            if len(self._accuracy) > TELEMETRY_ACCURACY_SESSIONS:
+                self._accuracy.popitem(last=False)
+        totals[0] += value
+        totals[1] += 1
+
+    def session_accuracy(self, session_id: str) -> Optional[float]:
+        """Mean accuracy of the session's flushed samples so far."""
+        totals = self._accuracy.get(session_id)
+        if not totals or not totals[1]:
+            return None
+        return round(totals[0] / totals[1], 2)
+
+    def pop_session_accuracy(self, session_id: str) -> Optional[float]:
+        """Mean accuracy of the session's flushed samples, forgetting the running totals."""
+        totals = self._accuracy.pop(session_id, None)
+        if not totals or not totals[1]:
+            return None
+        return round(totals[0] / totals[1], 2)
+
+    async def flush(self):
+        if not self._buffer and not self._retry:
+            return
+        pending, self._buffer = self._buffer, []
+        rows, self._retry = self._retry, []
+        for entry in pending:
+            try:
+                rows.append(self._to_row(*entry))
+            except Exception as e:
+                # Malformed frame: skip the sample, keep the rest of the batch
+                self.dropped += 1
+                print(f"Telemetry skipped an undecodable frame: {e}")
+
+        started = time.perf_counter()
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                if self.sink == "file":
+                    await run_in_threadpool(self._write_segment, batch)
+                else:
+                    await db.from_("session_samples").insert(batch).execute()
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.flush_errors += 1
+                # Keep the batch for the next flush while there is room; a transient
+                # database error shouldn't lose the samples
+                room = max(0, self.max_buffered - len(self._buffer) - len(self._retry))
+                self._retry.extend(batch[:room])
+                self.dropped += len(batch) - min(room, len(batch))
+                print(f"Telemetry flush failed ({len(batch)} samples, {min(room, len(batch))} kept for retry): {e}")
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def _write_segment(self, rows: list[dict]):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._segment_seq += 1
+        path = os.path.join(
+            self.segment_dir,
+            f"samples-{int(time.time() * 1000)}-{self._segment_seq:06d}.jsonl.gz"
+        )
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":"), default=str))
+                f.write("\n")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            "sink": self.sink,
+            "buffered": len(self._buffer),
+            "retrying": len(self._retry),
+            "ingested": self.ingested,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "ingest_per_sec": round(self.ingested / elapsed, 2),
+            "write_per_sec": round(self.written / elapsed, 2),
+        }
+
+
+telemetry = TelemetryPipeline()
@@ -0,0 +1,136 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py refuses to import without these; tests never reach a real Supabase
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """
+    In-memory stand-in for a postgrest query builder over one FakeDb table.
+    Supports the filters and actions the backend uses; columns are not projected.
+    """
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.columns = None
+        self.payload = None
+        self.filters = []
+        # Raw PostgREST `or` filters; recorded for assertions, not evaluated
+        self.or_filters = []
+        self.orderings = []
+        self.bounds = None
+
+    def select(self, columns="*", **kwargs):
+        self.columns = columns
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, "eq", value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, "in", list(values)))
+        return self
+
+    def or_(self, filters):
+        self.or_filters.append(filters)
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.orderings.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def limit(self, count):
+        self.bounds = (0, count - 1)
+        return self
+
+    def insert(self, records):
+        self.action, self.payload = "insert", records
+        return self
+
+    def update(self, fields):
+        self.action, self.payload = "update", fields
+        return self
+
+    def upsert(self, records, **kwargs):
+        self.action, self.payload = "upsert", records
+        return self
+
+    def filter_value(self, column, op="eq"):
+        return next((value for c, o, value in self.filters if (c, o) == (column, op)), None)
+
+    def matches(self, row) -> bool:
+        for column, op, value in self.filters:
+            if column not in row or (row[column] not in value if op == "in" else row[column] != value):
+                return False
+        return True
+
+    async def execute(self):
+        self.db.calls.append((self.table, self.action))
+        if self.db.hook is not None:
+            await self.db.hook(self)
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.action in ("insert", "upsert"):
+            records = self.payload if isinstance(self.payload, list) else [self.payload]
+            # Like the tables' uuid defaults
+            data = [{"id": str(uuid.uuid4()), **record} for record in records]
+            rows.extend(dict(row) for row in data)
+        elif self.action == "update":
+            data = []
+            for row in rows:
+                if self.matches(row):
+                    row.update(self.payload)
+                    data.append(dict(row))
+        else:
+            data = [dict(row) for row in rows if self.matches(row)]
+            # Stable sorts, least significant key first
+            for column, desc in reversed(self.orderings):
+                data.sort(key=lambda row: row[column], reverse=desc)
+            if self.bounds:
+                data = data[self.bounds[0]:self.bounds[1] + 1]
+        self.db.executed.append(self)
+        return Result(data)
+
+
+class FakeDb:
+    """
+    Shared fake for the module-level `db` client: tables are lists of row dicts.
+    `hook`, if set, is awaited with each query before it runs, so tests can
+    delay, fail or observe individual calls.
+    """
+    def __init__(self):
+        self.tables: dict[str, list[dict]] = {}
+        self.hook = None
+        # (table, action) of every execute, including failed ones
+        self.calls = []
+        # Queries that completed
+        self.executed = []
+
+    def from_(self, table):
+        return FakeQuery(self, table)
+
+    def written(self, action: str = "update") -> list:
+        return [query.payload for query in self.executed if query.action == action]
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDb()
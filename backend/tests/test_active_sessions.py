@@ -0,0 +1,37 @@
+import asyncio
+
+import active_sessions as active_sessions_module
+from active_sessions import ActiveSessionIndex
+
+
+def row(session_id, status="in_progress"):
+    return {"id": session_id, "patient_id": "p1", "status": status, "created_at": session_id}
+
+
+def test_rebuild_keeps_changes_made_while_it_ran(fake_db, monkeypatch):
+    index = ActiveSessionIndex()
+    index.add(row("old"), "d1")
+    index.add(row("finishing"), "d1")
+    index.add(row("gone"), "d1")
+
+    selected = []
+
+    async def during_snapshot(query):
+        selected.append((query.table, query.columns))
+        # Sessions change on another path while the snapshot is in flight
+        if query.table == "exercise_sessions":
+            index.add(row("new"), "d1")
+            index.update("finishing", {"status": "completed"})
+
+    # The snapshot predates "new" and still lists "finishing" as in progress
+    fake_db.tables["exercise_sessions"] = [row("old"), row("finishing")]
+    fake_db.tables["patients"] = [{"id": "p1", "doctor_id": "d1", "full_name": "Pat"}]
+    fake_db.hook = during_snapshot
+    monkeypatch.setattr(active_sessions_module, "db", fake_db)
+    # Local changes before the rebuild started are superseded by the snapshot
+    for session_id in ("old", "finishing", "gone"):
+        index._touched[session_id] -= 10
+
+    asyncio.run(index.rebuild())
+    assert sorted(s["id"] for s in index.for_doctor("d1")) == ["new", "old"]
+    assert ("exercise_sessions", active_sessions_module.SESSION_COLUMNS) in selected
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+import websocket
+from wire import is_angle_map
+
+
+@pytest.mark.parametrize("angles, valid", [
+    ({"left_knee": 90, "spine": 4.5, "neck": None}, True),
+    ({}, True),
+    ([1, 2], False),
+    ({"left_knee": "x"}, False),
+    ({"left_knee": True}, False),
+    ("left_knee", False),
+])
+def test_angle_map_shape(angles, valid):
+    assert is_angle_map(angles) is valid
+
+
+class Sender:
+    def __init__(self):
+        self.sent = []
+
+    def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_a_failing_stage_skips_the_frame_instead_of_raising(monkeypatch):
+    def broken(session_id, frame):
+        raise AttributeError("boom")
+
+    for stage in websocket.ANALYSIS_STAGES:
+        monkeypatch.setattr(stage, "has", lambda session_id: True)
+    monkeypatch.setattr(websocket.pose_scoring, "push", broken)
+    sender = Sender()
+
+    asyncio.run(websocket.analyze_frame("p1", "s1", {"angles": {"left_knee": 90}}, sender))
+    assert sender.sent == []
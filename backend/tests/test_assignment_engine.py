@@ -0,0 +1,55 @@
+import asyncio
+import uuid
+
+import pytest
+from postgrest.exceptions import APIError
+
+import assignment_engine as assignment_engine_module
+from assignment_engine import AssignmentEngine
+
+
+# Stable UUIDs standing in for patient ids
+P1, P2, P3, P9 = (str(uuid.UUID(int=n)) for n in (1, 2, 3, 9))
+
+
+async def no_unique_constraint(query):
+    # No unique constraint on (patient_id, exercise_id) in this database
+    if query.action == "upsert":
+        raise APIError({"code": "42P10", "message": "there is no unique or exclusion constraint"})
+
+
+@pytest.fixture
+def fake(fake_db, monkeypatch):
+    fake_db.tables["patients"] = [{"id": pid, "doctor_id": "d1"} for pid in (P1, P2, P3)]
+    fake_db.tables["assigned_exercises"] = [{"patient_id": P1, "exercise_id": "e1", "sets": 1}]
+    fake_db.hook = no_unique_constraint
+    monkeypatch.setattr(assignment_engine_module, "db", fake_db)
+    return fake_db
+
+
+def test_falls_back_when_the_unique_constraint_is_missing(fake):
+    engine = AssignmentEngine()
+
+    result = asyncio.run(engine.assign("d1", "e1", [P1, P2, P9], {"sets": 3}))
+    assert result["counts"] == {"assigned": 2, "not_found": 1, "failed": 0}
+    assert not engine.upsert_supported
+    assert sorted((row["patient_id"], row["sets"]) for row in fake.tables["assigned_exercises"]) == sorted([(P1, 3), (P2, 3)])
+
+    # Later requests skip the doomed upsert
+    fake.calls.clear()
+    asyncio.run(engine.assign("d1", "e1", [P2, P3], {"sets": 4}))
+    assert ("assigned_exercises", "upsert") not in fake.calls
+    assert sorted((row["patient_id"], row["sets"]) for row in fake.tables["assigned_exercises"]) == sorted([(P1, 3), (P2, 4), (P3, 4)])
+
+
+def test_malformed_ids_are_not_found_without_failing_the_lookup(fake):
+    looked_up = []
+
+    async def hook(query):
+        if query.table == "patients":
+            looked_up.extend(query.filter_value("id", "in"))
+
+    fake.hook = hook
+    result = asyncio.run(AssignmentEngine().assign("d1", "e1", ["not-a-uuid", P2, "1 or 1=1"], {}))
+    assert [r["status"] for r in result["results"]] == ["not_found", "assigned", "not_found"]
+    assert "not-a-uuid" not in looked_up and "1 or 1=1" not in looked_up
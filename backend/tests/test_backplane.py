@@ -0,0 +1,128 @@
+import asyncio
+
+import fakeredis
+import pytest
+import redis.asyncio
+
+from backplane import RedisBackplane, decode_envelope, encode_envelope
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.asyncio, "from_url",
+        lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs)
+    )
+    return server
+
+
+async def _wait_for(received: list, count: int):
+    for _ in range(200):
+        if len(received) >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"expected {count} messages, got {received}")
+
+
+def test_envelope_round_trips_bytes():
+    frame = bytes(range(256))
+    message = {"type": "exercise_update", "frame": frame, "angles": {"left_knee": 90.0}}
+    assert decode_envelope(encode_envelope(message)) == message
+
+
+def test_client_marker_objects_stay_json():
+    # Objects shaped like the old {"__b64__": ...} marker are plain client data
+    message = {"type": "signal", "payload": {"__b64__": "aGVsbG8="}, "nested": [{"bytes": "x"}]}
+    assert decode_envelope(encode_envelope(message)) == message
+
+
+def test_publish_reaches_every_worker(redis_server):
+    async def scenario():
+        workers = [RedisBackplane("redis://fake", prefix="test"), RedisBackplane("redis://fake", prefix="test")]
+        received = [[], []]
+        for backplane, inbox in zip(workers, received):
+            async def handler(channel, message, inbox=inbox):
+                inbox.append((channel, message))
+            backplane.set_handler(handler)
+            await backplane.start()
+        try:
+            frame = b"\x01\x01\x00\xff"
+            await workers[0].publish("doctor:p1", {"type": "exercise_update", "frame": frame})
+            await workers[1].publish("patient:p1", {"type": "signal", "data": {"__b64__": "AA=="}})
+            for inbox in received:
+                await _wait_for(inbox, 2)
+            for inbox in received:
+                assert inbox == [
+                    ("doctor:p1", {"type": "exercise_update", "frame": frame}),
+                    ("patient:p1", {"type": "signal", "data": {"__b64__": "AA=="}}),
+                ]
+        finally:
+            for backplane in workers:
+                await backplane.close()
+
+    asyncio.run(scenario())
+
+
+def test_handler_errors_do_not_stop_the_listener(redis_server):
+    async def scenario():
+        backplane = RedisBackplane("redis://fake", prefix="test")
+        received = []
+
+        async def handler(channel, message):
+            if message.get("fail"):
+                raise RuntimeError("boom")
+            received.append(message)
+
+        backplane.set_handler(handler)
+        await backplane.start()
+        try:
+            await backplane.publish("doctor:p1", {"fail": True})
+            await backplane.publish("doctor:p1", {"type": "ok"})
+            await _wait_for(received, 1)
+            assert received == [{"type": "ok"}]
+        finally:
+            await backplane.close()
+
+    asyncio.run(scenario())
+
+
+def test_listener_resubscribes_after_a_connection_error(redis_server):
+    async def scenario():
+        backplane = RedisBackplane("redis://fake", prefix="test", retry_min=0.01)
+        received = []
+
+        async def handler(channel, message):
+            received.append(message)
+
+        backplane.set_handler(handler)
+        await backplane.start()
+        broken = backplane._pubsub
+        try:
+            # Drop the current subscription the way a lost Redis connection would
+            async def listen():
+                raise ConnectionError("connection lost")
+                yield
+
+            broken.listen = listen
+            backplane._listener.cancel()
+            backplane._listener = asyncio.create_task(backplane._listen())
+            for _ in range(200):
+                if backplane._pubsub is not broken and backplane._pubsub is not None:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.02)
+            await backplane.publish("doctor:p1", {"type": "after"})
+            await _wait_for(received, 1)
+            assert received == [{"type": "after"}]
+        finally:
+            await backplane.close()
+
+    asyncio.run(scenario())
+
+
+def test_backplane_requires_publish():
+    from backplane import Backplane
+
+    with pytest.raises(TypeError):
+        Backplane()
@@ -0,0 +1,47 @@
+import asyncio
+
+from coalescer import MAX_UPDATE_HZ, MIN_UPDATE_HZ, AckCounter, FrameCoalescer, clamp_rate
+
+
+def test_one_ack_per_every_frames():
+    acks = AckCounter(every=3)
+    sent = [acks.frame(float(ts)) for ts in range(1, 8)]
+    assert sent == [
+        None, None, {"type": "acknowledged", "timestamp": 3.0, "count": 3},
+        None, None, {"type": "acknowledged", "timestamp": 6.0, "count": 3},
+        None,
+    ]
+
+
+def test_ack_every_frame():
+    acks = AckCounter(every=1)
+    assert acks.frame(1.0) == {"type": "acknowledged", "timestamp": 1.0, "count": 1}
+    assert acks.frame(2.0)["count"] == 1
+
+
+def test_rates_are_clamped():
+    assert clamp_rate(1000) == MAX_UPDATE_HZ
+    assert clamp_rate(0) == MIN_UPDATE_HZ
+
+
+def test_only_the_latest_frame_is_forwarded():
+    async def scenario():
+        published = []
+
+        async def publish(patient_id, message):
+            published.append((patient_id, message["n"]))
+
+        coalescer = FrameCoalescer(publish, rate_hz=20)
+        coalescer.offer("p1", {"n": 1}, 10)
+        await asyncio.sleep(0)
+        # Arrive within one interval: only the last of them goes out
+        for n in (2, 3, 4):
+            coalescer.offer("p1", {"n": n}, 10)
+        await asyncio.sleep(0.1)
+        await coalescer.close("p1")
+        assert published == [("p1", 1), ("p1", 4)]
+        stats = coalescer.stats()
+        assert stats["frames_in"] == 4 and stats["frames_out"] == 2
+        assert stats["frames_coalesced"] == 2 and stats["bytes_saved"] == 20
+
+    asyncio.run(scenario())
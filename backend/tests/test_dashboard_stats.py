@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+from postgrest import AsyncPostgrestClient
+
+import dashboard_stats as dashboard_stats_module
+from dashboard_stats import DashboardStats
+
+
+def test_counts_are_head_requests_without_rows(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        total = {"patients": 7, "exercise_sessions": 3, "assigned_exercises": 5}[request.url.path.rsplit("/", 1)[-1]]
+        return httpx.Response(200, headers={"Content-Range": f"*/{total}"})
+
+    client = AsyncPostgrestClient(
+        "http://db.test/rest/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(dashboard_stats_module, "db", client)
+    stats = DashboardStats()
+
+    async def scenario():
+        assert await stats.doctor("d1") == {"activePatients": 7, "totalPatients": 7}
+        assert await stats.patient("p1") == {"completed_sessions": 3, "total_exercises": 5}
+
+    asyncio.run(scenario())
+    assert [r.method for r in requests] == ["HEAD"] * 3
+    assert all("count=exact" in r.headers["prefer"] for r in requests)
+    assert "doctor_id=eq.d1" in str(requests[0].url)
@@ -0,0 +1,141 @@
+import asyncio
+import datetime
+import socket
+import ssl
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+x509 = pytest.importorskip("cryptography.x509")
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult, LoginPassword
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from email_service import EmailDispatcher
+
+USER, PASSWORD = "mailer", "secret"
+
+
+def _tls_context(tmp_path) -> ssl.SSLContext:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name)\
+        .public_key(key.public_key()).serial_number(x509.random_serial_number())\
+        .not_valid_before(now - datetime.timedelta(minutes=1))\
+        .not_valid_after(now + datetime.timedelta(hours=1))\
+        .sign(key, hashes.SHA256())
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class Mailbox:
+    def __init__(self):
+        self.messages = []
+        self.logins = 0
+        # DATA replies to hand out before accepting, e.g. ["451 Try again later"]
+        self.failures = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failures:
+            return self.failures.pop(0)
+        self.messages.append(envelope)
+        return "250 OK"
+
+    def authenticate(self, server, session, envelope, mechanism, auth_data):
+        if isinstance(auth_data, LoginPassword) and \
+                (auth_data.login.decode(), auth_data.password.decode()) == (USER, PASSWORD):
+            self.logins += 1
+            return AuthResult(success=True)
+        return AuthResult(success=False, handled=False)
+
+
+@pytest.fixture
+def mailbox(tmp_path, monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    box = Mailbox()
+    controller = Controller(
+        box, hostname="127.0.0.1", port=port,
+        tls_context=_tls_context(tmp_path), require_starttls=True,
+        authenticator=box.authenticate, auth_require_tls=True,
+    )
+    controller.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_USER", USER)
+    monkeypatch.setenv("SMTP_PASS", PASSWORD)
+    monkeypatch.setenv("SMTP_FROM", "noreply@physiocheck.test")
+    yield box
+    controller.stop()
+
+
+async def _settle(dispatcher: EmailDispatcher, job_ids: list, owner: str):
+    for _ in range(300):
+        states = [dispatcher.job(job_id, owner)["status"] for job_id in job_ids]
+        if all(state in ("sent", "failed", "skipped") for state in states):
+            return states
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"jobs still pending: {states}")
+
+
+def test_messages_share_one_authenticated_connection(mailbox):
+    async def scenario():
+        dispatcher = EmailDispatcher(workers=1)
+        dispatcher.start()
+        try:
+            ids = [dispatcher.enqueue(f"patient{n}@example.com", "Hello", f"Body {n}", owner="d1")
+                   for n in range(3)]
+            assert await _settle(dispatcher, ids, "d1") == ["sent"] * 3
+        finally:
+            await dispatcher.close()
+
+    asyncio.run(scenario())
+    assert [m.rcpt_tos for m in mailbox.messages] == [[f"patient{n}@example.com"] for n in range(3)]
+    assert mailbox.logins == 1
+
+
+def test_transient_failure_is_retried(mailbox):
+    mailbox.failures = ["451 Try again later"]
+
+    async def scenario():
+        dispatcher = EmailDispatcher(workers=1, retry_base_delay=0.01)
+        dispatcher.start()
+        try:
+            job_id = dispatcher.enqueue("patient@example.com", "Hello", "Body", owner="d1")
+            assert await _settle(dispatcher, [job_id], "d1") == ["sent"]
+            assert dispatcher.job(job_id, "d1")["attempts"] == 2
+            assert dispatcher.retried == 1
+        finally:
+            await dispatcher.close()
+
+    asyncio.run(scenario())
+    assert len(mailbox.messages) == 1
+
+
+def test_exhausted_jobs_are_dead_lettered_for_their_owner_only(mailbox, monkeypatch):
+    monkeypatch.setenv("SMTP_PASS", "wrong")
+
+    async def scenario():
+        dispatcher = EmailDispatcher(workers=1, max_attempts=2, retry_base_delay=0.01)
+        dispatcher.start()
+        try:
+            job_id = dispatcher.enqueue("patient@example.com", "Hello", "Body", owner="d1")
+            assert await _settle(dispatcher, [job_id], "d1") == ["failed"]
+            assert [job["id"] for job in dispatcher.stats("d1")["dead_letters"]] == [job_id]
+            assert dispatcher.stats("d2")["dead_letters"] == []
+            assert dispatcher.job(job_id, "d2") is None
+        finally:
+            await dispatcher.close()
+
+    asyncio.run(scenario())
+    assert mailbox.messages == []
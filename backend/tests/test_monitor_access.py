@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import websocket
+from identity import identity
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    async def verify(token):
+        return SimpleNamespace(id=token, user_metadata={"role": "doctor"})
+
+    async def doctor_id(auth_user_id, create=False):
+        return {"auth-d1": "d1", "auth-d2": "d2"}.get(auth_user_id)
+
+    monkeypatch.setattr(websocket.verifier, "verify", verify)
+    fake_db.tables["exercise_sessions"] = [
+        {"id": "s1", "patient_id": "p1", "patients": {"full_name": "Pat", "doctor_id": "d1"}}
+    ]
+    monkeypatch.setattr(websocket, "db", fake_db)
+    monkeypatch.setattr(identity, "doctor_id", doctor_id)
+    app = FastAPI()
+    app.include_router(websocket.router)
+    return TestClient(app)
+
+
+def test_another_doctor_cannot_monitor_the_patient(client):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/ws/doctor/monitor/s1?token=auth-d2") as ws:
+            ws.receive_json()
+    assert closed.value.code == 4403
+
+
+def test_the_patients_doctor_is_connected(client):
+    with client.websocket_connect("/ws/doctor/monitor/s1?token=auth-d1") as ws:
+        message = ws.receive_json()
+    assert message["type"] == "connected" and message["patient_id"] == "p1"
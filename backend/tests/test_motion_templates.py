@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+
+from motion_templates import MotionTemplateEngine, banded_dtw
+
+
+def test_early_abandon_never_rejects_a_reachable_distance():
+    rng = np.random.default_rng(7)
+    abandoned = 0
+    for _ in range(300):
+        n, m = rng.integers(4, 40, size=2)
+        a = rng.normal(0, 1, (n, 2))
+        b = rng.normal(0, 1, (m, 2))
+        band = int(rng.integers(1, 8))
+        exact = banded_dtw(a, b, band)
+        limit = exact * rng.uniform(0.5, 1.5)
+        bounded = banded_dtw(a, b, band, limit)
+        if math.isinf(bounded):
+            abandoned += 1
+            assert exact > limit
+        else:
+            assert bounded == exact
+    assert abandoned > 0
+
+
+def test_diagonal_steps_skip_an_expensive_anti_diagonal():
+    # Every odd anti-diagonal costs >= 10 per cell, yet the straight path skips them all
+    signal = np.tile([[0.0], [10.0]], (16, 1))
+    assert banded_dtw(signal, signal, 2, max_distance=0.1) == 0.0
+
+
+def test_bad_samples_leave_gaps_instead_of_raising():
+    engine = MotionTemplateEngine()
+    engine.open("s1", {"id": "e1", "reference_trajectory": {"left_knee": [170, 90, 170]}})
+    engine.push("s1", {"timestamp": 0, "angles": {"left_knee": "x"}})
+    engine.push("s1", {"timestamp": 1, "angles": [1, 2]})
+    engine.push("s1", {"timestamp": 2, "angles": {"left_knee": True}})
+    for i, angle in enumerate([170, 130, 90, 130, 170]):
+        engine.push("s1", {"timestamp": 10 + i, "angles": {"left_knee": angle}})
+    result = engine.score_rep("s1", 0, 20)
+    assert result["similarity"] > 90
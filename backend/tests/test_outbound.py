@@ -0,0 +1,75 @@
+import asyncio
+
+from outbound import OUTBOUND_HARD_LIMIT_FACTOR, SocketSender
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = (code, reason)
+
+
+def queued(sender):
+    return [entry[1] for entry in sender._queue]
+
+
+def test_full_queue_drops_the_oldest_droppable_message():
+    # No writer task: nothing drains, so the queue stays full
+    sender = SocketSender(FakeSocket(), max_queue=3)
+    assert sender.enqueue("frame-1", droppable=True)
+    assert sender.enqueue("signal-1")
+    assert sender.enqueue("frame-2", droppable=True)
+
+    assert sender.enqueue("frame-3", droppable=True)
+    assert queued(sender) == ["signal-1", "frame-2", "frame-3"]
+    # Non-droppable messages go over the bound instead of displacing anything
+    assert sender.enqueue("signal-2")
+    assert queued(sender) == ["signal-1", "frame-2", "frame-3", "signal-2"]
+    assert sender.dropped == 1
+
+
+def test_droppable_message_is_refused_when_only_signals_are_queued():
+    sender = SocketSender(FakeSocket(), max_queue=2)
+    sender.enqueue("signal-1")
+    sender.enqueue("signal-2")
+    assert not sender.enqueue("frame-1", droppable=True)
+    assert queued(sender) == ["signal-1", "signal-2"]
+    assert sender.dropped == 1
+
+
+def test_hard_limit_closes_a_stalled_consumer():
+    async def scenario():
+        socket = FakeSocket()
+        sender = SocketSender(socket, max_queue=2)
+        for n in range(2 * OUTBOUND_HARD_LIMIT_FACTOR):
+            assert sender.enqueue(f"signal-{n}")
+        assert not sender.enqueue("one-too-many")
+        assert sender.closed and not sender._queue
+        await asyncio.sleep(0)
+        assert socket.closed_with == (1013, "Slow consumer")
+        assert not sender.send_json({"type": "signal"})
+
+    asyncio.run(scenario())
+
+
+def test_writer_delivers_in_order():
+    async def scenario():
+        socket = FakeSocket()
+        sender = SocketSender(socket)
+        sender.start()
+        sender.send_json({"type": "connected"})
+        sender.enqueue(b"\x01\x02", droppable=True)
+        await sender.close()
+        assert socket.sent == ['{"type":"connected"}', b"\x01\x02"]
+        assert sender.stats()["sent"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, keyset_filter, parse_fields
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-01-01T00:00:00+00:00", "s1")
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["2026-01-01T00:00:00+00:00", "s1"]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor("only-one"), "e30"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 2)
+    assert error.value.status_code == 400
+
+
+def test_keyset_filter_selects_rows_after_the_cursor():
+    assert keyset_filter("created_at", "t", "id", "s1") == \
+        'created_at.lt."t",and(created_at.eq."t",id.lt."s1")'
+    assert keyset_filter("full_name", "A", "id", "p1", desc=False).startswith('full_name.gt."A"')
+
+
+def test_parse_fields_rejects_unknown_columns():
+    assert parse_fields("full_name", {"full_name", "email"}, required=("id",)) == "id, full_name"
+    assert parse_fields(None, {"full_name"}) is None
+    with pytest.raises(HTTPException):
+        parse_fields("password", {"full_name"})
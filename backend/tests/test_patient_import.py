@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import doctor
+from doctor import CreatePatientPayload, import_patient_batch
+
+
+def payload(name):
+    return CreatePatientPayload(full_name=name.title(), email=f"{name}@example.com", phone="5550001111",
+                                sendCredentials=False)
+
+
+@pytest.fixture
+def accounts(fake_db, monkeypatch):
+    state = SimpleNamespace(created=[], deleted=[])
+
+    async def sign_up_patient(email, temp_password):
+        auth_id = f"auth-{email.split('@')[0]}"
+        state.created.append(auth_id)
+        return SimpleNamespace(user=SimpleNamespace(id=auth_id))
+
+    async def delete_auth_user(auth_user_id):
+        state.deleted.append(auth_user_id)
+
+    monkeypatch.setattr(doctor, "sign_up_patient", sign_up_patient)
+    monkeypatch.setattr(doctor, "delete_auth_user", delete_auth_user)
+    monkeypatch.setattr(doctor, "db", fake_db)
+    return state
+
+
+def test_auth_user_of_a_failed_row_is_deleted(fake_db, accounts):
+    async def reject_bob(query):
+        records = query.payload if isinstance(query.payload, list) else [query.payload]
+        if any(record["email"] == "bob@example.com" for record in records):
+            raise ConnectionError("insert rejected")
+
+    fake_db.hook = reject_bob
+    batch = [(0, payload("ann")), (1, payload("bob"))]
+    results = asyncio.run(import_patient_batch(batch, "d1", asyncio.Semaphore(2)))
+    assert [r["status"] for r in results] == ["created", "failed"]
+    assert accounts.deleted == ["auth-bob"]
+    assert [row["auth_user_id"] for row in fake_db.tables["patients"]] == ["auth-ann"]
+
+
+def test_interrupted_batch_deletes_the_auth_users_it_created(fake_db, accounts):
+    async def scenario():
+        inserting = asyncio.Event()
+
+        async def hang(query):
+            inserting.set()
+            await asyncio.sleep(10)
+
+        fake_db.hook = hang
+        task = asyncio.create_task(import_patient_batch([(0, payload("ann"))], "d1", asyncio.Semaphore(1)))
+        await inserting.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert accounts.created == accounts.deleted == ["auth-ann"]
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import patient_stats as patient_stats_module
+from patient_stats import PatientStatsEngine
+
+
+@pytest.fixture
+def fake(fake_db, monkeypatch):
+    fake_db.tables["exercise_sessions"] = []
+    monkeypatch.setattr(patient_stats_module, "db", fake_db)
+    return fake_db
+
+
+def session(session_id, patient_id="p1", duration=120, accuracy=80, completed_at="2026-01-01T00:00:00+00:00"):
+    return {"id": session_id, "patient_id": patient_id, "status": "completed",
+            "duration_seconds": duration, "accuracy_percent": accuracy,
+            "completed_at": completed_at}
+
+
+def test_aggregates_update_incrementally_and_stay_bounded(fake):
+    engine = PatientStatsEngine(max_patients=2, recent_ids=2)
+    fake.tables["exercise_sessions"].append(session("s1"))
+
+    async def scenario():
+        assert (await engine.get("p1"))["totalSessions"] == 1
+        loaded = len(fake.calls)
+
+        # Folded in once, even if reported twice, without going back to the database
+        for session_id in ("s2", "s2", "s3", "s4", "s4"):
+            engine.record_completed(session(session_id, duration=60))
+        stats = await engine.get("p1")
+        assert stats["totalSessions"] == 4 and stats["totalDuration"] == 5
+        assert [c for c in fake.calls[loaded:] if c[0] == "exercise_sessions"] == []
+        # Only the latest ids are remembered
+        assert list(engine._aggregates["p1"].seen) == ["s3", "s4"]
+
+        for patient_id in ("p2", "p3"):
+            await engine.get(patient_id)
+        assert list(engine._aggregates) == ["p2", "p3"]
+
+    asyncio.run(scenario())
+
+
+def test_completion_read_by_the_load_in_flight_counts_once(fake):
+    engine = PatientStatsEngine()
+    fake.tables["exercise_sessions"] += [session("s1", completed_at="2026-01-01T00:00:00+00:00"),
+                                         session("s2", completed_at="2026-01-02T00:00:00+00:00")]
+
+    async def hook(query):
+        # s2's completed write landed just before the load read it
+        engine.record_completed(session("s2"))
+
+    fake.hook = hook
+    asyncio.run(engine.get("p1"))
+    assert engine._aggregates["p1"].total_sessions == 2
+    assert fake.executed[0].orderings == [("completed_at", True), ("id", True)]
+
+
+def test_completions_are_published_to_other_workers(fake):
+    engine = PatientStatsEngine()
+    published = []
+
+    async def publish(completed):
+        published.append(completed["id"])
+
+    engine.set_publisher(publish)
+
+    async def scenario():
+        await engine.get("p1")
+        engine.record_completed(session("s1"))
+        # Delivered back from the backplane: applied, not published again
+        engine.record_completed(session("s1"), publish=False)
+        engine.record_completed(session("s2", patient_id="p1"), publish=False)
+        await asyncio.sleep(0)
+        assert published == ["s1"]
+        assert (await engine.get("p1"))["totalSessions"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_one_load(fake):
+    engine = PatientStatsEngine()
+
+    async def scenario():
+        await asyncio.gather(*(engine._aggregate("p1") for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert engine.loads == 1
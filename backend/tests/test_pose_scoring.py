@@ -0,0 +1,27 @@
+import pytest
+
+from pose_scoring import PoseScoringEngine
+
+
+@pytest.mark.parametrize("exercise", [
+    None,
+    {},
+    {"expected_angles": {}},
+    {"expected_angles": {"tail": 90}},
+    {"expected_angles": [90]},
+])
+def test_exercises_without_target_angles_are_not_scored(exercise):
+    engine = PoseScoringEngine(window=1)
+    assert engine.open("s1", exercise) is None
+    assert engine.has("s1")
+    assert engine.push("s1", {"angles": {"left_knee": 90, "left_elbow": 30}}) is None
+    assert engine.stats()["sessions"] == 0
+
+
+def test_only_the_exercise_joints_are_scored():
+    engine = PoseScoringEngine(window=2)
+    engine.open("s1", {"expected_angles": {"left_knee": 90}, "angle_tolerance": {"warning": 5, "incorrect": 15}})
+    assert engine.push("s1", {"angles": {"left_knee": 96, "left_elbow": 30}}) is None
+    report = engine.push("s1", {"angles": {"left_knee": 98, "left_elbow": 30}})
+    assert [f["joint"] for f in report["feedback"]] == ["left_knee"]
+    assert report["posture_status"] == "warning"
@@ -0,0 +1,67 @@
+import pytest
+
+from rep_counter import RepCounter, rep_counters
+from session_writes import completion_fields
+from wire import encode_frame
+
+SQUAT = {"rep_counter": {"joint": "left_knee", "start": 160, "peak": 100}}
+
+
+def frames(angles, step_ms=100.0):
+    return [{"timestamp": i * step_ms, "angles": {"left_knee": angle}} for i, angle in enumerate(angles)]
+
+
+def push_all(counter, stream):
+    return [event for event in map(counter.push, stream) if event is not None]
+
+
+def test_hysteresis_counts_only_full_reps():
+    counter = RepCounter.for_exercise(SQUAT)
+    # Jitter around the start threshold, then a shallow dip that never reaches the peak
+    assert push_all(counter, frames([170, 159, 161, 158, 162, 130, 120, 165])) == []
+    # A full rep: down past the peak and back past start
+    events = push_all(counter, frames([170, 150, 120, 95, 90, 120, 150, 165]))
+    assert [e["count"] for e in events] == [1]
+    assert events[0]["peak_angle"] == 90 and events[0]["duration_ms"] == 600
+
+
+def test_reps_faster_than_the_minimum_duration_are_ignored():
+    counter = RepCounter.for_exercise(SQUAT)
+    assert push_all(counter, frames([170, 150, 90, 165], step_ms=10)) == []
+    assert counter.count == 0
+
+
+def test_extension_counts_raises_and_binary_frames():
+    counter = RepCounter.for_exercise({"rep_counter": {"joint": "left_shoulder", "start": 40, "peak": 150}})
+    stream = [encode_frame({"left_shoulder": a}, i * 200.0) for i, a in enumerate([20, 60, 120, 160, 100, 30])]
+    assert [e["count"] for e in push_all(counter, stream)] == [1]
+
+
+@pytest.mark.parametrize("frame", [
+    {"angles": [1, 2]},
+    {"angles": "left_knee"},
+    {"angles": {"left_knee": "x"}},
+    {"timestamp": "soon"},
+    b"\x01\x02\x03",
+])
+def test_malformed_frames_are_skipped(frame):
+    counter = RepCounter.for_exercise(SQUAT)
+    assert counter.push(frame) is None
+    assert counter.count == 0
+
+
+@pytest.mark.parametrize("exercise", [
+    None,
+    {},
+    {"rep_counter": {"joint": "tail", "start": 160, "peak": 100}},
+    {"rep_counter": {"joint": "left_knee", "start": "160", "peak": 100}},
+    {"rep_counter": {"joint": "left_knee", "start": 100, "peak": 100}},
+])
+def test_exercises_without_a_usable_config_are_not_counted(exercise):
+    assert rep_counters.open("s1", exercise) is None
+    assert rep_counters.has("s1")
+    assert rep_counters.push("s1", frames([170, 90, 170])[1]) is None
+    assert rep_counters.count("s1") is None
+    # The patient's own count stands
+    assert completion_fields("s1", {"status": "completed", "repetitions": 12})["repetitions"] == 12
+    rep_counters.pop_count("s1")
@@ -0,0 +1,23 @@
+import json
+
+from replay_buffer import ReplayBuffer
+from wire import JOINTS, encode_frame
+
+
+def test_malformed_frames_are_not_buffered_and_bad_entries_are_skipped():
+    buffer = ReplayBuffer()
+    frame = encode_frame({JOINTS[0]: 90.0}, timestamp=1.0, accuracy=80.0)
+    buffer.record("p1", {"type": "exercise_update", "frame": frame})
+    buffer.record("p1", {"type": "exercise_update", "frame": frame[:-2]})
+    buffer.record("p1", {"type": "rep_completed", "session_id": "s1", "reps": 3})
+    assert buffer.stats()["rejected"] == 1
+
+    # An entry that slipped in undecodable must not break catch-up for the rest
+    stream = buffer._streams["p1"]
+    seq, recorded_at, event_type, session_id, _ = stream.events[0]
+    stream.events[0] = (seq, recorded_at, event_type, session_id, b"\xff")
+    stream.latest["exercise_update"] = (seq, session_id, b"\xff")
+
+    snapshot, replay = (json.loads(payload) for payload in buffer.catch_up("p1", since_seq=0, stream_id=stream.id))
+    assert list(snapshot["latest"]) == ["rep_completed"]
+    assert [event["type"] for event in replay["events"]] == ["rep_completed"]
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from active_sessions import active_sessions
+from websocket import SessionBinding
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    rows = {
+        "mine": {"id": "mine", "patient_id": "p1", "status": "in_progress", "created_at": "2026-01-01"},
+        "mine-done": {"id": "mine-done", "patient_id": "p1", "status": "completed"},
+        "theirs": {"id": "theirs", "patient_id": "p2", "status": "in_progress"},
+    }
+    lookups = []
+
+    async def owned(session_id, patient_id):
+        lookups.append(session_id)
+        row = rows.get(session_id)
+        return row if row and row["patient_id"] == patient_id else None
+
+    monkeypatch.setattr(active_sessions, "owned", owned)
+    monkeypatch.setattr(active_sessions, "current_for_patient", lambda patient_id: None)
+    return lookups
+
+
+def test_frames_cannot_claim_another_patients_session(sessions):
+    async def scenario():
+        binding = SessionBinding("p1")
+        assert await binding.resolve("theirs") is None
+        assert await binding.resolve("mine-done") is None
+        assert await binding.resolve("mine") == "mine"
+        assert await binding.resolve("theirs") == "mine"
+        # Each id is only looked up once per connection
+        assert sessions == ["theirs", "mine-done", "mine"]
+        binding.release("mine")
+        assert binding.session_id is None
+
+    asyncio.run(scenario())
+
+
+class Progress:
+    """Records what handle_session_progress relays, writes, closes and sends."""
+    def __init__(self, monkeypatch, row=None):
+        import websocket
+        self.relayed, self.submitted, self.closed, self.sent = [], [], [], []
+        self.row = row
+
+        async def signal_to_doctor(patient_id, message):
+            self.relayed.append(message)
+
+        def submit(session_id, patient_id, fields, delay=None):
+            self.submitted.append((session_id, fields))
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(self.row)
+            return future
+
+        monkeypatch.setattr(websocket.manager, "signal_to_doctor", signal_to_doctor)
+        monkeypatch.setattr(websocket.session_writes, "submit", submit)
+        monkeypatch.setattr(active_sessions, "update", lambda session_id, fields: None)
+        for stage in (websocket.pose_scoring, websocket.motion_templates, websocket.motion_analytics):
+            monkeypatch.setattr(stage, "close", self.closed.append)
+
+    def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_progress_for_another_patients_session_is_rejected(sessions, monkeypatch):
+    from websocket import handle_session_progress
+    progress = Progress(monkeypatch, row={"id": "theirs"})
+
+    async def scenario():
+        binding = SessionBinding("p1", "mine")
+        await handle_session_progress("p1", binding, {"session_id": "theirs", "status": "completed"}, progress)
+
+    asyncio.run(scenario())
+    assert progress.relayed == [] and progress.submitted == [] and progress.closed == []
+    assert progress.sent[0]["type"] == "error"
+
+
+def test_stages_close_only_after_the_completion_is_saved(sessions, monkeypatch):
+    from websocket import handle_session_progress
+    progress = Progress(monkeypatch, row=None)
+
+    async def scenario():
+        binding = SessionBinding("p1", "mine")
+        message = {"session_id": "mine", "status": "completed", "repetitions": 5}
+        await handle_session_progress("p1", binding, message, progress)
+        assert progress.closed == [] and binding.session_id == "mine"
+        assert progress.sent[-1]["message"] == "Failed to save session"
+
+        progress.row = {"id": "mine", "status": "completed"}
+        await handle_session_progress("p1", binding, message, progress)
+        assert progress.closed == ["mine", "mine", "mine"]
+        assert binding.session_id is None
+        assert progress.sent[-1]["type"] == "session_saved"
+
+    asyncio.run(scenario())
@@ -0,0 +1,100 @@
+import time
+import asyncio
+
+import pytest
+
+import session_writes as session_writes_module
+from rep_counter import rep_counters
+from session_writes import SessionWriteBuffer, completion_fields
+from telemetry import telemetry
+
+
+class SlowWrites:
+    """Hook holding each write at `gate` and tracking how many run at once."""
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.fail = False
+        self.active = 0
+        self.overlap = 0
+
+    async def __call__(self, query):
+        self.active += 1
+        self.overlap = max(self.overlap, self.active)
+        await self.gate.wait()
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if self.fail:
+            raise ConnectionError("database unavailable")
+
+
+@pytest.fixture
+def sessions(fake_db, monkeypatch):
+    fake_db.tables["exercise_sessions"] = [{"id": "s1", "patient_id": "p1", "status": "in_progress"}]
+    fake_db.hook = SlowWrites()
+    monkeypatch.setattr(session_writes_module, "db", fake_db)
+    return fake_db
+
+
+def test_counters_survive_until_the_completed_write_succeeds(sessions):
+    writes = sessions.hook
+
+    async def scenario():
+        writes.gate.set()
+        buffer = SessionWriteBuffer()
+        rep_counters.open("s1", {"rep_counter": {"joint": "left_knee", "start": 160, "peak": 100}}).count = 7
+        telemetry._track_accuracy("s1", 90)
+
+        # Someone else's patient id: no row matches, counters untouched
+        fields = completion_fields("s1", {"status": "completed"})
+        assert fields["repetitions"] == 7 and fields["accuracy_percent"] == 90
+        assert await buffer.write("s1", "p2", fields) is None
+        # A failed write keeps them too
+        writes.fail = True
+        try:
+            await buffer.write("s1", "p1", fields)
+        except ConnectionError:
+            pass
+        assert rep_counters.count("s1") == 7 and telemetry.session_accuracy("s1") == 90
+
+        writes.fail = False
+        row = await buffer.write("s1", "p1", completion_fields("s1", {"status": "completed"}))
+        assert row["repetitions"] == 7
+        assert rep_counters.count("s1") is None and telemetry.session_accuracy("s1") is None
+
+    asyncio.run(scenario())
+
+
+def test_flushes_of_one_session_stay_ordered(sessions):
+    writes = sessions.hook
+
+    async def scenario():
+        buffer = SessionWriteBuffer()
+        first = asyncio.ensure_future(buffer.write("s1", "p1", {"repetitions": 1}))
+        await asyncio.sleep(0.01)
+        # Both arrive while the first flush is in flight and share the next one
+        second = asyncio.ensure_future(buffer.write("s1", "p1", {"repetitions": 2}))
+        third = asyncio.ensure_future(buffer.write("s1", "p1", {"duration_seconds": 30}))
+        await asyncio.sleep(0.01)
+        writes.gate.set()
+        await first
+        fourth = asyncio.ensure_future(buffer.write("s1", "p1", {"repetitions": 4}))
+        await asyncio.gather(second, third, fourth)
+        assert sessions.written()[:2] == [{"repetitions": 1}, {"repetitions": 2, "duration_seconds": 30}]
+        assert sessions.written()[-1]["repetitions"] == 4
+        assert writes.overlap == 1
+        assert buffer._locks == {} and buffer._lock_users == {} and buffer._pending == {}
+
+    asyncio.run(scenario())
+
+
+def test_a_write_with_nothing_in_flight_is_not_delayed(sessions):
+    async def scenario():
+        sessions.hook.gate.set()
+        buffer = SessionWriteBuffer()
+        started = time.perf_counter()
+        row = await buffer.write("s1", "p1", {"repetitions": 5})
+        # One fake round-trip (10 ms), no coalescing window on top
+        assert time.perf_counter() - started < 0.1
+        assert row["repetitions"] == 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,35 @@
+import asyncio
+
+import telemetry as telemetry_module
+from telemetry import TelemetryPipeline
+from wire import HEADER, body_struct, encode_frame
+
+
+def test_bad_frame_is_skipped_and_failed_batch_retried(fake_db, monkeypatch):
+    failures = [ConnectionError("database unavailable")]
+
+    async def fail_once(query):
+        if failures:
+            raise failures.pop()
+
+    fake_db.hook = fail_once
+    monkeypatch.setattr(telemetry_module, "db", fake_db)
+    rows = fake_db.tables.setdefault("session_samples", [])
+    pipeline = TelemetryPipeline(sink="db", flush_interval=0.01)
+    bad = HEADER.pack(1, 1, 1, 0.0, 0.0) + body_struct(1).pack(200, 1.0)
+
+    async def scenario():
+        pipeline.start()
+        pipeline.ingest("s1", "p1", encode_frame({"left_knee": 90.0}, 1000.0))
+        pipeline.ingest("s1", "p1", bad)
+        pipeline.ingest("s1", "p1", {"type": "exercise_data", "timestamp": 2000.0, "angles": {"left_knee": 80.0}})
+        for _ in range(100):
+            if len(rows) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline.close()
+
+    asyncio.run(scenario())
+    assert [row["angles"] for row in rows] == [{"left_knee": 90.0}, {"left_knee": 80.0}]
+    assert pipeline.flush_errors == 1
+    assert pipeline.dropped == 1
@@ -0,0 +1,38 @@
+import pytest
+
+from motion_analytics import MotionAnalytics
+from pose_scoring import PoseScoringEngine
+from rep_counter import RepCounterRegistry
+from wire import HEADER, WireError, body_struct, decode_frame, encode_frame, unpack_frame, validate_frame
+
+
+def test_round_trip():
+    frame = encode_frame({"left_knee": 90.0, "spine": 10.5, "unknown": 1.0}, 1234.0, 87.5)
+    assert validate_frame(frame) == 1234.0
+    assert decode_frame(frame) == (1234.0, 87.5, {"left_knee": 90.0, "spine": 10.5})
+    assert unpack_frame(frame) == (1234.0, 87.5, (8, 13), (90.0, 10.5))
+
+
+MALFORMED = [
+    b"\x01\x01",
+    HEADER.pack(2, 1, 0, 0.0, 0.0),
+    HEADER.pack(1, 9, 0, 0.0, 0.0),
+    HEADER.pack(1, 1, 2, 0.0, 0.0) + body_struct(1).pack(0, 1.0),
+    HEADER.pack(1, 1, 1, 0.0, 0.0) + body_struct(1).pack(200, 1.0),
+]
+
+
+@pytest.mark.parametrize("frame", MALFORMED)
+def test_malformed_frames_raise_wire_error(frame):
+    with pytest.raises(WireError):
+        validate_frame(frame)
+    with pytest.raises(WireError):
+        decode_frame(frame)
+
+
+@pytest.mark.parametrize("frame", MALFORMED)
+def test_analysis_stages_skip_malformed_frames(frame):
+    exercise = {"expected_angles": {"left_knee": 90}, "rep_counter": {"joint": "left_knee", "start": 160, "peak": 100}}
+    for stage in (PoseScoringEngine(window=1), RepCounterRegistry(), MotionAnalytics(window=1)):
+        stage.open("s1", exercise)
+        assert stage.push("s1", frame) is None
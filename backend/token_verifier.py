@@ -0,0 +1,181 @@
+import os
+import time
+import json
+import hmac
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Any
+
+from starlette.concurrency import run_in_threadpool
+from database import supabase
+
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+# Set to "true" to confirm every new token with GoTrue (catches revoked sessions)
+AUTH_CHECK_REVOCATION = os.getenv("AUTH_CHECK_REVOCATION", "false").lower() == "true"
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "2048"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))
+# Audience / role GoTrue puts on access tokens of signed-in users
+AUTHENTICATED = "authenticated"
+
+
+class TokenError(Exception):
+    pass
+
+
+class TokenUser:
+    """
+    Minimal stand-in for the GoTrue User object, built from verified JWT claims.
+    Exposes the attributes the routers read (id, email, user_metadata, ...).
+    """
+    def __init__(self, claims: dict):
+        self.id = claims.get("sub")
+        self.email = claims.get("email")
+        self.phone = claims.get("phone")
+        self.role = claims.get("role")
+        self.aud = claims.get("aud")
+        self.user_metadata = claims.get("user_metadata") or {}
+        self.app_metadata = claims.get("app_metadata") or {}
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def decode_token(token: str, secret: Optional[str] = None) -> dict:
+    """
+    Decode a Supabase access token and, when a secret is given, verify its
+    HS256 signature. Always checks `exp` and that the token belongs to a
+    signed-in user (a `sub` and the "authenticated" audience or role), which
+    rules out the anon and service-role keys signed with the same secret.
+    Raises TokenError on failure.
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(payload_b64))
+    except Exception:
+        raise TokenError("Malformed token")
+
+    if secret is not None:
+        if header.get("alg") != "HS256":
+            raise TokenError(f"Unsupported algorithm {header.get('alg')}")
+        expected = hmac.new(
+            secret.encode(),
+            f"{header_b64}.{payload_b64}".encode(),
+            hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            raise TokenError("Invalid signature")
+
+    exp = claims.get("exp")
+    if exp is None or exp <= time.time():
+        raise TokenError("Token expired")
+
+    if not claims.get("sub"):
+        raise TokenError("Token has no subject")
+    if claims.get("aud") != AUTHENTICATED and claims.get("role") != AUTHENTICATED:
+        raise TokenError("Token is not a user session token")
+
+    return claims
+
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens locally and keeps a bounded LRU of verified users,
+    keyed by token hash and expiring at min(token exp, ttl).
+    GoTrue (`supabase.auth.get_user`) is only called on a cache miss when no
+    JWT secret is configured, the token isn't HS256, or revocation checks are on.
+    """
+    def __init__(self, secret: Optional[str] = SUPABASE_JWT_SECRET,
+                 max_size: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL,
+                 check_revocation: bool = AUTH_CHECK_REVOCATION):
+        self.secret = secret
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_revocation = check_revocation
+        # token hash -> (expires_at, user)
+        self._cache: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.local_verifications = 0
+        self.remote_verifications = 0
+        self.rejections = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _get_cached(self, key: str):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return user
+
+    def _store(self, key: str, user, exp: float):
+        self._cache[key] = (min(exp, time.time() + self.ttl), user)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def verify(self, token: str):
+        """Return the user for `token` or raise TokenError."""
+        key = self._key(token)
+        user = self._get_cached(key)
+        if user is not None:
+            self.hits += 1
+            return user
+        self.misses += 1
+
+        try:
+            # Signature is only checked for HS256 tokens we hold the secret for;
+            # everything else is confirmed by GoTrue below.
+            claims = decode_token(token, self.secret)
+            verified_locally = self.secret is not None
+        except TokenError as e:
+            if self.secret is None or "Unsupported algorithm" not in str(e):
+                self.rejections += 1
+                raise
+            claims = decode_token(token)
+            verified_locally = False
+
+        if verified_locally and not self.check_revocation:
+            self.local_verifications += 1
+            user = TokenUser(claims)
+        else:
+            self.remote_verifications += 1
+            user_data = await run_in_threadpool(supabase.auth.get_user, token)
+            if not user_data or not user_data.user:
+                self.rejections += 1
+                raise TokenError("Invalid token")
+            user = user_data.user
+
+        self._store(key, user, claims["exp"])
+        return user
+
+    def invalidate(self, token: str):
+        self._cache.pop(self._key(token), None)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "local_verifications": self.local_verifications,
+            "remote_verifications": self.remote_verifications,
+            "rejections": self.rejections,
+        }
+
+
+verifier = TokenVerifier()
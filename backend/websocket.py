@@ -1,68 +1,264 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from typing import Optional
-from database import supabase
+from async_database import db
+from token_verifier import verifier
+from identity import identity
+import os
 import json
+import time
+import asyncio
+from backplane import Backplane, create_backplane
+from outbound import SocketSender, encode, is_droppable
+from coalescer import AckCounter, FrameCoalescer, EXERCISE_ACK_EVERY
+from telemetry import telemetry
+from active_sessions import active_sessions
+from exercise_catalog import exercise_catalog
+from pose_scoring import pose_scoring
+from rep_counter import rep_counters
+from patient_stats import patient_stats
+from motion_templates import motion_templates
+from motion_analytics import motion_analytics
+from replay_buffer import replay_buffer, REPLAY_TYPES
+from session_writes import (
+    session_writes, completion_fields, PATIENT_WRITABLE_FIELDS, SESSION_WRITE_BEHIND_INTERVAL
+)
+from wire import WireError, frame_to_message, is_angle_map, message_to_frame, validate_frame
 
 router = APIRouter()
 
+# Server pings every WS_PING_INTERVAL seconds; a socket that has sent nothing
+# (pong or otherwise) for WS_IDLE_TIMEOUT seconds is considered dead and closed
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Close codes sent to sockets the server ends itself
+CLOSE_HEARTBEAT_TIMEOUT = 4000
+CLOSE_REPLACED = 4001
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
 class ConnectionManager:
-    def __init__(self):
-        # Map patient_id -> WebSocket
-        self.patient_connections: dict[str, WebSocket] = {}
-        # Map patient_id -> List[WebSocket] (multiple doctors might monitor same patient)
-        self.doctor_connections: dict[str, list[WebSocket]] = {}
+    def __init__(self, backplane: Optional[Backplane] = None,
+                 ping_interval: float = WS_PING_INTERVAL, idle_timeout: float = WS_IDLE_TIMEOUT):
+        # Map patient_id -> SocketSender
+        self.patient_connections: dict[str, SocketSender] = {}
+        # Map patient_id -> List[SocketSender] (multiple doctors might monitor same patient)
+        self.doctor_connections: dict[str, list[SocketSender]] = {}
+        # Signals go through the backplane so they reach sockets held by other workers
+        self.backplane = backplane or create_backplane()
+        self.backplane.set_handler(self._on_backplane_message)
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.reaped = 0
+        self.replaced = 0
+
+    async def start(self):
+        await self.backplane.start()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def close(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        await self.backplane.close()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self._sweep()
+            except Exception as e:
+                print(f"Error in websocket heartbeat: {e}")
+
+    async def _sweep(self):
+        """Ping every local socket and close the ones that stopped answering."""
+        ping = encode({"type": "ping", "timestamp": now_ms()})
+        for patient_id, sender in list(self.patient_connections.items()):
+            if sender.closed or sender.idle_for() > self.idle_timeout:
+                self.reaped += 1
+                await sender.terminate(CLOSE_HEARTBEAT_TIMEOUT, "Heartbeat timeout")
+                await self.disconnect_patient(patient_id, sender)
+            else:
+                sender.enqueue(ping)
+        for patient_id, senders in list(self.doctor_connections.items()):
+            for sender in list(senders):
+                if sender.closed or sender.idle_for() > self.idle_timeout:
+                    self.reaped += 1
+                    self.disconnect_doctor(patient_id, sender.websocket)
+                    await sender.terminate(CLOSE_HEARTBEAT_TIMEOUT, "Heartbeat timeout")
+                else:
+                    sender.enqueue(ping)
 
-    async def connect_patient(self, patient_id: str, websocket: WebSocket):
+    async def _presence(self, patient_id: str, online: bool):
+        await self.signal_to_doctor(patient_id, {
+            "type": "presence",
+            "patient_id": patient_id,
+            "status": "online" if online else "offline",
+            "timestamp": now_ms()
+        })
+
+    async def connect_patient(self, patient_id: str, websocket: WebSocket, binary: bool = False) -> SocketSender:
         await websocket.accept()
-        self.patient_connections[patient_id] = websocket
+        sender = SocketSender(websocket, binary=binary)
+        sender.start()
+        previous = self.patient_connections.get(patient_id)
+        self.patient_connections[patient_id] = sender
+        if previous is not None:
+            # Newest connection wins; the old handler's cleanup sees it no longer owns the slot
+            self._retire(previous)
+        active_sessions.set_online(patient_id, True)
+        # Other workers close any older connection of this patient they still hold
+        await self.backplane.publish(f"patient:{patient_id}", {
+            "type": "connection_replaced",
+            "connection_id": sender.connection_id
+        })
+        if previous is None:
+            await self._presence(patient_id, True)
+        return sender
 
-    async def disconnect_patient(self, patient_id: str):
-        if patient_id in self.patient_connections:
-            del self.patient_connections[patient_id]
-        # Notify doctors?
+    def _retire(self, sender: SocketSender):
+        self.replaced += 1
+        sender.replaced = True
+        asyncio.create_task(sender.terminate(CLOSE_REPLACED, "Replaced by a newer connection"))
+
+    async def disconnect_patient(self, patient_id: str, sender: Optional[SocketSender] = None):
+        current = self.patient_connections.get(patient_id)
+        if current is None or (sender is not None and current is not sender):
+            # Already reaped, or a newer connection took over the slot
+            if sender is not None:
+                await sender.close(drain_timeout=0)
+            return
+        del self.patient_connections[patient_id]
+        active_sessions.set_online(patient_id, False)
+        await current.close()
+        if not current.replaced:
+            await self._presence(patient_id, False)
         
-    async def connect_doctor(self, patient_id: str, websocket: WebSocket):
+    async def connect_doctor(self, patient_id: str, websocket: WebSocket, binary: bool = False) -> SocketSender:
         await websocket.accept()
+        sender = SocketSender(websocket, binary=binary)
+        sender.start()
         if patient_id not in self.doctor_connections:
             self.doctor_connections[patient_id] = []
-        self.doctor_connections[patient_id].append(websocket)
+        self.doctor_connections[patient_id].append(sender)
+        return sender
 
     def disconnect_doctor(self, patient_id: str, websocket: WebSocket):
         if patient_id in self.doctor_connections:
-            if websocket in self.doctor_connections[patient_id]:
-                self.doctor_connections[patient_id].remove(websocket)
+            for sender in self.doctor_connections[patient_id]:
+                if sender.websocket is websocket:
+                    self.doctor_connections[patient_id].remove(sender)
+                    sender.closed = True
+                    asyncio.create_task(sender.close(drain_timeout=0))
+                    break
             if not self.doctor_connections[patient_id]:
                 del self.doctor_connections[patient_id]
 
     async def signal_to_doctor(self, patient_id: str, message: dict):
-        # Patient sends signal to doctor(s)
-        if patient_id in self.doctor_connections:
-            for socket in self.doctor_connections[patient_id]:
-                try:
-                    await socket.send_json(message)
-                except Exception as e:
-                    print(f"Error signaling doctor: {e}")
+        # Patient sends signal to doctor(s), on whichever worker they are connected
+        await self.backplane.publish(f"doctor:{patient_id}", message)
 
     async def signal_to_patient(self, patient_id: str, message: dict):
-        # Doctor sends signal to patient
+        # Doctor sends signal to patient, on whichever worker they are connected
+        await self.backplane.publish(f"patient:{patient_id}", message)
+
+    async def publish_completion(self, session: dict):
+        # Every worker folds the completion into its own patient stats
+        await self.backplane.publish(f"stats:{session['patient_id']}", {
+            "type": "session_completed",
+            "session": session
+        })
+
+    async def _on_backplane_message(self, channel: str, message: dict):
+        target, _, patient_id = channel.partition(":")
+        if target == "doctor":
+            await self._deliver_to_doctors(patient_id, message)
+        elif target == "patient":
+            await self._deliver_to_patient(patient_id, message)
+        elif target == "stats":
+            patient_stats.record_completed(message["session"], publish=False)
+
+    async def _deliver_to_doctors(self, patient_id: str, message: dict):
+        frame = message.get("frame")
+        text_payload = None
+        if message.get("type") in REPLAY_TYPES:
+            # Kept (and numbered) even when no doctor is connected here, for late joiners
+            text_payload = replay_buffer.record(patient_id, message)
+        senders = self.doctor_connections.get(patient_id)
+        if not senders:
+            return
+        # Serialize once per wire format, then hand the same payload to every doctor's queue
+        if text_payload is None and not isinstance(frame, bytes):
+            text_payload = encode(message)
+        binary_payload = frame if isinstance(frame, bytes) else None
+        droppable = is_droppable(message)
+        malformed = False
+        for sender in list(senders):
+            if sender.binary and message.get("type") == "exercise_update":
+                if binary_payload is None:
+                    binary_payload = message_to_frame(message) or b""
+                payload = binary_payload or text_payload
+            else:
+                if text_payload is None:
+                    if malformed:
+                        continue
+                    try:
+                        text_payload = encode(frame_to_message(frame, message["type"]))
+                    except WireError as e:
+                        # Only the doctors needing JSON miss this frame
+                        print(f"Dropping malformed exercise frame for {patient_id}: {e}")
+                        malformed = True
+                        continue
+                payload = text_payload
+            if not sender.enqueue(payload, droppable) and sender.closed:
+                self.disconnect_doctor(patient_id, sender.websocket)
+
+    async def _deliver_to_patient(self, patient_id: str, message: dict):
+        if message.get("type") == "connection_replaced":
+            sender = self.patient_connections.get(patient_id)
+            if sender is not None and sender.connection_id != message.get("connection_id"):
+                del self.patient_connections[patient_id]
+                active_sessions.set_online(patient_id, False)
+                self._retire(sender)
+            return
         if patient_id in self.patient_connections:
-            try:
-                await self.patient_connections[patient_id].send_json(message)
-            except Exception as e:
-                print(f"Error signaling patient: {e}")
+            if not self.patient_connections[patient_id].send_json(message):
+                print(f"Error signaling patient {patient_id}: outbound queue closed")
+
+    def stats(self) -> dict:
+        return {
+            "reaped": self.reaped,
+            "replaced": self.replaced,
+            "patients": {pid: sender.stats() for pid, sender in self.patient_connections.items()},
+            "doctors": {
+                pid: [sender.stats() for sender in senders]
+                for pid, senders in self.doctor_connections.items()
+            },
+        }
 
 manager = ConnectionManager()
+# Rate-limits exercise_update frames to monitoring doctors (latest state wins)
+coalescer = FrameCoalescer(manager.signal_to_doctor)
+patient_stats.set_publisher(manager.publish_completion)
 
 @router.websocket("/ws/doctor/monitor/{session_id}")
 async def monitor_patient(
     websocket: WebSocket, 
     session_id: str,
-    token: Optional[str] = Query(None)
+    token: Optional[str] = Query(None),
+    wire_format: str = Query("json", alias="format"),
+    since_seq: Optional[int] = Query(None, ge=0),
+    stream: Optional[str] = Query(None)
 ):
-    print(f"DEBUG: Entering monitor_patient for session_id={session_id}")
     """
     WebSocket endpoint for doctors to monitor patient exercise sessions in real-time.
-    Requires authentication token as query parameter.
+    Requires authentication token as query parameter; the session's patient
+    must be one of the doctor's own (closes with 4403 otherwise).
+    After `connected` the doctor gets a `snapshot` of the latest events and a
+    `replay` of recent ones; reconnecting sockets pass the last `seq` they
+    saw as `since_seq` (with the snapshot's `stream`) to resume without gaps.
     """
     # Authenticate the connection
     if not token:
@@ -71,20 +267,20 @@ async def monitor_patient(
     
     try:
         # Verify the token
-        user = supabase.auth.get_user(token)
-        if not user or not user.user:
+        user = await verifier.verify(token)
+        if not user:
             await websocket.close(code=1008, reason="Invalid authentication token")
             return
         
         # Verify user is a doctor
-        role = user.user.user_metadata.get("role")
+        role = user.user_metadata.get("role")
         if role != "doctor":
             await websocket.close(code=1008, reason="Unauthorized: Doctor access only")
             return
         
         # Fetch session to get patient_id
-        session_res = supabase.from_("exercise_sessions")\
-            .select("patient_id, patients(full_name)")\
+        session_res = await db.from_("exercise_sessions")\
+            .select("patient_id, patients(full_name, doctor_id)")\
             .eq("id", session_id)\
             .limit(1)\
             .execute()
@@ -97,7 +293,14 @@ async def monitor_patient(
         session_data = session_res.data[0]
         patient_id = session_data["patient_id"]
         # Handle potential nested dict from join or manual extraction
-        patient_name = session_data.get("patients", {}).get("full_name", "Unknown Patient")
+        patient = session_data.get("patients") or {}
+        patient_name = patient.get("full_name", "Unknown Patient")
+
+        # Only the patient's own doctor may watch the stream or its history
+        doctor_id = await identity.doctor_id(user.id)
+        if not doctor_id or patient.get("doctor_id") != doctor_id:
+            await websocket.close(code=4403, reason="Forbidden")
+            return
         
     except Exception as e:
         print(f"WebSocket auth error: {e}")
@@ -108,27 +311,35 @@ async def monitor_patient(
     
     # Connection authenticated, proceed with monitoring
     print(f"DEBUG: Authentication successful for patient {patient_id}, accepting connection")
-    await manager.connect_doctor(patient_id, websocket)
+    sender = await manager.connect_doctor(patient_id, websocket, binary=wire_format == "binary")
     
     try:
         # Send initial connection confirmation
-        await websocket.send_json({
+        sender.send_json({
             "type": "connected",
             "patient_id": patient_id,
             "patient_name": patient_name,
-            "timestamp": None
+            "patient_online": active_sessions.is_online(patient_id),
+            "timestamp": now_ms()
         })
+        for payload in replay_buffer.catch_up(patient_id, session_id, since_seq, stream):
+            sender.enqueue(payload)
         
         # Keep connection alive and handle incoming messages
         while True:
             try:
                 # Receive data from client
                 data = await websocket.receive_text()
+                sender.touch()
                 message = json.loads(data)
                 
                 # Handle different message types
                 if message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    sender.send_json({"type": "pong"})
+
+                elif message.get("type") == "pong":
+                    # Heartbeat reply; touch() above already recorded it
+                    pass
                 
                 elif message.get("type") == "signal":
                     # Forward WebRTC signal to patient
@@ -136,7 +347,7 @@ async def monitor_patient(
 
                 elif message.get("type") == "request_update":
                     # Send current patient status
-                     await websocket.send_json({
+                     sender.send_json({
                         "type": "status_update",
                         "patient_id": patient_id,
                         "status": "monitoring"
@@ -146,7 +357,7 @@ async def monitor_patient(
                 print(f"WebSocket disconnected for patient {patient_id}")
                 break
             except json.JSONDecodeError:
-                await websocket.send_json({
+                sender.send_json({
                     "type": "error",
                     "message": "Invalid JSON format"
                 })
@@ -163,14 +374,163 @@ async def monitor_patient(
         except:
             pass
 
+class SessionBinding:
+    """
+    The session a patient socket records frames against. It starts as the
+    ownership-checked `session_id` query param or the patient's current
+    session; a frame naming another session only switches it once that
+    session is confirmed to be the patient's own and in progress.
+    """
+    # Distinct session ids a connection may ask about before older answers are forgotten
+    MAX_CHECKED = 16
+
+    def __init__(self, patient_id: str, session_id: Optional[str] = None):
+        self.patient_id = patient_id
+        self.session_id = session_id
+        # session_id -> whether it was confirmed as this patient's in-progress session
+        self._checked: dict[str, bool] = {}
+
+    async def resolve(self, requested: Optional[str] = None) -> Optional[str]:
+        if self.session_id is None:
+            self.session_id = active_sessions.current_for_patient(self.patient_id)
+        if requested and requested != self.session_id:
+            allowed = self._checked.get(requested)
+            if allowed is None:
+                if len(self._checked) >= self.MAX_CHECKED:
+                    self._checked.clear()
+                session = await active_sessions.owned(requested, self.patient_id)
+                allowed = self._checked[requested] = bool(session) and session.get("status") == "in_progress"
+            if allowed:
+                self.session_id = requested
+        return self.session_id
+
+    def release(self, session_id: str):
+        """Forget a session that has ended so later frames pick up the next one."""
+        self._checked.pop(session_id, None)
+        if self.session_id == session_id:
+            self.session_id = None
+
+# Per-session analysis stages, each opened with the session's exercise row on its first frame
+ANALYSIS_STAGES = (pose_scoring, rep_counters, motion_templates, motion_analytics)
+
+async def analyze_frame(patient_id: str, session_id: Optional[str], frame, sender: SocketSender):
+    """
+    Run the server-side analysis stages on one exercise frame and push any
+    resulting report to the patient and their doctors. Frames arrive
+    validated (see patient_session); one a stage still fails on is skipped
+    rather than ending the socket.
+    """
+    if not session_id:
+        return
+    try:
+        await _analyze(patient_id, session_id, frame, sender)
+    except Exception as e:
+        print(f"Analysis skipped a frame for session {session_id}: {e}")
+
+async def _analyze(patient_id: str, session_id: str, frame, sender: SocketSender):
+    missing = [stage for stage in ANALYSIS_STAGES if not stage.has(session_id)]
+    if missing:
+        session = active_sessions.get(session_id)
+        exercise = None
+        if session and session.get("exercise_id"):
+            exercise = await exercise_catalog.get(session["exercise_id"])
+        for stage in missing:
+            stage.open(session_id, exercise)
+
+    report = pose_scoring.push(session_id, frame)
+    if report is not None:
+        message = {"type": "posture_feedback", "session_id": session_id, **report}
+        sender.send_json(message)
+        await manager.signal_to_doctor(patient_id, message)
+
+    # Fatigue / compensation alerts are for the monitoring doctor only
+    for alert in motion_analytics.push(session_id, frame) or ():
+        await manager.signal_to_doctor(patient_id, {"type": "alert", "session_id": session_id, **alert})
+
+    motion_templates.push(session_id, frame)
+    rep = rep_counters.push(session_id, frame)
+    if rep is not None:
+        # Score the finished rep against the exercise's reference motion, if it has one
+        match = motion_templates.score_rep(session_id, rep["timestamp"] - rep["duration_ms"], rep["timestamp"])
+        message = {"type": "rep_completed", "session_id": session_id, **rep, **(match or {})}
+        sender.send_json(message)
+        await manager.signal_to_doctor(patient_id, message)
+
+async def handle_session_progress(patient_id: str, binding: SessionBinding, message: dict, sender: SocketSender):
+    """
+    Apply a `session_progress` message: update the in-memory session, relay
+    it to doctors straight away and persist it write-behind. Completing the
+    session is written immediately and confirmed with `session_saved`; the
+    session's analysis stages are only closed once that write succeeds.
+    """
+    session_id = message.get("session_id") or binding.session_id
+    if not session_id:
+        sender.send_json({"type": "error", "message": "session_progress requires a session_id"})
+        return
+
+    fields = {k: message[k] for k in PATIENT_WRITABLE_FIELDS if k in message}
+    if not fields:
+        return
+
+    entry = await active_sessions.owned(session_id, patient_id)
+    if entry is None:
+        sender.send_json({"type": "error", "session_id": session_id, "message": "Session not found"})
+        return
+
+    completing = fields.get("status") == "completed"
+    if completing:
+        if "accuracy_percent" in message:
+            fields["accuracy_percent"] = message["accuracy_percent"]
+        fields = completion_fields(session_id, fields)
+    else:
+        # A completion leaves the index once it is written (session_writes)
+        active_sessions.update(session_id, fields)
+
+    data = {**entry, **fields}
+    data.pop("doctor_id", None)
+    await manager.signal_to_doctor(patient_id, {
+        "type": "session_update",
+        "session_id": session_id,
+        "status": fields.get("status"),
+        "data": data
+    })
+
+    pending = session_writes.submit(session_id, patient_id, fields, delay=SESSION_WRITE_BEHIND_INTERVAL)
+    if not completing:
+        return
+    try:
+        row = await asyncio.shield(pending)
+    except Exception:
+        row = None
+    if not row:
+        sender.send_json({"type": "error", "session_id": session_id, "message": "Failed to save session"})
+        return
+    pose_scoring.close(session_id)
+    motion_templates.close(session_id)
+    motion_analytics.close(session_id)
+    binding.release(session_id)
+    sender.send_json({"type": "session_saved", "session_id": session_id, "data": row})
+
 @router.websocket("/ws/patient/session")
 async def patient_session(
     websocket: WebSocket,
-    token: Optional[str] = Query(None)
+    token: Optional[str] = Query(None),
+    session_id: Optional[str] = Query(None),
+    update_hz: Optional[float] = Query(None),
+    ack_every: int = Query(EXERCISE_ACK_EVERY, ge=1),
+    wire_format: str = Query("json", alias="format")
 ):
     """
     WebSocket endpoint for patients to stream exercise session data.
     Requires authentication token as query parameter.
+    `update_hz` sets how often doctors receive the latest frame and
+    `ack_every` how many frames each cumulative acknowledgement covers.
+    With `format=binary` exercise data may be sent as binary frames (see wire.py).
+    Frames are recorded against `session_id` or, without it, the patient's
+    current session; a frame's own session_id is honoured only for the
+    patient's own in-progress sessions.
+    `session_progress` messages update reps, duration and status without a
+    PATCH round-trip.
     """
     # Authenticate the connection
     if not token:
@@ -179,61 +539,117 @@ async def patient_session(
     
     try:
         # Verify the token
-        user = supabase.auth.get_user(token)
-        if not user or not user.user:
+        user = await verifier.verify(token)
+        if not user:
             await websocket.close(code=1008, reason="Invalid authentication token")
             return
         
         # Get patient record
-        patient = supabase.from_("patients")\
-            .select("id")\
-            .eq("auth_user_id", user.user.id)\
-            .limit(1)\
-            .execute()
+        patient_id = await identity.patient_id(user.id)
         
-        if not patient.data or len(patient.data) == 0:
+        if not patient_id:
             await websocket.close(code=1008, reason="Patient profile not found")
             return
-        
-        patient_id = patient.data[0]["id"]
+
+        if session_id:
+            session = await active_sessions.owned(session_id, patient_id)
+            if not session or session.get("status") != "in_progress":
+                await websocket.close(code=1008, reason="Session not found")
+                return
         
     except Exception as e:
         print(f"WebSocket auth error: {e}")
         await websocket.close(code=1008, reason="Authentication failed")
         return
     
-    await manager.connect_patient(patient_id, websocket)
+    sender = await manager.connect_patient(patient_id, websocket, binary=wire_format == "binary")
+    # Without an explicit session_id, frames belong to the patient's current session
+    binding = SessionBinding(patient_id, session_id)
+    await binding.resolve()
+    coalescer.set_rate(patient_id, update_hz)
+    acks = AckCounter(ack_every)
     
     try:
-        await websocket.send_json({
+        sender.send_json({
             "type": "connected",
             "patient_id": patient_id
         })
         
         while True:
             try:
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                raw = await websocket.receive()
+                if raw["type"] == "websocket.disconnect":
+                    break
+                sender.touch()
+
+                if raw.get("bytes") is not None:
+                    # Binary exercise frame: validated once, then relayed and stored as-is
+                    frame = raw["bytes"]
+                    try:
+                        frame_ts = validate_frame(frame)
+                    except WireError as e:
+                        sender.send_json({
+                            "type": "error",
+                            "message": f"Invalid binary frame: {e}"
+                        })
+                        continue
+                    ack = acks.frame(frame_ts)
+                    if ack:
+                        sender.send_json(ack)
+                    session_id = await binding.resolve()
+                    telemetry.ingest(session_id, patient_id, frame)
+                    coalescer.offer(patient_id, {
+                        "type": "exercise_update",
+                        "frame": frame
+                    }, len(frame))
+                    await analyze_frame(patient_id, session_id, frame, sender)
+                    continue
+
+                data = raw["text"]
+                try:
+                    message = json.loads(data)
+                except json.JSONDecodeError:
+                    sender.send_json({"type": "error", "message": "Invalid JSON format"})
+                    continue
+                if not isinstance(message, dict):
+                    sender.send_json({"type": "error", "message": "Expected a JSON object"})
+                    continue
                 
                 # Handle exercise data streaming
                 if message.get("type") == "exercise_data":
-                    # Process and potentially broadcast to monitoring doctors
-                    # For now, just acknowledge receipt
-                    await websocket.send_json({
-                        "type": "acknowledged",
-                        "timestamp": message.get("timestamp")
-                    })
+                    # Checked once here so no stage downstream sees a malformed angle map
+                    if "angles" in message and not is_angle_map(message["angles"]):
+                        sender.send_json({
+                            "type": "error",
+                            "message": "Invalid exercise_data: angles must map joint names to numbers"
+                        })
+                        continue
+                    # A frame's own session_id is only honoured for the patient's own sessions
+                    session_id = await binding.resolve(message.get("session_id"))
+                    telemetry.ingest(session_id, patient_id, message)
+
+                    # Cumulative ack: one message covers the last `ack_every` frames
+                    ack = acks.frame(message.get("timestamp"))
+                    if ack:
+                        sender.send_json(ack)
                     
                     # ALSO broadcast data to doctor for live preview (simulated stats)
-                    # In real app, we'd process analysis here
-                    await manager.signal_to_doctor(patient_id, {
+                    # Coalesced: doctors only get the latest frame at the update rate
+                    coalescer.offer(patient_id, {
                         **message,
                         "type": "exercise_update" 
-                    })
+                    }, len(data))
+                    await analyze_frame(patient_id, session_id, message, sender)
+
+                elif message.get("type") == "session_progress":
+                    await handle_session_progress(patient_id, binding, message, sender)
 
                 elif message.get("type") == "signal":
                     # Forward WebRTC signal to doctor
                     await manager.signal_to_doctor(patient_id, message)
+
+                elif message.get("type") == "ping":
+                    sender.send_json({"type": "pong"})
                     
             except WebSocketDisconnect:
                 break
@@ -244,7 +660,16 @@ async def patient_session(
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        await manager.disconnect_patient(patient_id)
+        # A replaced connection leaves the patient's stream state to its successor
+        if not sender.replaced:
+            await coalescer.close(patient_id)
+            session_id = binding.session_id
+            if session_id:
+                pose_scoring.close(session_id)
+                motion_templates.close(session_id)
+                motion_analytics.close(session_id)
+        await session_writes.flush_patient(patient_id)
+        await manager.disconnect_patient(patient_id, sender)
         try:
             await websocket.close()
         except:
@@ -0,0 +1,141 @@
+"""
+Compact binary frame format for the exercise stream.
+
+Layout (little-endian), version 1:
+    header  <BBHdf   version, kind, joint count n, timestamp (float64), accuracy (float32, NaN if absent)
+    body    <{n}B{n}f joint ids followed by float32 angles (degrees)
+
+Joint ids index into JOINTS; the table is append-only so ids stay stable
+across versions.
+"""
+import math
+import struct
+from typing import Optional
+
+WIRE_VERSION = 1
+KIND_EXERCISE_DATA = 1
+
+JOINTS = [
+    "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist",
+    "left_hip", "right_hip",
+    "left_knee", "right_knee",
+    "left_ankle", "right_ankle",
+    "neck", "spine",
+]
+JOINT_IDS = {name: index for index, name in enumerate(JOINTS)}
+
+HEADER = struct.Struct("<BBHdf")
+
+_body_structs: dict[int, struct.Struct] = {}
+
+
+class WireError(ValueError):
+    pass
+
+
+def body_struct(count: int) -> struct.Struct:
+    body = _body_structs.get(count)
+    if body is None:
+        body = _body_structs[count] = struct.Struct(f"<{count}B{count}f")
+    return body
+
+
+def encode_frame(angles: dict, timestamp: float = 0.0, accuracy: Optional[float] = None) -> bytes:
+    """Pack a {joint name: angle} map; unknown joints are skipped."""
+    ids = []
+    values = []
+    for name, angle in angles.items():
+        joint_id = JOINT_IDS.get(name)
+        if joint_id is not None and angle is not None:
+            ids.append(joint_id)
+            values.append(angle)
+    header = HEADER.pack(
+        WIRE_VERSION, KIND_EXERCISE_DATA, len(ids),
+        float(timestamp or 0.0),
+        math.nan if accuracy is None else float(accuracy)
+    )
+    return header + body_struct(len(ids)).pack(*ids, *values)
+
+
+def unpack_frame(frame: bytes) -> tuple[float, Optional[float], tuple, tuple]:
+    """
+    Unpack a frame into (timestamp, accuracy, joint ids, angles) without
+    building a dict; the analysis stages index their arrays with the ids
+    directly. Raises WireError if the frame is malformed.
+    """
+    if len(frame) < HEADER.size:
+        raise WireError("Frame too short")
+    version, kind, count, timestamp, accuracy = HEADER.unpack_from(frame)
+    if version != WIRE_VERSION or kind != KIND_EXERCISE_DATA:
+        raise WireError(f"Unsupported frame version/kind {version}/{kind}")
+    body = body_struct(count)
+    if len(frame) != HEADER.size + body.size:
+        raise WireError("Frame length does not match joint count")
+    values = body.unpack_from(frame, HEADER.size)
+    ids = values[:count]
+    if count and max(ids) >= len(JOINTS):
+        raise WireError("Unknown joint id")
+    return timestamp, None if math.isnan(accuracy) else accuracy, ids, values[count:]
+
+
+def decode_frame(frame: bytes) -> tuple[float, Optional[float], dict]:
+    """Unpack a frame into (timestamp, accuracy, {joint name: angle}). Raises WireError if malformed."""
+    timestamp, accuracy, ids, angles = unpack_frame(frame)
+    return timestamp, accuracy, {JOINTS[joint_id]: angle for joint_id, angle in zip(ids, angles)}
+
+
+def validate_frame(frame: bytes) -> float:
+    """Check a frame in full (header, length, joint ids) and return its timestamp; raises WireError."""
+    return unpack_frame(frame)[0]
+
+
+def is_angle_map(angles) -> bool:
+    """Whether a JSON frame's `angles` is a {joint name: number or null} map."""
+    return isinstance(angles, dict) and all(
+        angle is None or (isinstance(angle, (int, float)) and not isinstance(angle, bool))
+        for angle in angles.values()
+    )
+
+
+def frame_to_message(frame: bytes, message_type: str = "exercise_data") -> dict:
+    timestamp, accuracy, angles = decode_frame(frame)
+    message = {"type": message_type, "timestamp": timestamp, "angles": angles}
+    if accuracy is not None:
+        message["accuracy"] = accuracy
+    return message
+
+
+def message_to_frame(message: dict) -> Optional[bytes]:
+    """Binary form of a JSON exercise message, or None if it has no angle map."""
+    angles = message.get("angles")
+    if not is_angle_map(angles):
+        return None
+    return encode_frame(angles, message.get("timestamp") or 0.0, message.get("accuracy"))
+
+
+if __name__ == "__main__":
+    # Microbenchmark: JSON text vs binary frames for a typical joint-angle payload
+    import json
+    import timeit
+
+    sample = {
+        "type": "exercise_data",
+        "timestamp": 1718000000000.0,
+        "accuracy": 87.5,
+        "angles": {name: 90.0 + i * 3.7 for i, name in enumerate(JOINTS)},
+    }
+    text = json.dumps(sample)
+    frame = message_to_frame(sample)
+    runs = 100_000
+
+    results = {
+        "json encode": timeit.timeit(lambda: json.dumps(sample), number=runs),
+        "json decode": timeit.timeit(lambda: json.loads(text), number=runs),
+        "binary encode": timeit.timeit(lambda: message_to_frame(sample), number=runs),
+        "binary decode": timeit.timeit(lambda: decode_frame(frame), number=runs),
+    }
+    print(f"payload size: json={len(text)} bytes, binary={len(frame)} bytes")
+    for name, seconds in results.items():
+        print(f"{name:14s} {seconds / runs * 1e6:7.2f} us/frame")
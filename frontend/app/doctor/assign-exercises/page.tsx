@@ -1,7 +1,7 @@
 'use client'
 
 import { useState, useEffect } from 'react'
-import { api, apiEndpoints } from '@/lib/api'
+import { api, apiEndpoints, getAllPages } from '@/lib/api'
 import { motion } from 'framer-motion'
 import { Search, Filter, Target, Clock, Users, Plus, Calendar, Check } from 'lucide-react'
 import { Card } from '@/components/cards/Card'
@@ -42,9 +42,9 @@ export default function AssignExercisesPage() {
   const fetchData = async () => {
     try {
       setLoading(true)
-      const [exercisesRes, patientsRes] = await Promise.all([
+      const [exercisesRes, patientRows] = await Promise.all([
         api.get('/exercises'),
-        api.get(apiEndpoints.doctor.patients.list)
+        getAllPages(apiEndpoints.doctor.patients.list, { limit: 500 })
       ])
       
       // Map API data to frontend interfaces
@@ -59,7 +59,7 @@ export default function AssignExercisesPage() {
         equipment: ex.equipment || []
       }))
 
-      const mappedPatients = patientsRes.data.map((p: any) => ({
+      const mappedPatients = patientRows.map((p: any) => ({
         id: p.id, // Patient ID
         name: p.full_name
       }))
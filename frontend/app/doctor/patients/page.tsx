@@ -6,7 +6,7 @@ import { Search, Filter, User, Phone, Mail, Calendar, Activity, MoreVertical } f
 import { Card } from '@/components/cards/Card'
 import { PatientCard } from '@/components/cards/PatientCard'
 import { AnimatedLoader } from '@/components/loaders/AnimatedLoader'
-import { api, apiEndpoints } from '@/lib/api'
+import { apiEndpoints, getAllPages } from '@/lib/api'
 
 interface Patient {
   id: string
@@ -32,8 +32,8 @@ export default function PatientsPage() {
 
   const fetchPatients = async () => {
     try {
-      const response = await api.get(apiEndpoints.doctor.patients.list)
-      const data = response.data
+      // The list is paginated; follow the cursor so doctors with many patients see them all
+      const data = await getAllPages(apiEndpoints.doctor.patients.list, { limit: 500 })
       
       console.log("Raw patients data:", data) // DEBUG log
 
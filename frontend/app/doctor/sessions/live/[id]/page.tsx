@@ -64,7 +64,10 @@ export default function LiveSessionPage() {
                return;
             }
 
-            if (message.type === 'signal') {
+            if (message.type === 'ping') {
+                // Server heartbeat; unanswered sockets are closed
+                ws.send(JSON.stringify({ type: 'pong', timestamp: message.timestamp }));
+            } else if (message.type === 'signal') {
                 handleSignal(message);
             } else if (message.type === 'exercise_update') {
                // Update stats from patient broadcast
@@ -6,7 +6,7 @@ import { Calendar, Filter, TrendingUp, Clock, Target, Download, Eye } from 'luci
 import { Card } from '@/components/cards/Card'
 import { ProgressRing } from '@/components/charts/ProgressRing'
 import { AnimatedLoader } from '@/components/loaders/AnimatedLoader'
-import { api, apiEndpoints } from '@/lib/api'
+import { apiEndpoints, getAllPages } from '@/lib/api'
 
 interface SessionHistory {
   id: string
@@ -30,8 +30,8 @@ export default function HistoryPage() {
 
   const fetchHistory = async () => {
     try {
-      const response = await api.get(apiEndpoints.patient.session.history)
-      const data = response.data
+      // History is paginated; load every page so the totals below cover all sessions
+      const data = await getAllPages(apiEndpoints.patient.session.history, { limit: 500 })
       
       const mappedSessions: SessionHistory[] = data.map((s: any) => ({
         id: s.id,
@@ -93,6 +93,9 @@ export default function LiveSessionPage() {
         if (message.type === 'signal') {
           // Incoming signal from Doctor
           handleSignal(message)
+        } else if (message.type === 'ping') {
+          // Server heartbeat; unanswered sockets are closed
+          ws.send(JSON.stringify({ type: 'pong', timestamp: message.timestamp }))
         }
       }
 
@@ -81,3 +81,21 @@ export const apiEndpoints = {
         details: (id: string) => `/exercises/${id}`,
     },
 }
+
+// Cursor-paginated list endpoints return one page per request and the
+// cursor of the next page in the X-Next-Cursor header (absent on the last)
+export const NEXT_CURSOR_HEADER = 'x-next-cursor'
+
+export async function getAllPages<T = any>(url: string, params: Record<string, unknown> = {}): Promise<T[]> {
+    const items: T[] = []
+    let cursor: string | undefined
+    do {
+        const response = await api.get(url, { params: cursor ? { ...params, cursor } : params })
+        if (!Array.isArray(response.data)) {
+            break
+        }
+        items.push(...response.data)
+        cursor = response.headers[NEXT_CURSOR_HEADER] || undefined
+    } while (cursor)
+    return items
+}
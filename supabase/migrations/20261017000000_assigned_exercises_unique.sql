@@ -0,0 +1,22 @@
+-- One assignment per (patient, exercise).
+--
+-- POST /doctor/assignments upserts on (patient_id, exercise_id) so retried
+-- requests update the existing assignment instead of adding a duplicate.
+-- The upsert needs this constraint. Without it the backend falls back to a
+-- slower select-then-insert path (see backend/assignment_engine.py).
+
+-- Keep only the most recent row of any existing duplicates
+delete from public.assigned_exercises
+where id in (
+  select id from (
+    select id, row_number() over (
+      partition by patient_id, exercise_id
+      order by assigned_at desc nulls last, id desc
+    ) as position
+    from public.assigned_exercises
+  ) ranked
+  where position > 1
+);
+
+alter table public.assigned_exercises
+  add constraint assigned_exercises_patient_exercise_key unique (patient_id, exercise_id);
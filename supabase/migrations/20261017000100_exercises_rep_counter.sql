@@ -0,0 +1,13 @@
+-- Server-side rep counting config per exercise.
+--
+-- {"joint": "<joint name>", "start": <degrees>, "peak": <degrees>}: a rep
+-- starts when the joint angle crosses `start` towards `peak`, and counts once
+-- it has reached `peak` and come back past `start` (see backend/rep_counter.py).
+-- Exercises without it are not counted, and their sessions keep the
+-- repetitions the patient reports.
+
+alter table public.exercises
+  add column if not exists rep_counter jsonb;
+
+comment on column public.exercises.rep_counter is
+  'Rep counter hysteresis: {"joint": name, "start": degrees, "peak": degrees}';
@@ -0,0 +1,12 @@
+-- Reference motion per exercise, for per-rep similarity scoring.
+--
+-- {"<joint name>": [angle, ...], ...}: the angle curve of one ideal
+-- repetition for each listed joint. Each completed rep is compared with it
+-- by banded DTW (see backend/motion_templates.py). Exercises without it are
+-- not scored.
+
+alter table public.exercises
+  add column if not exists reference_trajectory jsonb;
+
+comment on column public.exercises.reference_trajectory is
+  'One ideal repetition per joint: {joint: [angles...]}';
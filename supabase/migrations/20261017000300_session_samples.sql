@@ -0,0 +1,22 @@
+-- Raw exercise frames recorded during live sessions.
+--
+-- Written in batches by the backend telemetry pipeline (TELEMETRY_SINK=db,
+-- see backend/telemetry.py) with the service role key. There are no foreign
+-- keys, so one bad row can't reject the rest of its batch. The table is
+-- append-only; prune it by recorded_at as retention requires.
+
+create table if not exists public.session_samples (
+  id bigserial primary key,
+  session_id uuid,
+  patient_id uuid,
+  recorded_at timestamptz not null default now(),
+  accuracy real,
+  angles jsonb,
+  data jsonb
+);
+
+create index if not exists session_samples_session_recorded_idx
+  on public.session_samples (session_id, recorded_at);
+
+-- Only the service role (which bypasses RLS) reads or writes samples
+alter table public.session_samples enable row level security;
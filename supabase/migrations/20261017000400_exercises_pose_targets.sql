@@ -0,0 +1,16 @@
+-- Target posture per exercise, for live posture feedback.
+--
+-- expected_angles: {"<joint name>": <degrees>, ...}. Only the listed joints
+--   are scored, and exercises without it get no posture feedback.
+-- angle_tolerance: {"warning": <degrees>, "incorrect": <degrees>}, the
+--   deviations at which a joint turns warning or incorrect (default 10 / 20).
+-- See backend/pose_scoring.py.
+
+alter table public.exercises
+  add column if not exists expected_angles jsonb,
+  add column if not exists angle_tolerance jsonb;
+
+comment on column public.exercises.expected_angles is
+  'Target joint angles in degrees: {joint: degrees}';
+comment on column public.exercises.angle_tolerance is
+  'Deviation thresholds in degrees: {"warning": n, "incorrect": n}';